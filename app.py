@@ -4,17 +4,22 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import numpy as np
-from utils import process_data, generate_insights
-from categorizar_produtos import categorizar_produtos, criar_regras_categorias, categorizar_por_regras, treinar_modelo_similaridade, categorizar_por_similaridade, mapear_categorias_similares
+from utils import process_data, compact_dtypes, parse_sales_dates, count_invalid_dates, date_codes, generate_insights, build_sales_cube, group_small_categories, category_metrics, growth_recommendation, downsample_series
+from categorizar_produtos import EscritorBlocos, categorizar_produtos, criar_regras_categorias, categorizar_por_regras, treinar_modelo_similaridade, categorizar_por_similaridade, mapear_categorias_similares
+from cache_modelos import DIRETORIO_CACHE_PADRAO
+from cache_resultados import ARQUIVO_CACHE_PADRAO
+from medicao import MedidorEtapas, memoria_dataframe_mb
+from armazenamento import ArmazemVendas, CAMINHO_BASE_PADRAO, chaves_linhas
 import os
 import json
 from urllib.parse import quote
-import base64
-from io import BytesIO
 import matplotlib.pyplot as plt
 from PIL import Image as PILImage
 import tempfile
 
+# Copy-on-write: cópias e seleções compartilham os dados até que uma das partes seja alterada
+pd.set_option("mode.copy_on_write", True)
+
 # Configuração da página
 st.set_page_config(
     page_title="Dashboard de Vendas - Marketplace",
@@ -55,13 +60,19 @@ uploaded_file = st.sidebar.file_uploader("Faça upload da planilha de vendas", t
 # Adicione esta opção para usar dados de exemplo
 use_example_data = st.sidebar.checkbox("Usar dados de exemplo", False)
 
-# Função para carregar os dados
-@st.cache_data
-def load_data(file):
-    if file.name.endswith('.csv'):
-        df = pd.read_csv(file)
-    else:
-        df = pd.read_excel(file)
+# Mostrar o pico de memória de cada etapa do carregamento
+medir_memoria = st.sidebar.checkbox("Medir memória por etapa", False)
+
+# Acumular os uploads numa base local e abrir o dashboard a partir dela
+usar_base_local = st.sidebar.checkbox("Usar base local (acumula os uploads)", True)
+
+# Função para ler o arquivo enviado
+def read_sales_file(file, medidor):
+    with medidor.etapa("Leitura do arquivo"):
+        if file.name.endswith('.csv'):
+            df = pd.read_csv(file)
+        else:
+            df = pd.read_excel(file)
     
     # Renomear colunas para garantir consistência
     column_mapping = {
@@ -73,95 +84,211 @@ def load_data(file):
         'Descrição do produto': 'descricao'
     }
     
-    # Tentar mapear as colunas existentes
-    for original, novo in column_mapping.items():
-        if original in df.columns:
-            df = df.rename(columns={original: novo})
+    # Mapear as colunas existentes de uma só vez, no próprio DataFrame lido
+    df.rename(columns=column_mapping, inplace=True)
     
-    # Garantir que a coluna de data está no formato correto
+    # Garantir que a coluna de data está no formato correto (dd/mm/aaaa, salvo indicação contrária nos dados)
     if 'data_venda' in df.columns:
-        df['data_venda'] = pd.to_datetime(df['data_venda'])
+        datas = parse_sales_dates(df['data_venda'])
+        datas_invalidas = count_invalid_dates(df['data_venda'], datas)
+        df['data_venda'] = datas
+        
+        # Exibido também quando o resultado vem do cache (st.cache_data repete os avisos)
+        if datas_invalidas > 0:
+            st.warning(
+                f"{datas_invalidas:,} linha(s) com data de venda em formato não reconhecido ficaram sem data."
+            )
     
     # Converter a coluna categoria para string
     if 'categoria' in df.columns:
         df['categoria'] = df['categoria'].astype(str)
     
-    # Verificar se temos a coluna de descrição e a coluna de categoria
-    if 'descricao' in df.columns and 'categoria' in df.columns:
-        # Procurar por arquivos de categorias em várias extensões
-        arquivos_possiveis = [
-            os.path.join(os.path.dirname(__file__), "categorias-produtos.md"),
-            os.path.join(os.path.dirname(__file__), "categorias-produtos.xls"),
-            os.path.join(os.path.dirname(__file__), "categorias-produtos.xlsx"),
-            os.path.join(os.path.dirname(__file__), "categorias-produtos.csv")
-        ]
-        
-        arquivo_categorias = None
-        for arquivo in arquivos_possiveis:
-            if os.path.exists(arquivo):
-                arquivo_categorias = arquivo
-                break
-        
-        # Mostrar um spinner enquanto categoriza os produtos
-        with st.spinner('Categorizando produtos automaticamente...'):
-            # Categorizar produtos sem categoria ou com categoria "Outros"
+    return df
+
+# Função para categorizar os produtos sem categoria ou em "Outros"
+def categorize_sales(df, medidor, modelo_similaridade=None):
+    # Procurar por arquivos de categorias em várias extensões
+    arquivos_possiveis = [
+        os.path.join(os.path.dirname(__file__), "categorias-produtos.md"),
+        os.path.join(os.path.dirname(__file__), "categorias-produtos.xls"),
+        os.path.join(os.path.dirname(__file__), "categorias-produtos.xlsx"),
+        os.path.join(os.path.dirname(__file__), "categorias-produtos.csv")
+    ]
+    
+    arquivo_categorias = None
+    for arquivo in arquivos_possiveis:
+        if os.path.exists(arquivo):
+            arquivo_categorias = arquivo
+            break
+    
+    # Mostrar um spinner enquanto categoriza os produtos
+    with st.spinner('Categorizando produtos automaticamente...'):
+        # Categorizar produtos sem categoria ou com categoria "Outros"
+        with medidor.etapa("Categorização"):
             df_categorizado = categorizar_produtos(
                 df, 
                 coluna_descricao='descricao', 
                 coluna_categoria='categoria', 
-                limiar_confianca=0.4,
-                arquivo_categorias=arquivo_categorias
+                arquivo_categorias=arquivo_categorias,
+                diretorio_cache_modelos=DIRETORIO_CACHE_PADRAO,
+                arquivo_cache_resultados=ARQUIVO_CACHE_PADRAO,
+                modelo_similaridade=modelo_similaridade
             )
             
             # Usar a categoria corrigida em vez da original
             df_categorizado['categoria'] = df_categorizado['categoria_corrigida']
             
-            # Remover colunas temporárias usadas na categorização
+            # Remover colunas temporárias usadas na categorização (o DataFrame é nosso, então sem cópia)
             colunas_para_remover = ['categoria_corrigida', 'metodo_categorizacao', 'confianca_categorizacao']
-            for col in colunas_para_remover:
-                if col in df_categorizado.columns:
-                    df_categorizado = df_categorizado.drop(col, axis=1)
-            
-            # Mapear categorias similares para reduzir a categoria "Outros"
-            with st.spinner('Otimizando categorias...'):
-                # Guardar a categoria original antes do mapeamento
-                df_categorizado['categoria_original'] = df_categorizado['categoria']
-                
-                # Obter mapeamento de categorias similares
-                mapeamento_categorias = mapear_categorias_similares(df_categorizado, 'categoria')
-                
-                # Aplicar mapeamento
-                df_categorizado['categoria'] = df_categorizado['categoria'].apply(
-                    lambda x: mapeamento_categorias.get(x, x)
+            df_categorizado.drop(
+                columns=[col for col in colunas_para_remover if col in df_categorizado.columns], inplace=True
+            )
+    
+    return df_categorizado
+
+# Função para mapear categorias similares e reduzir a categoria "Outros"
+def map_similar_categories(df_categorizado, medidor):
+    with st.spinner('Otimizando categorias...'), medidor.etapa("Mapeamento de categorias"):
+        # Guardar a categoria original antes do mapeamento
+        df_categorizado['categoria_original'] = df_categorizado['categoria']
+        
+        # Obter mapeamento de categorias similares
+        mapeamento_categorias = mapear_categorias_similares(df_categorizado, 'categoria')
+        
+        # Aplicar mapeamento
+        df_categorizado['categoria'] = df_categorizado['categoria'].apply(
+            lambda x: mapeamento_categorias.get(x, x)
+        )
+        
+        # Mostrar informações sobre o mapeamento
+        categorias_mapeadas = len(set(mapeamento_categorias.keys()))
+        if categorias_mapeadas > 0:
+            st.sidebar.success(f"✅ {categorias_mapeadas} categorias menores foram mapeadas para categorias principais!")
+    
+    return df_categorizado
+
+# Função para converter os dados carregados para tipos compactos (category, inteiros pequenos)
+def compact_sales_data(df, medidor):
+    with medidor.etapa("Compactação dos tipos") as registro:
+        if medidor.ativo:
+            registro['dados_antes_mb'] = memoria_dataframe_mb(df)
+        df = compact_dtypes(df)
+        if medidor.ativo:
+            registro['dados_depois_mb'] = memoria_dataframe_mb(df)
+    
+    return df
+
+# Função para carregar os dados
+@st.cache_data
+def load_data(file, medir_memoria=False):
+    medidor = MedidorEtapas(ativo=medir_memoria)
+    df = read_sales_file(file, medidor)
+    
+    # Verificar se temos a coluna de descrição e a coluna de categoria
+    if 'descricao' in df.columns and 'categoria' in df.columns:
+        df = map_similar_categories(categorize_sales(df, medidor), medidor)
+    
+    df = compact_sales_data(df, medidor)
+    return df, medidor.etapas
+
+# Acrescentar um arquivo à base local: só as linhas que ainda não estão nela são categorizadas
+@st.cache_data
+def ingest_file(file, caminho_base, medir_memoria=False):
+    medidor = MedidorEtapas(ativo=medir_memoria)
+    df = read_sales_file(file, medidor)
+    linhas_arquivo = len(df)
+    
+    with ArmazemVendas(caminho_base) as armazem:
+        with medidor.etapa("Comparação com a base local"):
+            chaves = chaves_linhas(df)
+            novas = armazem.linhas_novas(chaves)
+            if not novas.all():
+                df = df[novas]
+                chaves = chaves[novas]
+        
+        if len(df) > 0 and 'descricao' in df.columns and 'categoria' in df.columns:
+            # O modelo de similaridade aprende com a base inteira, não só com as linhas novas
+            with medidor.etapa("Treino com a base local"):
+                treino = pd.concat(
+                    [armazem.carregar(colunas=['descricao', 'categoria']), df[['descricao', 'categoria']]],
+                    ignore_index=True
                 )
-                
-                # Mostrar informações sobre o mapeamento
-                categorias_mapeadas = len(set(mapeamento_categorias.keys()))
-                if categorias_mapeadas > 0:
-                    st.sidebar.success(f"✅ {categorias_mapeadas} categorias menores foram mapeadas para categorias principais!")
+                modelo_similaridade = treinar_modelo_similaridade(
+                    treino, 'descricao', 'categoria', diretorio_cache=DIRETORIO_CACHE_PADRAO
+                )
+                del treino
             
-            return df_categorizado
+            df = categorize_sales(df, medidor, modelo_similaridade)
+        
+        with medidor.etapa("Gravação na base local"):
+            linhas_novas = armazem.acrescentar(df, chaves, arquivo=file.name, linhas_arquivo=linhas_arquivo)
     
-    return df
+    return {'linhas_arquivo': linhas_arquivo, 'linhas_novas': linhas_novas}, medidor.etapas
 
-# Adicione esta função simplificada para exportar para CSV
-def get_csv_download_link(df, filename="relatorio_vendas.csv"):
+# Dados do dashboard lidos da base local; `versao_base` muda a cada carga e invalida o cache
+@st.cache_data
+def load_store(caminho_base, versao_base, medir_memoria=False):
+    medidor = MedidorEtapas(ativo=medir_memoria)
+    
+    with ArmazemVendas(caminho_base) as armazem, medidor.etapa("Leitura da base local"):
+        df = armazem.carregar()
+    
+    df = map_similar_categories(df, medidor)
+    df = compact_sales_data(df, medidor)
+    return df, medidor.etapas
+
+# Cubo de agregados calculado uma vez por arquivo; o DataFrame não entra no hash do cache (prefixo "_")
+@st.cache_data(show_spinner=False)
+def load_sales_cube(chave_dados, _df):
+    return build_sales_cube(_df)
+
+# Formatos oferecidos na exportação: extensão do arquivo e tipo MIME
+FORMATOS_EXPORTACAO = {
+    "CSV compactado (.csv.gz)": (".csv.gz", "application/gzip"),
+    "Parquet (.parquet)": (".parquet", "application/vnd.apache.parquet")
+}
+
+# Linhas convertidas por vez; limita a memória extra da exportação a um bloco
+TAMANHO_BLOCO_EXPORTACAO = 100000
+
+def export_to_file(df, extensao, mascara=None, tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
     """
-    Gera um link HTML para download dos dados em formato CSV.
+    Exporta os dados em blocos para um arquivo temporário.
+    
+    Cada bloco é convertido e gravado (CSV compactado com gzip ou um row group
+    Parquet) antes do próximo, então o arquivo nunca é montado inteiro em texto
+    na memória, ao contrário do CSV em base64 usado antes.
     
     Args:
         df (DataFrame): DataFrame com os dados
-        filename (str): Nome do arquivo para download
+        extensao (str): Extensão do arquivo, que define o formato ('.csv.gz' ou '.parquet')
+        mascara (ndarray): Filtro booleano das linhas a exportar (None exporta todas)
+        tamanho_bloco (int): Número de linhas convertidas por vez
         
     Returns:
-        str: Link HTML para download
+        str: Caminho do arquivo gerado (deve ser removido por quem chamou)
     """
-    csv_buffer = BytesIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)
-    b64 = base64.b64encode(csv_buffer.read()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" class="download-button">📥 Baixar Dados CSV</a>'
-    return href
+    descritor, caminho = tempfile.mkstemp(suffix=extensao)
+    os.close(descritor)
+    try:
+        with EscritorBlocos(caminho) as escritor:
+            for inicio in range(0, max(len(df), 1), tamanho_bloco):
+                bloco = df.iloc[inicio:inicio + tamanho_bloco]
+                if mascara is not None:
+                    bloco = bloco[mascara[inicio:inicio + tamanho_bloco]]
+                # Blocos vazios são ignorados, exceto o primeiro (cabeçalho/esquema)
+                if len(bloco) > 0 or escritor.blocos == 0:
+                    escritor.escrever(bloco)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    return caminho
+
+# Versão da base local (0 = vazia); com vendas na base o dashboard abre mesmo sem upload
+versao_base = 0
+if usar_base_local:
+    with ArmazemVendas(CAMINHO_BASE_PADRAO) as armazem:
+        versao_base = armazem.versao()
 
 # Adicione o botão de exportação CSV no sidebar
 if use_example_data:
@@ -179,34 +306,56 @@ if use_example_data:
         })
         return df_example
     
-    df = load_example_data()
-    df_processed = process_data(df)
+    df = compact_dtypes(load_example_data())
+    df_processed = process_data(df, colunas_derivadas=False)
     
     # Mostrar mensagem informativa
     st.sidebar.success("Usando dados de exemplo. Faça upload de seus próprios dados para análise personalizada.")
     
-elif uploaded_file is not None:
+elif uploaded_file is not None or versao_base > 0:
     # Carregar e processar os dados
     with st.spinner('Carregando e processando dados...'):
-        df = load_data(uploaded_file)
-        df_processed = process_data(df)
-    
-    # Adicione o botão de exportação CSV
-    if st.sidebar.button("📥 Exportar Relatório", type="primary"):
-        try:
-            with st.spinner("Gerando relatório CSV..."):
-                # Gerar CSV
-                csv_buffer = BytesIO()
-                df.to_csv(csv_buffer, index=False)
-                csv_buffer.seek(0)
-                
-                # Criar link de download
-                b64 = base64.b64encode(csv_buffer.read()).decode()
-                href = f'<a href="data:file/csv;base64,{b64}" download="relatorio_vendas.csv" class="download-button">📥 Baixar Dados CSV</a>'
-                st.sidebar.markdown(href, unsafe_allow_html=True)
-                st.sidebar.success("Relatório CSV gerado com sucesso!")
-        except Exception as e:
-            st.sidebar.error(f"Erro ao gerar relatório: {str(e)}")
+        if usar_base_local:
+            etapas_memoria = []
+            if uploaded_file is not None:
+                resumo_carga, etapas_memoria = ingest_file(uploaded_file, CAMINHO_BASE_PADRAO, medir_memoria)
+                with ArmazemVendas(CAMINHO_BASE_PADRAO) as armazem:
+                    versao_base = armazem.versao()
+            
+            df, etapas_base = load_store(CAMINHO_BASE_PADRAO, versao_base, medir_memoria)
+            etapas_memoria = etapas_memoria + etapas_base
+            
+            # Agregados usados pelas abas (recalculados apenas quando a base muda)
+            chave_dados = ("base", CAMINHO_BASE_PADRAO, versao_base)
+        else:
+            df, etapas_memoria = load_data(uploaded_file, medir_memoria)
+            
+            # Agregados usados pelas abas (recalculados apenas quando o arquivo muda)
+            chave_dados = (uploaded_file.file_id, uploaded_file.name, uploaded_file.size)
+        
+        medidor = MedidorEtapas(ativo=medir_memoria)
+        with medidor.etapa("Processamento"):
+            df_processed = process_data(df, colunas_derivadas=False)
+    
+    # Pico de memória por etapa (leitura, categorização, mapeamento e processamento)
+    if medir_memoria:
+        with st.sidebar.expander("Memória por etapa", expanded=True):
+            tabela_memoria = pd.concat([pd.DataFrame(etapas_memoria), medidor.tabela()], ignore_index=True)
+            st.dataframe(
+                tabela_memoria.rename(columns={
+                    'etapa': 'Etapa', 'tempo_s': 'Tempo (s)', 'cpu_s': 'CPU (s)', 'linhas_entrada': 'Linhas (entrada)',
+                    'linhas_saida': 'Linhas (saída)', 'pico_mb': 'Pico (MB)', 'retido_mb': 'Retido (MB)',
+                    'dados_antes_mb': 'Dados antes (MB)', 'dados_depois_mb': 'Dados depois (MB)'
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            # Memória ocupada pelos dados antes e depois da conversão para tipos compactos
+            compactacao = [etapa for etapa in etapas_memoria if etapa.get('dados_depois_mb')]
+            if compactacao:
+                antes, depois = compactacao[-1]['dados_antes_mb'], compactacao[-1]['dados_depois_mb']
+                st.caption(f"Dados em memória: {antes:,.1f} MB → {depois:,.1f} MB ({antes / depois:.1f}x menor)")
     
     # Exibir informações sobre a categorização automática
     if 'descricao' in df.columns:
@@ -217,10 +366,88 @@ elif uploaded_file is not None:
         """)
     
     # Exibir informações básicas
-    st.sidebar.success(f"Arquivo carregado com sucesso: {uploaded_file.name}")
+    if uploaded_file is not None:
+        st.sidebar.success(f"Arquivo carregado com sucesso: {uploaded_file.name}")
+    if usar_base_local:
+        if uploaded_file is not None:
+            st.sidebar.info(
+                f"Base local: {resumo_carga['linhas_novas']:,} registros novos de "
+                f"{resumo_carga['linhas_arquivo']:,} no arquivo"
+            )
+        
+        with st.sidebar.expander("Base local"):
+            with ArmazemVendas(CAMINHO_BASE_PADRAO) as armazem:
+                st.dataframe(armazem.cargas(), hide_index=True, use_container_width=True)
+            
+            if st.button("Apagar base local"):
+                with ArmazemVendas(CAMINHO_BASE_PADRAO) as armazem:
+                    armazem.apagar()
+                # O mesmo arquivo enviado de novo precisa ser gravado outra vez
+                ingest_file.clear()
+                load_store.clear()
+                st.rerun()
     st.sidebar.info(f"Total de registros: {len(df)}")
     st.sidebar.info(f"Período: {df['data_venda'].min().strftime('%d/%m/%Y')} a {df['data_venda'].max().strftime('%d/%m/%Y')}")
     
+    cubo = load_sales_cube(chave_dados, df)
+    
+    # Exportação: dados completos, apenas a visão filtrada ou os agregados do cubo
+    with st.sidebar.expander("📥 Exportar Relatório"):
+        escopo_exportacao = st.radio(
+            "Conteúdo",
+            ["Dados completos", "Visão filtrada", "Agregado por categoria", "Agregado por período"],
+            key="escopo_exportacao"
+        )
+        formato_exportacao = st.selectbox("Formato", list(FORMATOS_EXPORTACAO.keys()), key="formato_exportacao")
+        
+        dados_exportacao = df
+        mascara_exportacao = None
+        if escopo_exportacao == "Visão filtrada":
+            categorias_exportacao = st.multiselect(
+                "Categorias", cubo['categorias'].index.tolist(), key="categorias_exportacao"
+            )
+            periodo_exportacao = st.date_input(
+                "Período",
+                value=(df['data_venda'].min().date(), df['data_venda'].max().date()),
+                key="periodo_exportacao"
+            )
+            
+            # Sem categoria selecionada, o filtro considera todas
+            mascara_exportacao = np.ones(len(df), dtype=bool)
+            if categorias_exportacao:
+                mascara_exportacao &= df['categoria'].isin(categorias_exportacao).to_numpy()
+            if len(periodo_exportacao) == 2:
+                # Comparação pelo código inteiro do dia, sem normalizar as datas linha a linha
+                codigos = date_codes(df['data_venda'])
+                inicio, fim = date_codes(pd.to_datetime(list(periodo_exportacao)))
+                mascara_exportacao &= (codigos >= inicio) & (codigos <= fim)
+            st.caption(f"{int(mascara_exportacao.sum()):,} registros selecionados")
+        elif escopo_exportacao == "Agregado por categoria":
+            dados_exportacao = cubo['categorias'].reset_index()
+        elif escopo_exportacao == "Agregado por período":
+            periodo_agregado = st.selectbox("Agrupamento", list(cubo['series'].keys()), key="periodo_agregado")
+            dados_exportacao = cubo['series'][periodo_agregado]
+        
+        if st.button("Gerar arquivo", type="primary"):
+            extensao, tipo_mime = FORMATOS_EXPORTACAO[formato_exportacao]
+            try:
+                with st.spinner("Gerando relatório..."):
+                    caminho_exportacao = export_to_file(dados_exportacao, extensao, mascara_exportacao)
+                try:
+                    # O botão lê o arquivo já compactado; o temporário pode ser removido em seguida
+                    with open(caminho_exportacao, 'rb') as arquivo_exportacao:
+                        st.download_button(
+                            "📥 Baixar arquivo",
+                            data=arquivo_exportacao,
+                            file_name=f"relatorio_vendas{extensao}",
+                            mime=tipo_mime
+                        )
+                finally:
+                    os.remove(caminho_exportacao)
+                st.success("Relatório gerado com sucesso!")
+            except Exception as e:
+                st.error(f"Erro ao gerar relatório: {str(e)}")
+    
     # Layout do dashboard em abas
     tab1, tab2, tab3, tab4 = st.tabs(["Visão Geral", "Análise Temporal", "Análise por Categoria", "Insights"])
     
@@ -231,15 +458,15 @@ elif uploaded_file is not None:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            total_vendas = df['valor_total'].sum()
+            total_vendas = cubo['totais']['valor_total']
             st.metric("Total de Vendas", f"R$ {total_vendas:,.2f}")
         
         with col2:
-            total_pedidos = df['numero_pedido'].nunique()
+            total_pedidos = cubo['totais']['numero_pedido']
             st.metric("Total de Pedidos", f"{total_pedidos:,}")
         
         with col3:
-            total_produtos = df['quantidade'].sum()
+            total_produtos = cubo['totais']['quantidade']
             st.metric("Produtos Vendidos", f"{total_produtos:,}")
         
         with col4:
@@ -248,31 +475,11 @@ elif uploaded_file is not None:
         
         # Gráfico de vendas por categoria
         st.subheader("Vendas por Categoria")
-        vendas_categoria = df.groupby('categoria')['valor_total'].sum().reset_index()
-        vendas_categoria = vendas_categoria.sort_values('valor_total', ascending=False)
 
         # Agrupar categorias pequenas em "Outros"
         limite_percentual = 2.0  # Categorias com menos de 2% serão agrupadas em "Outros"
-        total_vendas = vendas_categoria['valor_total'].sum()
-        vendas_categoria['percentual'] = (vendas_categoria['valor_total'] / total_vendas) * 100
-
-        # Separar categorias principais e secundárias
-        categorias_principais = vendas_categoria[vendas_categoria['percentual'] >= limite_percentual]
-        categorias_secundarias = vendas_categoria[vendas_categoria['percentual'] < limite_percentual]
-
-        # Criar categoria "Outros" se houver categorias secundárias
-        if not categorias_secundarias.empty:
-            outros = pd.DataFrame({
-                'categoria': ['Outros'],
-                'valor_total': [categorias_secundarias['valor_total'].sum()],
-                'percentual': [categorias_secundarias['percentual'].sum()]
-            })
-            vendas_categoria_final = pd.concat([categorias_principais, outros])
-        else:
-            vendas_categoria_final = categorias_principais
-
-        # Ordenar por valor para melhor visualização
-        vendas_categoria_final = vendas_categoria_final.sort_values('valor_total', ascending=False)
+        vendas_categoria_final, categorias_pequenas = group_small_categories(cubo, limite_percentual)
+        total_vendas = vendas_categoria_final['valor_total'].sum()
 
         # Criar gráfico de pizza melhorado
         fig_cat = px.pie(
@@ -322,9 +529,6 @@ elif uploaded_file is not None:
             if categoria_selecionada:
                 # Verificar se é a categoria "Outros" (agrupada)
                 if categoria_selecionada == "Outros":
-                    # Obter todas as categorias pequenas que foram agrupadas em "Outros"
-                    categorias_pequenas = categorias_secundarias['categoria'].tolist()
-                    
                     # Filtrar produtos de todas as categorias pequenas
                     category_products = df[df['categoria'].isin(categorias_pequenas)].copy()
                     
@@ -389,7 +593,7 @@ elif uploaded_file is not None:
         
         # Gráfico de quantidade de produtos por categoria
         st.subheader("Quantidade de Produtos por Categoria")
-        qtd_categoria = df.groupby('categoria')['quantidade'].sum().reset_index()
+        qtd_categoria = cubo['categorias']['quantidade'].reset_index()
         fig_qtd = px.bar(
             qtd_categoria,
             x='categoria',
@@ -407,36 +611,20 @@ elif uploaded_file is not None:
         periodo_options = ["Diário", "Semanal", "Mensal"]
         periodo_selecionado = st.selectbox("Selecione o período de análise:", periodo_options)
         
+        # Séries já agregadas no cubo (valor, quantidade e pedidos distintos por período)
+        df_tempo = cubo['series'][periodo_selecionado]
         if periodo_selecionado == "Diário":
-            df_tempo = df.groupby(df['data_venda'].dt.date).agg({
-                'valor_total': 'sum',
-                'quantidade': 'sum',
-                'numero_pedido': 'nunique'
-            }).reset_index()
             x_axis = 'data_venda'
         elif periodo_selecionado == "Semanal":
-            df['semana'] = df['data_venda'].dt.isocalendar().week
-            df['ano'] = df['data_venda'].dt.isocalendar().year
-            df['semana_ano'] = df['ano'].astype(str) + "-" + df['semana'].astype(str)
-            df_tempo = df.groupby('semana_ano').agg({
-                'valor_total': 'sum',
-                'quantidade': 'sum',
-                'numero_pedido': 'nunique'
-            }).reset_index()
             x_axis = 'semana_ano'
         else:  # Mensal
-            df['mes_ano'] = df['data_venda'].dt.strftime('%Y-%m')
-            df_tempo = df.groupby('mes_ano').agg({
-                'valor_total': 'sum',
-                'quantidade': 'sum',
-                'numero_pedido': 'nunique'
-            }).reset_index()
             x_axis = 'mes_ano'
         
         # Gráfico de linha para vendas ao longo do tempo
         st.subheader(f"Evolução de Vendas ({periodo_selecionado})")
+        # Séries longas (ex.: vários anos diários) são reduzidas com LTTB antes de ir ao navegador
         fig_tempo = px.line(
-            df_tempo,
+            downsample_series(df_tempo, x_axis, 'valor_total'),
             x=x_axis,
             y='valor_total',
             markers=True,
@@ -459,7 +647,7 @@ elif uploaded_file is not None:
         # Gráfico de linha para número de pedidos ao longo do tempo
         st.subheader(f"Evolução do Número de Pedidos ({periodo_selecionado})")
         fig_pedidos = px.line(
-            df_tempo,
+            downsample_series(df_tempo, x_axis, 'numero_pedido'),
             x=x_axis,
             y='numero_pedido',
             markers=True,
@@ -472,18 +660,16 @@ elif uploaded_file is not None:
         st.header("Análise por Categoria")
         
         # Seletor de categoria
-        categorias = sorted([str(cat) for cat in df['categoria'].unique()])
+        categorias = sorted([str(cat) for cat in cubo['categorias'].index])
         categoria_selecionada = st.selectbox("Selecione uma categoria para análise detalhada:", categorias)
         
-        # Filtrar dados pela categoria selecionada
-        df_cat = df[df['categoria'] == categoria_selecionada]
-        
-        # Métricas da categoria
+        # Métricas da categoria selecionada
+        metricas_categoria = category_metrics(cubo, categoria_selecionada)
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            cat_vendas = df_cat['valor_total'].sum()
-            percentual_vendas = (cat_vendas / df['valor_total'].sum()) * 100
+            cat_vendas = metricas_categoria['valor_total']
+            percentual_vendas = metricas_categoria['percentual_vendas']
             st.metric(
                 "Total de Vendas", 
                 f"R$ {cat_vendas:,.2f}",
@@ -491,8 +677,8 @@ elif uploaded_file is not None:
             )
         
         with col2:
-            cat_produtos = df_cat['quantidade'].sum()
-            percentual_produtos = (cat_produtos / df['quantidade'].sum()) * 100
+            cat_produtos = metricas_categoria['quantidade']
+            percentual_produtos = metricas_categoria['percentual_produtos']
             st.metric(
                 "Produtos Vendidos", 
                 f"{cat_produtos:,}",
@@ -500,8 +686,8 @@ elif uploaded_file is not None:
             )
         
         with col3:
-            cat_pedidos = df_cat['numero_pedido'].nunique()
-            percentual_pedidos = (cat_pedidos / df['numero_pedido'].nunique()) * 100
+            cat_pedidos = metricas_categoria['numero_pedido']
+            percentual_pedidos = metricas_categoria['percentual_pedidos']
             st.metric(
                 "Número de Pedidos", 
                 f"{cat_pedidos:,}",
@@ -510,11 +696,7 @@ elif uploaded_file is not None:
         
         # Evolução temporal da categoria
         st.subheader(f"Evolução de Vendas - {categoria_selecionada}")
-        df_cat['mes_ano'] = df_cat['data_venda'].dt.strftime('%Y-%m')
-        df_cat_tempo = df_cat.groupby('mes_ano').agg({
-            'valor_total': 'sum',
-            'quantidade': 'sum'
-        }).reset_index()
+        df_cat_tempo = metricas_categoria['evolucao_mensal']
         
         fig_cat_tempo = px.line(
             df_cat_tempo,
@@ -528,10 +710,7 @@ elif uploaded_file is not None:
         
         # Comparação com outras categorias
         st.subheader("Comparação com Outras Categorias")
-        df_comp = df.groupby('categoria').agg({
-            'valor_total': 'sum',
-            'quantidade': 'sum'
-        }).reset_index()
+        df_comp = cubo['categorias'][['valor_total', 'quantidade']].reset_index()
         
         df_comp = df_comp.sort_values('valor_total', ascending=False)
         
@@ -555,8 +734,8 @@ elif uploaded_file is not None:
     with tab4:
         st.header("Insights e Recomendações")
         
-        # Gerar insights baseados nos dados
-        insights = generate_insights(df)
+        # Gerar insights baseados nos dados (em cache por arquivo; gráficos construídos ao exibir)
+        insights = generate_insights(df, chave_dados=chave_dados)
         
         # Exibir insights
         for i, insight in enumerate(insights):
@@ -572,27 +751,16 @@ elif uploaded_file is not None:
         st.subheader("Recomendações")
         
         # Categoria com maior crescimento
-        df['mes_ano'] = df['data_venda'].dt.strftime('%Y-%m')
-        df_crescimento = df.pivot_table(
-            index='categoria',
-            columns='mes_ano',
-            values='valor_total',
-            aggfunc='sum'
-        ).fillna(0)
-        
-        if len(df_crescimento.columns) >= 2:
-            df_crescimento['variacao'] = df_crescimento[df_crescimento.columns[-1]] / df_crescimento[df_crescimento.columns[-2]] - 1
-            categoria_crescimento = df_crescimento['variacao'].idxmax()
-            taxa_crescimento = df_crescimento.loc[categoria_crescimento, 'variacao'] * 100
+        crescimento = growth_recommendation(cubo)
+        
+        if crescimento is not None:
+            categoria_crescimento, taxa_crescimento = crescimento
             
             if taxa_crescimento > 0:
                 st.info(f"📈 A categoria **{categoria_crescimento}** apresentou o maior crescimento recente ({taxa_crescimento:.1f}%). Considere aumentar o investimento nesta categoria.")
         
         # Categoria com maior ticket médio
-        df_ticket = df.groupby('categoria').agg({
-            'valor_total': 'sum',
-            'numero_pedido': 'nunique'
-        })
+        df_ticket = cubo['categorias'][['valor_total', 'numero_pedido']].copy()
         df_ticket['ticket_medio'] = df_ticket['valor_total'] / df_ticket['numero_pedido']
         categoria_ticket = df_ticket['ticket_medio'].idxmax()
         ticket_max = df_ticket.loc[categoria_ticket, 'ticket_medio']
@@ -600,28 +768,9 @@ elif uploaded_file is not None:
         st.info(f"💰 A categoria **{categoria_ticket}** possui o maior ticket médio (R$ {ticket_max:.2f}). Considere estratégias para aumentar o cross-selling nesta categoria.")
         
         # Dias da semana com melhor desempenho
-        df['dia_semana'] = df['data_venda'].dt.day_name()
-        df_dia = df.groupby('dia_semana').agg({
-            'valor_total': 'sum'
-        }).reset_index()
-        
-        # Mapear nomes dos dias para português e ordenar corretamente
-        dias_semana_pt = {
-            'Monday': 'Segunda-feira',
-            'Tuesday': 'Terça-feira',
-            'Wednesday': 'Quarta-feira',
-            'Thursday': 'Quinta-feira',
-            'Friday': 'Sexta-feira',
-            'Saturday': 'Sábado',
-            'Sunday': 'Domingo'
-        }
-        
-        ordem_dias = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
-        
-        df_dia['dia_semana_pt'] = df_dia['dia_semana'].map(dias_semana_pt)
-        df_dia = df_dia.sort_values(by='valor_total', ascending=False)
-        
-        melhor_dia = df_dia.iloc[0]['dia_semana_pt']
+        df_dia = cubo['dia_semana'].sort_values(ascending=False)
+        
+        melhor_dia = df_dia.index[0]
         st.info(f"📅 **{melhor_dia}** é o dia com maior volume de vendas. Considere programar promoções e campanhas para este dia da semana.")
 
 else:
@@ -0,0 +1,212 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Arquivo padrão da base local (pode ser alterado pela variável de ambiente)
+CAMINHO_BASE_PADRAO = os.environ.get(
+    "DASHBOARD_VENDAS_BASE",
+    os.path.join(os.path.expanduser("~"), ".local", "share", "dashboard-vendas", "vendas.sqlite")
+)
+
+# Formato das datas gravadas na base
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Colunas guardadas na base (as demais colunas do arquivo não são usadas pelo dashboard)
+COLUNAS_BASE = ['numero_pedido', 'data_venda', 'quantidade', 'valor_total', 'categoria', 'descricao']
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cargas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    arquivo TEXT,
+    linhas_arquivo INTEGER,
+    linhas_novas INTEGER,
+    carregado_em TEXT
+);
+CREATE TABLE IF NOT EXISTS vendas (
+    chave INTEGER PRIMARY KEY,
+    carga INTEGER NOT NULL,
+    linha INTEGER NOT NULL,
+    numero_pedido,
+    data_venda TEXT,
+    quantidade,
+    valor_total REAL,
+    categoria TEXT,
+    descricao TEXT
+);
+"""
+
+def _converter_distintos(serie, conversao):
+    """Aplica `conversao` (vetorizada) apenas aos valores distintos de `serie`; ausentes continuam ausentes."""
+    codigos, distintos = pd.factorize(serie)
+    convertidos = pd.Series(conversao(distintos)).take(np.maximum(codigos, 0)).to_numpy()
+    return pd.Series(np.where(codigos >= 0, convertidos, None), index=serie.index, name=serie.name)
+
+def chaves_linhas(df):
+    """
+    Calcula a identidade de cada linha de venda.
+    
+    A chave combina o número do pedido com a descrição, a quantidade e o valor
+    do item, mais o número da ocorrência para itens idênticos no mesmo pedido.
+    Os campos são normalizados como texto, então o mesmo pedido lido de um CSV
+    ou de uma planilha gera a mesma chave.
+    
+    Args:
+        df (DataFrame): Dados já com as colunas renomeadas
+    
+    Returns:
+        ndarray: Chave inteira (int64) de cada linha
+    """
+    identidade = pd.DataFrame({
+        'numero_pedido': df['numero_pedido'].astype(str).str.replace(r'\.0$', '', regex=True),
+        'descricao': df['descricao'].astype(str).str.strip() if 'descricao' in df.columns else '',
+        'quantidade': pd.to_numeric(df['quantidade'], errors='coerce').astype(float).astype(str),
+        'valor_total': pd.to_numeric(df['valor_total'], errors='coerce').round(2).astype(str)
+    })
+    identidade['ocorrencia'] = identidade.groupby(list(identidade.columns), sort=False).cumcount()
+    
+    # hash_pandas_object é determinístico entre execuções (chave de hash fixa)
+    return pd.util.hash_pandas_object(identidade, index=False).to_numpy().view(np.int64)
+
+class ArmazemVendas:
+    """
+    Base local (SQLite) com as vendas já categorizadas de todos os uploads.
+    
+    As linhas são acrescentadas pela chave de `chaves_linhas`, então carregar
+    de novo um arquivo, ou arquivos com períodos sobrepostos, não duplica vendas.
+    Cada carga é registrada em `cargas`; o id da última carga identifica o
+    conteúdo da base e serve de chave para os caches do dashboard.
+    """
+    
+    def __init__(self, caminho=CAMINHO_BASE_PADRAO):
+        """
+        Args:
+            caminho (str): Arquivo SQLite da base (criado se não existir)
+        """
+        self.caminho = caminho
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.conexao = sqlite3.connect(caminho)
+        self.conexao.executescript(ESQUEMA)
+    
+    def fechar(self):
+        self.conexao.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fechar()
+    
+    def versao(self):
+        """
+        Returns:
+            int: Id da última carga que acrescentou linhas (0 se a base estiver vazia)
+        """
+        linha = self.conexao.execute("SELECT MAX(id) FROM cargas WHERE linhas_novas > 0").fetchone()
+        return linha[0] or 0
+    
+    def linhas_novas(self, chaves):
+        """
+        Indica quais chaves ainda não estão na base.
+        
+        As chaves são comparadas pelo índice da chave primária, sem carregar a base.
+        
+        Args:
+            chaves (ndarray): Chaves calculadas por `chaves_linhas`
+        
+        Returns:
+            ndarray: Máscara booleana das linhas novas
+        """
+        with self.conexao:
+            self.conexao.execute("CREATE TEMP TABLE IF NOT EXISTS _candidatas (chave INTEGER PRIMARY KEY)")
+            self.conexao.execute("DELETE FROM _candidatas")
+            self.conexao.executemany(
+                "INSERT OR IGNORE INTO _candidatas VALUES (?)", ((int(chave),) for chave in chaves)
+            )
+            existentes = [linha[0] for linha in self.conexao.execute(
+                "SELECT chave FROM _candidatas WHERE chave IN (SELECT chave FROM vendas)"
+            )]
+            self.conexao.execute("DELETE FROM _candidatas")
+        return ~np.isin(chaves, np.array(existentes, dtype=np.int64))
+    
+    def acrescentar(self, df, chaves, arquivo=None, linhas_arquivo=None):
+        """
+        Acrescenta vendas categorizadas à base.
+        
+        Chaves já existentes são ignoradas, então a operação é idempotente.
+        
+        Args:
+            df (DataFrame): Vendas com as colunas de `COLUNAS_BASE`
+            chaves (ndarray): Chave de cada linha de `df`
+            arquivo (str): Nome do arquivo de origem, registrado na carga
+            linhas_arquivo (int): Número de linhas do arquivo de origem
+        
+        Returns:
+            int: Número de linhas efetivamente acrescentadas
+        """
+        colunas = [coluna for coluna in COLUNAS_BASE if coluna in df.columns]
+        novas = df[colunas].copy(deep=False)
+        novas.insert(0, 'linha', np.arange(len(novas)))
+        novas.insert(0, 'chave', chaves)
+        if 'data_venda' in novas.columns:
+            novas['data_venda'] = _converter_distintos(
+                pd.to_datetime(novas['data_venda']), lambda datas: datas.strftime(FORMATO_DATA)
+            )
+        
+        with self.conexao:
+            cursor = self.conexao.execute(
+                "INSERT INTO cargas (arquivo, linhas_arquivo, linhas_novas, carregado_em) VALUES (?, ?, 0, ?)",
+                (arquivo, linhas_arquivo if linhas_arquivo is not None else len(df), datetime.now().isoformat())
+            )
+            carga = cursor.lastrowid
+            novas.insert(1, 'carga', carga)
+            
+            # Tabela temporária + INSERT OR IGNORE: linhas repetidas no próprio lote também são descartadas
+            novas.to_sql('_lote', self.conexao, if_exists='replace', index=False, chunksize=50000)
+            lista_colunas = ", ".join(novas.columns)
+            cursor = self.conexao.execute(
+                f"INSERT OR IGNORE INTO vendas ({lista_colunas}) SELECT {lista_colunas} FROM _lote"
+            )
+            acrescentadas = cursor.rowcount
+            self.conexao.execute("DROP TABLE _lote")
+            self.conexao.execute("UPDATE cargas SET linhas_novas = ? WHERE id = ?", (acrescentadas, carga))
+        
+        return acrescentadas
+    
+    def carregar(self, colunas=None):
+        """
+        Lê todas as vendas na ordem em que foram acrescentadas.
+        
+        Args:
+            colunas (list): Colunas lidas, entre as de `COLUNAS_BASE` (None lê todas)
+        
+        Returns:
+            DataFrame: Vendas com as colunas pedidas
+        """
+        colunas = COLUNAS_BASE if colunas is None else [coluna for coluna in COLUNAS_BASE if coluna in colunas]
+        df = pd.read_sql_query(
+            f"SELECT {', '.join(colunas)} FROM vendas ORDER BY carga, linha", self.conexao
+        )
+        if 'data_venda' in df.columns:
+            df['data_venda'] = pd.to_datetime(
+                _converter_distintos(df['data_venda'], lambda textos: pd.to_datetime(textos, format=FORMATO_DATA))
+            )
+        if 'categoria' in df.columns:
+            df['categoria'] = df['categoria'].astype(str)
+        return df
+    
+    def cargas(self):
+        """
+        Returns:
+            DataFrame: Histórico de cargas (arquivo, linhas lidas, linhas novas e data)
+        """
+        return pd.read_sql_query("SELECT * FROM cargas ORDER BY id", self.conexao)
+    
+    def apagar(self):
+        """Remove todas as vendas e o histórico de cargas."""
+        with self.conexao:
+            self.conexao.execute("DELETE FROM vendas")
+            self.conexao.execute("DELETE FROM cargas")
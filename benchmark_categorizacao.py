@@ -0,0 +1,399 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+import categorizar_produtos
+from indice_similaridade import recall_vizinhos
+from medicao import MedidorEtapas
+
+# Incrementar sempre que o formato do arquivo de resultados mudar
+VERSAO_FORMATO = 1
+
+ARQUIVO_CATEGORIAS_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "categorias-produtos.md")
+
+TAMANHOS_PADRAO = [10000, 100000, 1000000]
+
+# Raiz da árvore de categorias do marketplace correspondente a cada categoria das regras
+RAIZES_TAXONOMIA = {
+    'Maquiagem': 'Maquiagem',
+    'Skincare': 'Cuidados para Pele',
+    'Cabelo': 'Cabelos',
+    'Perfumaria': 'Perfumes',
+    'Corpo': 'Cuidados para Pele',
+    'Unhas': 'Maquiagem',
+    'Acessórios': 'Acessórios',
+    'Cuidados Pessoais': 'Cuidados Pessoais'
+}
+
+MARCAS = [
+    "Bella Flor", "Pele Viva", "Aurora", "Jardim Secreto", "Essenza", "Brisa do Mar", "Lume", "Carioca Beauty",
+    "Ipê", "Vitória Régia", "Cacau & Mel", "Amazônia Pura", "Doce Lar", "Serena", "Glamour"
+]
+
+ATRIBUTOS = [
+    "Matte", "Hidratante", "Longa Duração", "à Prova d'Água", "Vegano", "Nude", "Rosa", "Vermelho",
+    "Sem Perfume", "Efeito Glow", "Pele Oleosa", "Pele Seca", "Cachos", "Lisos", "Noite", "Dia",
+    "Kit 3 unidades", "Refil", "Edição Limitada", "Toque Seco"
+]
+
+MEDIDAS = ["30ml", "50ml", "100ml", "120ml", "200ml", "250ml", "400ml", "3,5g", "10g", "15g", "1 un"]
+
+# Nomes dos produtos sem palavra-chave das regras
+NOMES_SEM_PALAVRA_CHAVE = [
+    "Presente", "Caixa", "Coleção", "Especial", "Lançamento", "Clássico", "Tradicional", "Premium", "Mini",
+    "Duo", "Trio", "Combo", "Surpresa", "Sortido"
+]
+
+def _linhas_taxonomia(arquivo_categorias):
+    with open(arquivo_categorias, 'r', encoding='utf-8') as f:
+        return [linha.strip() for linha in f if linha.strip()]
+
+def gerar_dados(linhas, semente=42, fracao_outros=0.2, fracao_vazias=0.15, taxa_duplicatas=0.7,
+                fracao_sem_palavra_chave=0.15, arquivo_categorias=ARQUIVO_CATEGORIAS_PADRAO):
+    """
+    Gera vendas sintéticas de cosméticos para o benchmark.
+    
+    Cada produto combina uma palavra-chave das regras com marca, atributo e
+    medida; parte dos produtos não tem palavra-chave nem marca ou atributo que
+    casem com as regras (só a similaridade ou os últimos recursos os resolvem).
+    Linhas com categoria "Outros" costumam ser resolvidas pelo mapeamento da
+    taxonomia; as sem categoria passam pela cascata. As linhas sorteiam produtos de um catálogo
+    com `linhas * (1 - taxa_duplicatas)` itens, e a categoria original é uma
+    linha de `categorias-produtos.md` da mesma raiz do produto, "Outros" ou vazia.
+    
+    Args:
+        linhas (int): Número de linhas
+        semente (int): Semente do gerador (mesma semente, mesmos dados)
+        fracao_outros (float): Fração das linhas com categoria "Outros" (literal ou caminho com "Outros")
+        fracao_vazias (float): Fração das linhas sem categoria (vazia ou nula)
+        taxa_duplicatas (float): Fração das linhas que repetem a descrição de outra linha
+        fracao_sem_palavra_chave (float): Fração dos produtos sem palavra-chave das regras
+        arquivo_categorias (str): Arquivo de categorias de referência
+    
+    Returns:
+        DataFrame: Vendas com as colunas do arquivo exportado pelo marketplace
+    """
+    rng = np.random.default_rng(semente)
+    
+    # Pares (categoria, palavra-chave) das regras, sorteados de forma uniforme
+    regras = categorizar_produtos.criar_regras_categorias()
+    pares = [(categoria, palavra) for categoria, palavras in regras.items() for palavra in palavras]
+    categorias_regras = np.array([categoria for categoria, _ in pares], dtype=object)
+    palavras_chave = pd.Series([palavra for _, palavra in pares], dtype=object).str.capitalize().to_numpy()
+    
+    # Marcas e atributos que não casam com nenhuma regra, para os produtos sem palavra-chave
+    motor = categorizar_produtos.MotorRegras(regras)
+    marcas = np.array(MARCAS, dtype=object)
+    atributos = np.array(ATRIBUTOS, dtype=object)
+    marcas_neutras = marcas[pd.isna(motor.categorizar(pd.Series(marcas)).values)]
+    atributos_neutros = atributos[pd.isna(motor.categorizar(pd.Series(atributos)).values)]
+    
+    # Catálogo de produtos distintos
+    produtos = max(1, int(round(linhas * (1 - taxa_duplicatas))))
+    escolhidos = rng.integers(0, len(pares), produtos)
+    sem_palavra = rng.random(produtos) < fracao_sem_palavra_chave
+    tipos = np.where(
+        sem_palavra,
+        np.array(NOMES_SEM_PALAVRA_CHAVE, dtype=object)[rng.integers(0, len(NOMES_SEM_PALAVRA_CHAVE), produtos)],
+        palavras_chave[escolhidos]
+    )
+    marcas_produtos = np.where(
+        sem_palavra,
+        marcas_neutras[rng.integers(0, len(marcas_neutras), produtos)],
+        marcas[rng.integers(0, len(marcas), produtos)]
+    )
+    atributos_produtos = np.where(
+        sem_palavra,
+        atributos_neutros[rng.integers(0, len(atributos_neutros), produtos)],
+        atributos[rng.integers(0, len(atributos), produtos)]
+    )
+    descricoes = (
+        pd.Series(tipos) + " " + pd.Series(marcas_produtos) + " " + pd.Series(atributos_produtos)
+        + " " + pd.Series(np.array(MEDIDAS, dtype=object)[rng.integers(0, len(MEDIDAS), produtos)])
+    )
+    # Código de referência para que produtos distintos não colidam no texto
+    descricoes = (descricoes + " Ref. " + pd.Series(np.arange(produtos)).astype(str)).to_numpy(dtype=object)
+    raizes_produtos = np.array([RAIZES_TAXONOMIA.get(c, c) for c in categorias_regras[escolhidos]], dtype=object)
+    
+    # Linhas: cada uma sorteia um produto do catálogo
+    produto_linha = rng.integers(0, produtos, linhas)
+    
+    # Categoria original: linha da taxonomia com a mesma raiz do produto
+    taxonomia = _linhas_taxonomia(arquivo_categorias)
+    linhas_por_raiz = {}
+    for caminho in taxonomia:
+        linhas_por_raiz.setdefault(caminho.split(">")[0].strip(), []).append(caminho)
+    caminhos_outros = np.array([c for c in taxonomia if c.startswith("Outros")] or ["Outros"], dtype=object)
+    
+    categorias = np.full(linhas, "Outros", dtype=object)
+    raiz_linha = raizes_produtos[produto_linha]
+    for raiz in np.unique(raiz_linha):
+        opcoes = np.array(linhas_por_raiz.get(raiz, [raiz]), dtype=object)
+        mascara = raiz_linha == raiz
+        categorias[mascara] = opcoes[rng.integers(0, len(opcoes), int(mascara.sum()))]
+    
+    sorteio = rng.random(linhas)
+    mascara_outros = sorteio < fracao_outros
+    categorias[mascara_outros] = np.where(
+        rng.random(int(mascara_outros.sum())) < 0.5,
+        "Outros",
+        caminhos_outros[rng.integers(0, len(caminhos_outros), int(mascara_outros.sum()))]
+    )
+    mascara_vazias = (sorteio >= fracao_outros) & (sorteio < fracao_outros + fracao_vazias)
+    categorias[mascara_vazias] = np.where(rng.random(int(mascara_vazias.sum())) < 0.5, "", None)
+    
+    quantidades = rng.integers(1, 6, linhas)
+    return pd.DataFrame({
+        'Número': np.arange(linhas) // 2 + 100000,
+        'Descrição do produto': descricoes[produto_linha],
+        'Categoria do produto': categorias,
+        'Quantidade de produtos': quantidades,
+        'Valor total da venda': np.round(quantidades * rng.uniform(9.9, 199.9, linhas), 2),
+        'Data da venda': pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, linhas), unit='D')
+    })
+
+def executar_benchmark(linhas, semente=42, repeticoes=1, workers=1, arquivo_categorias=ARQUIVO_CATEGORIAS_PADRAO,
+                       usar_taxonomia=True, indice_similaridade='exato', **parametros_gerador):
+    """
+    Mede cada etapa de `categorizar_produtos` sobre dados sintéticos.
+    
+    Os caches de modelos e de resultados ficam desativados e a taxonomia é
+    descartada da memória a cada repetição, então cada execução treina e
+    classifica tudo (a taxonomia compilada em disco continua sendo usada).
+    Com várias repetições, cada etapa guarda o menor tempo observado.
+    
+    Com a taxonomia, as palavras dos nomes das categorias entram nas regras e
+    resolvem quase todas as descrições; sem ela (`usar_taxonomia=False`) a
+    similaridade e os últimos recursos passam a ser exercitados.
+    
+    Args:
+        linhas (int): Número de linhas geradas
+        semente (int): Semente do gerador
+        repeticoes (int): Número de execuções
+        workers (int): Processos usados na classificação
+        arquivo_categorias (str): Arquivo de categorias de referência (usado também na geração dos dados)
+        usar_taxonomia (bool): Se False, a categorização roda sem o arquivo de categorias
+        indice_similaridade (str): Busca na similaridade ('exato', 'aproximado' ou 'centroides')
+        **parametros_gerador: Demais parâmetros de `gerar_dados`
+    
+    Returns:
+        dict: Tempos por etapa, tempo total, vazão e contagem por método
+    """
+    df = gerar_dados(linhas, semente, arquivo_categorias=arquivo_categorias, **parametros_gerador)
+    pares_unicos = len(df[['Descrição do produto', 'Categoria do produto']].drop_duplicates())
+    
+    melhores_etapas = None
+    melhor_total = None
+    for _ in range(repeticoes):
+        categorizar_produtos._taxonomias_carregadas.clear()
+        perfil = MedidorEtapas(memoria=False)
+        
+        # As estatísticas impressas pela categorização não fazem parte do resultado
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            resultado = categorizar_produtos.categorizar_produtos(
+                df, 'Descrição do produto', 'Categoria do produto',
+                arquivo_categorias=arquivo_categorias if usar_taxonomia else None, workers=workers, perfil=perfil,
+                indice_similaridade=indice_similaridade
+            )
+            total = time.perf_counter() - inicio
+        
+        # Etapas repetidas (ex.: regras compiladas e aplicadas) são somadas
+        etapas = perfil.tabela().groupby('etapa', sort=False)['tempo_s'].sum().to_dict()
+        if melhores_etapas is None:
+            melhores_etapas, melhor_total = etapas, total
+        else:
+            melhores_etapas = {nome: min(tempo, etapas.get(nome, tempo)) for nome, tempo in melhores_etapas.items()}
+            melhor_total = min(melhor_total, total)
+    
+    return {
+        'linhas': linhas,
+        'pares_unicos': pares_unicos,
+        'tempo_total_s': melhor_total,
+        'linhas_por_s': linhas / melhor_total if melhor_total > 0 else None,
+        'etapas': melhores_etapas,
+        'metodos': resultado['metodo_categorizacao'].value_counts().to_dict()
+        if 'metodo_categorizacao' in resultado.columns else {}
+    }
+
+def avaliar_indice(linhas, semente=42, k=5, arquivo_categorias=ARQUIVO_CATEGORIAS_PADRAO, **parametros_gerador):
+    """
+    Compara o índice aproximado e os centroides com a busca exata sobre dados sintéticos.
+    
+    Os modelos são treinados com as linhas de categoria conhecida e
+    consultados com as descrições únicas das demais linhas, que são as que a
+    similaridade classifica na cascata. A fração de votos na mesma categoria
+    também reflete empates: a mesma descrição aparece no treino com categorias
+    diferentes, e cada busca escolhe entre as linhas empatadas à sua maneira.
+    
+    Args:
+        linhas (int): Número de linhas geradas
+        semente (int): Semente do gerador
+        k (int): Número de vizinhos avaliados no recall
+        arquivo_categorias (str): Arquivo de categorias usado na geração dos dados
+        **parametros_gerador: Demais parâmetros de `gerar_dados`
+    
+    Returns:
+        dict: Linhas de treino, consultas, tempos de treino e de consulta de cada índice,
+            recall@k do índice aproximado e, para o índice aproximado e os centroides, a fração
+            das consultas em que a categoria escolhida é a mesma da busca exata
+    """
+    df = gerar_dados(linhas, semente, arquivo_categorias=arquivo_categorias, **parametros_gerador)
+    descricoes_prep = categorizar_produtos.preprocessar_serie(df['Descrição do produto'])
+    mascara_conhecidos = categorizar_produtos.mascara_categorias_conhecidas(df['Categoria do produto']).values
+    textos = descricoes_prep[mascara_conhecidos].tolist()
+    categorias = df['Categoria do produto'].values[mascara_conhecidos]
+    consultas = pd.Series(descricoes_prep[~mascara_conhecidos].unique(), dtype=object)
+    
+    resultado = {'linhas': linhas, 'linhas_treino': len(textos), 'consultas': len(consultas), 'k': k}
+    votos = {}
+    modelos = {}
+    for indice in categorizar_produtos.INDICES_SIMILARIDADE:
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            modelos[indice] = categorizar_produtos.treinar_modelo_com_pares(textos, categorias, indice=indice)
+            resultado[f'treino_{indice}_s'] = time.perf_counter() - inicio
+            
+            inicio = time.perf_counter()
+            votos[indice], _ = categorizar_produtos.categorizar_por_similaridade_em_lote(
+                consultas, *modelos[indice], descricoes_prep=consultas
+            )
+            resultado[f'consulta_{indice}_s'] = time.perf_counter() - inicio
+    
+    vectorizer, modelo, _ = modelos['aproximado']
+    resultado[f'recall@{k}'] = recall_vizinhos(modelo, vectorizer.transform(consultas), k)
+    for indice in ('aproximado', 'centroides'):
+        resultado[f'mesma_categoria_{indice}'] = float((votos['exato'].values == votos[indice].values).mean())
+    return resultado
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def tabela_resultados(resultados):
+    """
+    Returns:
+        DataFrame: Uma linha por tamanho e uma coluna por etapa (segundos), mais o total
+    """
+    linhas = []
+    for resultado in resultados:
+        linha = {'linhas': resultado['linhas']}
+        linha.update(resultado['etapas'])
+        linha['total'] = resultado['tempo_total_s']
+        linhas.append(linha)
+    return pd.DataFrame(linhas).set_index('linhas')
+
+def comparar_resultados(anterior, atual):
+    """
+    Compara dois arquivos de resultados, etapa a etapa, para os tamanhos em comum.
+    
+    Args:
+        anterior (dict): Conteúdo do arquivo de resultados de referência
+        atual (dict): Conteúdo do arquivo de resultados novo
+    
+    Returns:
+        DataFrame: Tempos de cada etapa nos dois arquivos e a razão atual/anterior
+    """
+    tabela_anterior = tabela_resultados(anterior['resultados'])
+    tabela_atual = tabela_resultados(atual['resultados'])
+    comparacao = pd.concat(
+        {'anterior_s': tabela_anterior.stack(), 'atual_s': tabela_atual.stack()}, axis=1
+    ).dropna()
+    comparacao['razao'] = comparacao['atual_s'] / comparacao['anterior_s']
+    comparacao.index.names = ['linhas', 'etapa']
+    return comparacao
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da categorização de produtos com dados sintéticos.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO, help='Números de linhas medidos')
+    parser.add_argument('--semente', type=int, default=42, help='Semente do gerador de dados')
+    parser.add_argument('--repeticoes', type=int, default=1, help='Execuções por tamanho (vale o menor tempo de cada etapa)')
+    parser.add_argument('--workers', type=int, default=1, help='Número de processos usados na classificação')
+    parser.add_argument('--fracao-outros', type=float, default=0.2, help='Fração das linhas com categoria "Outros"')
+    parser.add_argument('--fracao-vazias', type=float, default=0.15, help='Fração das linhas sem categoria')
+    parser.add_argument('--taxa-duplicatas', type=float, default=0.7, help='Fração das linhas que repetem uma descrição')
+    parser.add_argument('--arquivo-categorias', default=ARQUIVO_CATEGORIAS_PADRAO, help='Arquivo de categorias de referência')
+    parser.add_argument('--sem-taxonomia', action='store_true', help='Categorizar sem o arquivo de categorias (exercita a similaridade)')
+    parser.add_argument('--indice-similaridade', choices=categorizar_produtos.INDICES_SIMILARIDADE, default='exato', help='Busca dos vizinhos na similaridade')
+    parser.add_argument('--avaliar-indice', action='store_true', help='Comparar também o índice aproximado (recall@5) e os centroides com a busca exata')
+    parser.add_argument('--saida', default='benchmark_resultados.json', help='Arquivo JSON com os resultados')
+    parser.add_argument('--comparar', help='Arquivo JSON de uma execução anterior para comparar os tempos')
+    
+    args = parser.parse_args()
+    
+    parametros_gerador = {
+        'fracao_outros': args.fracao_outros,
+        'fracao_vazias': args.fracao_vazias,
+        'taxa_duplicatas': args.taxa_duplicatas
+    }
+    
+    resultados = []
+    for linhas in args.tamanhos:
+        print(f"Medindo {linhas} linhas...", flush=True)
+        resultado = executar_benchmark(
+            linhas, args.semente, args.repeticoes, args.workers, args.arquivo_categorias,
+            usar_taxonomia=not args.sem_taxonomia, indice_similaridade=args.indice_similaridade, **parametros_gerador
+        )
+        print(f"  {resultado['tempo_total_s']:.2f}s ({resultado['linhas_por_s']:,.0f} linhas/s)", flush=True)
+        if args.avaliar_indice:
+            resultado['indice'] = avaliar_indice(
+                linhas, args.semente, arquivo_categorias=args.arquivo_categorias, **parametros_gerador
+            )
+            print(f"  recall@5 do índice aproximado: {resultado['indice']['recall@5']:.3f}", flush=True)
+        resultados.append(resultado)
+    
+    saida = {
+        'versao_formato': VERSAO_FORMATO,
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'sklearn': sklearn.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'parametros': dict(
+            parametros_gerador, semente=args.semente, repeticoes=args.repeticoes, workers=args.workers,
+            taxonomia=not args.sem_taxonomia, indice_similaridade=args.indice_similaridade
+        ),
+        'resultados': resultados
+    }
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+    
+    with pd.option_context('display.width', 200, 'display.max_columns', 30, 'display.float_format', '{:.3f}'.format):
+        print("\nTempo por etapa (s):")
+        print(tabela_resultados(resultados))
+        
+        if args.avaliar_indice:
+            print("\nÍndice aproximado e centroides contra a busca exata:")
+            print(pd.DataFrame([resultado['indice'] for resultado in resultados]).set_index('linhas'))
+        
+        if args.comparar:
+            with open(args.comparar, 'r', encoding='utf-8') as f:
+                anterior = json.load(f)
+            print(f"\nComparação com {args.comparar} (commit {anterior.get('commit')}):")
+            print(comparar_resultados(anterior, saida))
+    
+    print(f"\nResultados salvos em: {args.saida}")
+
+if __name__ == "__main__":
+    sys.exit(main())
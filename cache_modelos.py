@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import sklearn
+
+# Diretório padrão dos modelos persistidos (pode ser alterado pela variável de ambiente)
+DIRETORIO_CACHE_PADRAO = os.environ.get(
+    "DASHBOARD_VENDAS_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "dashboard-vendas", "modelos")
+)
+
+# Tamanho máximo ocupado em disco pelos modelos antes de descartar os menos usados
+TAMANHO_MAXIMO_CACHE_PADRAO = 512 * 1024 * 1024
+
+# Incrementar sempre que o formato do objeto salvo mudar
+VERSAO_FORMATO = 1
+
+EXTENSAO = ".pkl"
+
+def calcular_chave_modelo(textos, categorias, parametros):
+    """
+    Calcula a chave de um modelo a partir do conteúdo usado no treino.
+    
+    A ordem dos pares faz parte da chave, pois ela define os índices dos
+    vizinhos e, portanto, o desempate do KNN.
+    
+    Args:
+        textos (list): Descrições preprocessadas usadas no treino
+        categorias (list): Categorias correspondentes a cada descrição
+        parametros (dict): Parâmetros do vetorizador e do modelo
+    
+    Returns:
+        str: Hash hexadecimal do conteúdo
+    """
+    h = hashlib.blake2b(digest_size=20)
+    cabecalho = {
+        'versao_formato': VERSAO_FORMATO,
+        'sklearn': sklearn.__version__,
+        'parametros': parametros,
+        'linhas': len(textos)
+    }
+    h.update(json.dumps(cabecalho, sort_keys=True, default=str).encode('utf-8'))
+    h.update(b"\x1e")
+    h.update("\x1f".join(textos).encode('utf-8'))
+    h.update(b"\x1e")
+    h.update("\x1f".join(str(categoria) for categoria in categorias).encode('utf-8'))
+    return h.hexdigest()
+
+def _caminho(diretorio, chave):
+    return os.path.join(diretorio, f"{chave}{EXTENSAO}")
+
+def carregar_modelo(diretorio, chave):
+    """
+    Carrega um modelo persistido, se existir.
+    
+    Args:
+        diretorio (str): Diretório do cache
+        chave (str): Chave calculada por `calcular_chave_modelo`
+    
+    Returns:
+        object: Objeto salvo ou None se não estiver no cache
+    """
+    caminho = _caminho(diretorio, chave)
+    if not os.path.exists(caminho):
+        return None
+    
+    try:
+        with open(caminho, 'rb') as f:
+            objeto = pickle.load(f)
+    except Exception as e:
+        # Arquivo corrompido ou de outra versão: descartar e treinar novamente
+        print(f"Aviso: modelo em cache inválido ({e}); será treinado novamente.")
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+        return None
+    
+    # Marcar como usado recentemente (a data de modificação define a ordem LRU)
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+    
+    return objeto
+
+def escrever_atomico(caminho, conteudo):
+    """
+    Grava bytes em um arquivo de forma atômica.
+    
+    O conteúdo é escrito em um arquivo temporário no mesmo diretório e depois
+    renomeado, para que leitores concorrentes nunca vejam um arquivo pela metade.
+    
+    Args:
+        caminho (str): Caminho final do arquivo
+        conteudo (bytes): Conteúdo a gravar
+    """
+    descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(descritor, 'wb') as f:
+            f.write(conteudo)
+        # mkstemp cria o arquivo legível apenas pelo dono
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+def salvar_modelo(diretorio, chave, objeto, tamanho_maximo=TAMANHO_MAXIMO_CACHE_PADRAO):
+    """
+    Persiste um modelo de forma atômica e aplica o limite de tamanho do cache.
+    
+    Args:
+        diretorio (str): Diretório do cache
+        chave (str): Chave calculada por `calcular_chave_modelo`
+        objeto (object): Objeto a ser salvo
+        tamanho_maximo (int): Tamanho máximo do cache em bytes
+    """
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        escrever_atomico(_caminho(diretorio, chave), pickle.dumps(objeto, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"Aviso: não foi possível salvar o modelo em cache: {e}")
+        return
+    
+    limpar_cache(diretorio, tamanho_maximo, preservar=chave)
+
+def limpar_cache(diretorio, tamanho_maximo=TAMANHO_MAXIMO_CACHE_PADRAO, preservar=None):
+    """
+    Remove os modelos usados há mais tempo até o cache caber em `tamanho_maximo`.
+    
+    Args:
+        diretorio (str): Diretório do cache
+        tamanho_maximo (int): Tamanho máximo do cache em bytes
+        preservar (str): Chave que nunca deve ser removida (o modelo recém-salvo)
+    
+    Returns:
+        int: Número de modelos removidos
+    """
+    if not os.path.isdir(diretorio):
+        return 0
+    
+    arquivos = []
+    for nome in os.listdir(diretorio):
+        if not nome.endswith(EXTENSAO):
+            continue
+        caminho = os.path.join(diretorio, nome)
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            continue
+        arquivos.append((info.st_mtime, info.st_size, caminho, nome[:-len(EXTENSAO)]))
+    
+    total = sum(tamanho for _, tamanho, _, _ in arquivos)
+    removidos = 0
+    for _, tamanho, caminho, chave in sorted(arquivos):
+        if total <= tamanho_maximo:
+            break
+        if chave == preservar:
+            continue
+        try:
+            os.remove(caminho)
+        except OSError:
+            continue
+        total -= tamanho
+        removidos += 1
+    
+    return removidos
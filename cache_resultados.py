@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+import cache_modelos
+
+# Arquivo padrão do cache de resultados, ao lado do cache de modelos
+ARQUIVO_CACHE_PADRAO = os.path.join(os.path.dirname(cache_modelos.DIRETORIO_CACHE_PADRAO), "resultados.sqlite")
+
+# Número máximo de pares guardados antes de descartar os menos usados
+MAXIMO_ENTRADAS_PADRAO = 1000000
+
+# Incrementar sempre que a cascata de classificação mudar de comportamento
+VERSAO_CASCATA = 1
+
+# Métodos cujo resultado depende apenas do par e do contexto (os demais dependem do arquivo inteiro)
+METODOS_CACHEAVEIS = ('regras', 'similaridade', 'regras_agressivas')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS resultados (
+    chave BLOB PRIMARY KEY,
+    categoria TEXT NOT NULL,
+    metodo TEXT NOT NULL,
+    confianca REAL,
+    usado_em REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS resultados_usado_em ON resultados (usado_em);
+"""
+
+def calcular_contexto(regras, taxonomia, limiar_confianca, indice_similaridade=None, impressao_modelo=None):
+    """
+    Calcula a parte da chave que não depende do par classificado.
+    
+    Qualquer mudança nas regras (`criar_regras_categorias` ou as palavras-chave
+    vindas do arquivo de referência), no conteúdo da taxonomia, no limiar, no
+    modo de similaridade ou no modelo de similaridade (retreinado ou atualizado)
+    muda o contexto, e os resultados antigos deixam de ser encontrados.
+    
+    Args:
+        regras (dict): Regras finais usadas na cascata (categoria -> palavras-chave)
+        taxonomia (dict): Dados da taxonomia de referência (`para_dict`) ou None
+        limiar_confianca (float): Limiar de confiança da similaridade
+        indice_similaridade (str): Modo de similaridade ('exato', 'aproximado', 'centroides') ou None sem modelo
+        impressao_modelo (str): Impressão do conteúdo do modelo de similaridade ou None sem modelo
+    
+    Returns:
+        bytes: Resumo do contexto
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps({
+        'versao_cascata': VERSAO_CASCATA,
+        'regras': regras,
+        'taxonomia': taxonomia,
+        'limiar_confianca': limiar_confianca,
+        'indice_similaridade': indice_similaridade,
+        'modelo': impressao_modelo
+    }, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    return h.digest()
+
+def calcular_chaves(contexto, descricoes_prep, categorias_originais):
+    """
+    Calcula a chave de cada par (descrição normalizada, categoria original).
+    
+    Args:
+        contexto (bytes): Resumo calculado por `calcular_contexto`
+        descricoes_prep (array): Descrições preprocessadas
+        categorias_originais (array): Categoria original de cada descrição
+    
+    Returns:
+        list: Chave (bytes) de cada par
+    """
+    chaves = []
+    for descricao, categoria in zip(descricoes_prep, categorias_originais):
+        h = hashlib.blake2b(contexto, digest_size=16)
+        h.update(f"{descricao}\x1f{categoria}".encode('utf-8'))
+        chaves.append(h.digest())
+    return chaves
+
+class CacheResultados:
+    """
+    Cache persistente (SQLite) do resultado da cascata por par único.
+    
+    Guarda apenas resultados que dependem só do par e do contexto: regras,
+    similaridade aceita e regras agressivas. Os últimos recursos (categoria
+    mais comum, categoria padrão) dependem do arquivo inteiro e nunca são
+    guardados. Os resultados da similaridade e das regras agressivas são
+    guardados com o modelo de similaridade no contexto, então um modelo
+    retreinado ou de outro modo não os reaproveita. A data de uso de cada
+    entrada é atualizada a cada consulta e define a ordem de descarte (LRU).
+    """
+    
+    def __init__(self, caminho=ARQUIVO_CACHE_PADRAO, maximo_entradas=MAXIMO_ENTRADAS_PADRAO):
+        """
+        Args:
+            caminho (str): Arquivo SQLite do cache (criado se não existir)
+            maximo_entradas (int): Número máximo de pares guardados
+        """
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.maximo_entradas = maximo_entradas
+        self.conexao = sqlite3.connect(caminho, timeout=30)
+        self.conexao.executescript(ESQUEMA)
+    
+    def fechar(self):
+        self.conexao.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fechar()
+    
+    def consultar(self, chaves):
+        """
+        Busca os resultados guardados e marca os encontrados como usados.
+        
+        Args:
+            chaves (list): Chaves calculadas por `calcular_chaves`
+        
+        Returns:
+            tuple: Arrays (encontrados, categorias, metodos, confiancas), alinhados a `chaves`
+        """
+        with self.conexao:
+            self.conexao.execute("CREATE TEMP TABLE IF NOT EXISTS _consulta (posicao INTEGER, chave BLOB)")
+            self.conexao.execute("DELETE FROM _consulta")
+            self.conexao.executemany("INSERT INTO _consulta VALUES (?, ?)", enumerate(chaves))
+            linhas = self.conexao.execute(
+                "SELECT c.posicao, r.categoria, r.metodo, r.confianca "
+                "FROM _consulta c JOIN resultados r ON r.chave = c.chave"
+            ).fetchall()
+            self.conexao.execute(
+                "UPDATE resultados SET usado_em = ? WHERE chave IN (SELECT chave FROM _consulta)", (time.time(),)
+            )
+            self.conexao.execute("DELETE FROM _consulta")
+        
+        encontrados = np.zeros(len(chaves), dtype=bool)
+        categorias = np.full(len(chaves), None, dtype=object)
+        metodos = np.full(len(chaves), None, dtype=object)
+        confiancas = np.zeros(len(chaves), dtype=float)
+        for posicao, categoria, metodo, confianca in linhas:
+            encontrados[posicao] = True
+            categorias[posicao] = categoria
+            metodos[posicao] = metodo
+            confiancas[posicao] = confianca or 0.0
+        return encontrados, categorias, metodos, confiancas
+    
+    def gravar(self, chaves, categorias, metodos, confiancas):
+        """
+        Guarda resultados e descarta os pares usados há mais tempo acima do limite.
+        
+        Pares sem método guardável (None ou fora de `METODOS_CACHEAVEIS`) são ignorados.
+        
+        Args:
+            chaves (list): Chaves calculadas por `calcular_chaves`
+            categorias (array): Categoria atribuída a cada par
+            metodos (array): Método da cascata que resolveu cada par
+            confiancas (array): Confiança da similaridade (0 para os demais métodos)
+        """
+        agora = time.time()
+        linhas = [
+            (chave, categoria, metodo, float(confianca) if metodo == 'similaridade' else None, agora)
+            for chave, categoria, metodo, confianca in zip(chaves, categorias, metodos, confiancas)
+            if metodo in METODOS_CACHEAVEIS
+        ]
+        if not linhas:
+            return
+        
+        with self.conexao:
+            self.conexao.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)", linhas)
+            excedente = self.conexao.execute("SELECT COUNT(*) FROM resultados").fetchone()[0] - self.maximo_entradas
+            if excedente > 0:
+                self.conexao.execute(
+                    "DELETE FROM resultados WHERE chave IN "
+                    "(SELECT chave FROM resultados ORDER BY usado_em LIMIT ?)", (excedente,)
+                )
+    
+    def limpar(self):
+        """Remove todos os resultados guardados."""
+        with self.conexao:
+            self.conexao.execute("DELETE FROM resultados")
@@ -3,9 +3,29 @@ import numpy as np
 import re
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.neighbors import NearestNeighbors
+from scipy import sparse
 import unicodedata
 import argparse
+import bisect
+import bz2
+import contextlib
+import cProfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import gzip
+import hashlib
+import json
+import lzma
 import os
+import pickle
+import shutil
+import sys
+import tempfile
+import cache_modelos
+import cache_resultados
+from indice_similaridade import CentroidesCategorias, IndiceInvertido
+from medicao import MedidorEtapas
+from modelo_incremental import ModeloIncremental, carregar_modelo_incremental, salvar_modelo_incremental
 
 def remover_acentos(texto):
     """Remove acentos e caracteres especiais de um texto."""
@@ -31,6 +51,56 @@ def preprocessar_texto(texto):
     
     return texto
 
+class _TabelaNormalizacao(dict):
+    """
+    Tabela de tradução caractere a caractere equivalente a `preprocessar_texto`
+    antes da compactação de espaços: cada caractere vira a parte ASCII da sua
+    decomposição NFKD, em minúsculas, com tudo que não é letra trocado por espaço.
+    As entradas são calculadas sob demanda e memorizadas.
+    """
+    
+    def __missing__(self, codigo):
+        decomposto = unicodedata.normalize('NFKD', chr(codigo)).encode('ASCII', 'ignore').decode('ASCII').lower()
+        traduzido = ''.join(c if 'a' <= c <= 'z' else ' ' for c in decomposto)
+        self[codigo] = traduzido
+        return traduzido
+
+_tabela_normalizacao = _TabelaNormalizacao()
+
+def preprocessar_serie(textos):
+    """
+    Preprocessa uma coluna inteira de textos, com o mesmo resultado de
+    aplicar `preprocessar_texto` a cada valor.
+    
+    Os valores repetidos são processados uma única vez; os acentos são
+    removidos por tabela de tradução e os espaços compactados com as
+    operações vetorizadas de `Series.str`.
+    
+    Args:
+        textos (Series): Textos originais
+    
+    Returns:
+        Series: Textos preprocessados, alinhados ao índice da entrada
+    """
+    textos = pd.Series(textos)
+    codigos, unicos = pd.factorize(textos)
+    
+    unicos = pd.Series(unicos, dtype=object)
+    eh_texto = unicos.map(lambda valor: isinstance(valor, str)).astype(bool)
+    
+    processados = pd.Series("", index=unicos.index, dtype=object)
+    if eh_texto.any():
+        processados[eh_texto] = (
+            unicos[eh_texto]
+            .str.translate(_tabela_normalizacao)
+            .str.replace(r' {2,}', ' ', regex=True)
+            .str.strip()
+        )
+    
+    # O código -1 (valores ausentes) aponta para a última posição, que é ""
+    valores = np.append(processados.values, "")
+    return pd.Series(valores[codigos], index=textos.index, dtype=object)
+
 def criar_regras_categorias():
     """
     Cria um dicionário de regras para categorização baseada em palavras-chave.
@@ -172,31 +242,370 @@ def categorizar_por_regras(descricao, regras):
     
     return None
 
-def treinar_modelo_similaridade(df, coluna_descricao, coluna_categoria):
+class AutomatoPalavras:
+    """
+    Autômato de Aho-Corasick para localizar várias palavras-chave em um texto
+    com uma única passada, inclusive ocorrências sobrepostas.
+    """
+    
+    def __init__(self, palavras):
+        """
+        Args:
+            palavras (list): Lista de palavras-chave; o índice na lista é o id devolvido nas ocorrências
+        """
+        self.transicoes = [{}]
+        self.falhas = [0]
+        self.saidas = [[]]
+        self.tamanhos = [len(palavra) for palavra in palavras]
+        
+        # Construir a trie
+        for id_palavra, palavra in enumerate(palavras):
+            estado = 0
+            for caractere in palavra:
+                proximo = self.transicoes[estado].get(caractere)
+                if proximo is None:
+                    proximo = len(self.transicoes)
+                    self.transicoes[estado][caractere] = proximo
+                    self.transicoes.append({})
+                    self.falhas.append(0)
+                    self.saidas.append([])
+                estado = proximo
+            self.saidas[estado].append(id_palavra)
+        
+        # Calcular os links de falha em largura
+        fila = list(self.transicoes[0].values())
+        for estado in fila:
+            for caractere, proximo in self.transicoes[estado].items():
+                fila.append(proximo)
+                falha = self.falhas[estado]
+                while falha and caractere not in self.transicoes[falha]:
+                    falha = self.falhas[falha]
+                destino = self.transicoes[falha].get(caractere, 0)
+                self.falhas[proximo] = destino if destino != proximo else 0
+                self.saidas[proximo] = self.saidas[proximo] + self.saidas[self.falhas[proximo]]
+    
+    def ocorrencias(self, texto):
+        """
+        Percorre o texto e devolve as ocorrências encontradas.
+        
+        Args:
+            texto (str): Texto já preprocessado
+        
+        Returns:
+            list: Tuplas (id_palavra, inicio, fim) com fim exclusivo
+        """
+        transicoes = self.transicoes
+        falhas = self.falhas
+        saidas = self.saidas
+        resultado = []
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in transicoes[estado]:
+                estado = falhas[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            for id_palavra in saidas[estado]:
+                resultado.append((id_palavra, posicao + 1 - self.tamanhos[id_palavra], posicao + 1))
+        return resultado
+
+class MotorRegras:
+    """
+    Versão compilada das regras de palavras-chave.
+    
+    As regras são convertidas uma única vez em uma matriz esparsa
+    palavra-chave × categoria (o peso é o número de vezes que a palavra aparece
+    na lista da categoria). A pontuação de cada descrição é obtida pelo produto
+    da matriz de ocorrências (1 = substring, 2 = palavra exata) pela matriz de
+    pesos, o que reproduz exatamente `categorizar_por_regras`.
+    
+    Palavras-chave simples são procuradas no vocabulário de tokens das
+    descrições; palavras-chave compostas ("bb cream", "eau de parfum") são
+    localizadas por um autômato de Aho-Corasick sobre as descrições únicas.
+    """
+    
+    def __init__(self, regras):
+        """
+        Args:
+            regras (dict): Dicionário de regras de categorização (já preprocessadas)
+        """
+        self.categorias = list(regras.keys())
+        
+        indice_palavras = {}
+        linhas, colunas = [], []
+        # Palavras-chave vazias casam com qualquer descrição (mesma semântica do `in`)
+        self.pesos_vazios = np.zeros(len(self.categorias), dtype=np.int64)
+        
+        for id_categoria, palavras in enumerate(regras.values()):
+            for palavra in palavras:
+                if palavra == "":
+                    self.pesos_vazios[id_categoria] += 1
+                    continue
+                id_palavra = indice_palavras.setdefault(palavra, len(indice_palavras))
+                linhas.append(id_palavra)
+                colunas.append(id_categoria)
+        
+        self.palavras = list(indice_palavras)
+        # Entradas repetidas são somadas, preservando o peso de palavras duplicadas na lista
+        self.pesos = sparse.csr_matrix(
+            (np.ones(len(linhas), dtype=np.int64), (linhas, colunas)),
+            shape=(len(self.palavras), len(self.categorias))
+        )
+        
+        self.ids_simples = [i for i, palavra in enumerate(self.palavras) if " " not in palavra]
+        self.ids_compostas = [i for i, palavra in enumerate(self.palavras) if " " in palavra]
+        self.automato_simples = AutomatoPalavras([self.palavras[i] for i in self.ids_simples])
+        self.automato_compostas = AutomatoPalavras([self.palavras[i] for i in self.ids_compostas])
+    
+    def _ocorrencias_simples(self, textos):
+        """Matriz documento × palavra-chave para as palavras-chave sem espaço."""
+        vocabulario = {}
+        linhas_docs, colunas_tokens = [], []
+        for id_doc, texto in enumerate(textos):
+            for token in set(texto.split()):
+                linhas_docs.append(id_doc)
+                colunas_tokens.append(vocabulario.setdefault(token, len(vocabulario)))
+        
+        documentos_tokens = sparse.csr_matrix(
+            (np.ones(len(linhas_docs), dtype=np.int64), (linhas_docs, colunas_tokens)),
+            shape=(len(textos), len(vocabulario))
+        )
+        
+        # Uma palavra-chave sem espaço só pode ocorrer dentro de um único token
+        linhas_sub, colunas_sub, linhas_exatas, colunas_exatas = [], [], [], []
+        for id_token, token in enumerate(vocabulario):
+            for id_local, inicio, fim in self.automato_simples.ocorrencias(token):
+                id_palavra = self.ids_simples[id_local]
+                linhas_sub.append(id_token)
+                colunas_sub.append(id_palavra)
+                if inicio == 0 and fim == len(token):
+                    linhas_exatas.append(id_token)
+                    colunas_exatas.append(id_palavra)
+        
+        formato = (len(vocabulario), len(self.palavras))
+        tokens_sub = sparse.csr_matrix(
+            (np.ones(len(linhas_sub), dtype=np.int64), (linhas_sub, colunas_sub)), shape=formato
+        )
+        tokens_exatos = sparse.csr_matrix(
+            (np.ones(len(linhas_exatas), dtype=np.int64), (linhas_exatas, colunas_exatas)), shape=formato
+        )
+        
+        substrings = documentos_tokens @ tokens_sub
+        exatas = documentos_tokens @ tokens_exatos
+        substrings.data[:] = 1
+        exatas.data[:] = 1
+        return substrings + exatas
+    
+    def _ocorrencias_compostas(self, textos):
+        """Matriz documento × palavra-chave para as palavras-chave com espaço."""
+        ocorrencias = {}
+        if self.ids_compostas:
+            for id_doc, texto in enumerate(textos):
+                if " " not in texto:
+                    continue
+                for id_local, inicio, fim in self.automato_compostas.ocorrencias(texto):
+                    exata = (inicio == 0 or texto[inicio - 1] == " ") and (fim == len(texto) or texto[fim] == " ")
+                    chave = (id_doc, self.ids_compostas[id_local])
+                    ocorrencias[chave] = max(ocorrencias.get(chave, 0), 2 if exata else 1)
+        
+        linhas = [chave[0] for chave in ocorrencias]
+        colunas = [chave[1] for chave in ocorrencias]
+        return sparse.csr_matrix(
+            (np.fromiter(ocorrencias.values(), dtype=np.int64, count=len(ocorrencias)), (linhas, colunas)),
+            shape=(len(textos), len(self.palavras))
+        )
+    
+    def pontuar(self, textos):
+        """
+        Calcula a pontuação de cada categoria para textos já preprocessados.
+        
+        Args:
+            textos (list): Descrições preprocessadas
+        
+        Returns:
+            csr_matrix: Matriz documento × categoria com as pontuações
+        """
+        ocorrencias = self._ocorrencias_simples(textos) + self._ocorrencias_compostas(textos)
+        pontuacao = sparse.csr_matrix(ocorrencias @ self.pesos)
+        
+        if self.pesos_vazios.any():
+            # f"  " só está contido em f" {descricao} " quando a descrição preprocessada é vazia
+            fator = np.array([2 if texto == "" else 1 for texto in textos], dtype=np.int64)
+            pontuacao = pontuacao + sparse.csr_matrix(np.outer(fator, self.pesos_vazios))
+        
+        return pontuacao
+    
+    def categorizar(self, descricoes, descricoes_prep=None):
+        """
+        Categoriza uma série de descrições em uma única passada.
+        
+        Args:
+            descricoes (Series): Descrições originais dos produtos
+            descricoes_prep (Series): Descrições já preprocessadas, alinhadas a `descricoes` (opcional)
+        
+        Returns:
+            Series: Categoria atribuída a cada descrição (None se nenhuma regra casar),
+            alinhada ao índice da entrada
+        """
+        descricoes = pd.Series(descricoes)
+        codigos, unicas = pd.factorize(descricoes, use_na_sentinel=True)
+        
+        # Mesma validação de `categorizar_por_regras`, aplicada às descrições únicas
+        validas = np.array([isinstance(d, str) and d.strip() != "" for d in unicas], dtype=bool)
+        if descricoes_prep is not None:
+            # Reaproveitar o texto preprocessado da primeira ocorrência de cada descrição
+            _, primeiras = np.unique(codigos[codigos >= 0], return_index=True)
+            textos = list(np.asarray(descricoes_prep, dtype=object)[codigos >= 0][primeiras])
+        else:
+            textos = [preprocessar_texto(d) for d in unicas]
+        
+        resultado_unicas = np.full(len(unicas) + 1, None, dtype=object)
+        if len(unicas) > 0 and len(self.categorias) > 0:
+            pontuacao = self.pontuar(textos)
+            pontuacao.sum_duplicates()
+            pontuacao.sort_indices()
+            # Em caso de empate, `max` mantém a primeira categoria na ordem do dicionário
+            melhores = np.asarray(pontuacao.argmax(axis=1)).ravel()
+            maximos = pontuacao.max(axis=1).toarray().ravel()
+            encontradas = validas & (maximos > 0)
+            categorias = np.array(self.categorias, dtype=object)
+            resultado_unicas[:-1][encontradas] = categorias[melhores[encontradas]]
+        
+        # O código -1 (valores ausentes) aponta para a última posição, que é None
+        return pd.Series(resultado_unicas[codigos], index=descricoes.index, dtype=object)
+
+def categorizar_por_regras_em_lote(descricoes, regras, descricoes_prep=None):
+    """
+    Categoriza uma série de descrições com base em regras de palavras-chave.
+    
+    Args:
+        descricoes (Series): Descrições dos produtos
+        regras (dict ou MotorRegras): Regras de categorização ou motor já compilado
+        descricoes_prep (Series): Descrições já preprocessadas, alinhadas a `descricoes` (opcional)
+    
+    Returns:
+        Series: Categoria atribuída a cada descrição (None se nenhuma correspondência for encontrada)
+    """
+    motor = regras if isinstance(regras, MotorRegras) else MotorRegras(regras)
+    return motor.categorizar(descricoes, descricoes_prep)
+
+# Índices de vizinhos aceitos pelo modelo de similaridade ('centroides' compara com um centroide por categoria)
+INDICES_SIMILARIDADE = ('exato', 'aproximado', 'centroides')
+
+# Limiar de confiança padrão de cada modo: a margem entre os dois centroides mais
+# similares fica numa escala bem menor que a fração de votos dos vizinhos do KNN
+LIMIAR_CONFIANCA_PADRAO = {'exato': 0.4, 'aproximado': 0.4, 'centroides': 0.15}
+
+def treinar_modelo_similaridade(df, coluna_descricao, coluna_categoria, diretorio_cache=None,
+                                tamanho_maximo_cache=cache_modelos.TAMANHO_MAXIMO_CACHE_PADRAO, descricoes_prep=None,
+                                indice='exato'):
     """
     Treina um modelo de similaridade baseado em TF-IDF e KNN.
     
+    Se `diretorio_cache` for informado, o modelo é procurado no cache em disco
+    pela chave do conteúdo de treino e só é treinado (e salvo) se não existir.
+    
+    Com `indice='aproximado'` os vizinhos são buscados em um `IndiceInvertido`,
+    cujo custo por consulta não cresce com o número de linhas de treino; a
+    qualidade da busca pode ser medida com `indice_similaridade.recall_vizinhos`.
+    Com `indice='centroides'` o modelo guarda apenas um centroide por categoria
+    (`CentroidesCategorias`), `categorias_conhecidas` passa a ter uma entrada
+    por centroide e a confiança é a margem entre as duas categorias mais
+    similares (o limiar padrão deste modo é menor, ver `LIMIAR_CONFIANCA_PADRAO`).
+    
     Args:
         df (DataFrame): DataFrame com os dados
         coluna_descricao (str): Nome da coluna com as descrições
         coluna_categoria (str): Nome da coluna com as categorias
+        diretorio_cache (str): Diretório do cache de modelos (None desativa o cache)
+        tamanho_maximo_cache (int): Tamanho máximo do cache em bytes
+        descricoes_prep (Series): Descrições já preprocessadas, alinhadas a `df` (opcional)
+        indice (str): Busca dos vizinhos: 'exato' (força bruta), 'aproximado' (listas invertidas)
+            ou 'centroides' (um centroide por categoria)
         
     Returns:
         tuple: (vectorizer, modelo, categorias_conhecidas)
     """
     # Filtrar apenas produtos com categorias conhecidas (não vazias e não "Outros")
-    df_conhecidos = df[
-        (df[coluna_categoria].notna()) & 
-        (df[coluna_categoria] != "") & 
-        (df[coluna_categoria].str.lower() != "outros")
-    ].copy()
+    mascara_conhecidos = mascara_categorias_conhecidas(df[coluna_categoria]).values
     
-    if len(df_conhecidos) == 0:
+    if not mascara_conhecidos.any():
         print("Aviso: Não há produtos com categorias conhecidas para treinar o modelo.")
         return None, None, None
     
-    # Preprocessar as descrições
-    df_conhecidos['descricao_prep'] = df_conhecidos[coluna_descricao].apply(preprocessar_texto)
+    # Preprocessar as descrições (ou reaproveitar a coluna já normalizada), sem copiar as demais colunas
+    if descricoes_prep is not None:
+        textos = np.asarray(descricoes_prep, dtype=object)[mascara_conhecidos]
+    else:
+        textos = preprocessar_serie(df[coluna_descricao][mascara_conhecidos]).values
+    
+    return treinar_modelo_com_pares(
+        textos.tolist(), df[coluna_categoria].values[mascara_conhecidos],
+        diretorio_cache, tamanho_maximo_cache, indice
+    )
+
+def atualizar_modelo_incremental(modelo, df, coluna_descricao, coluna_categoria, descricoes_prep=None):
+    """
+    Absorve no modelo incremental as linhas de `df` com categoria conhecida.
+    
+    Args:
+        modelo (ModeloIncremental): Modelo a atualizar
+        df (DataFrame): DataFrame com os dados
+        coluna_descricao (str): Nome da coluna com as descrições
+        coluna_categoria (str): Nome da coluna com as categorias
+        descricoes_prep (Series): Descrições já preprocessadas, alinhadas a `df` (opcional)
+    
+    Returns:
+        int: Número de linhas absorvidas
+    """
+    mascara_conhecidos = mascara_categorias_conhecidas(df[coluna_categoria]).values
+    if descricoes_prep is not None:
+        textos = np.asarray(descricoes_prep, dtype=object)[mascara_conhecidos]
+    else:
+        textos = preprocessar_serie(df[coluna_descricao][mascara_conhecidos]).values
+    
+    modelo.partial_fit(textos.tolist(), df[coluna_categoria].values[mascara_conhecidos])
+    return len(textos)
+
+def mascara_categorias_conhecidas(categorias):
+    """
+    Identifica as linhas com categoria conhecida (não vazia e diferente de "Outros").
+    
+    Args:
+        categorias (Series): Categorias originais
+    
+    Returns:
+        Series: Máscara booleana das linhas que podem ser usadas no treino
+    """
+    return (
+        (categorias.notna()) & 
+        (categorias != "") & 
+        (categorias.str.lower() != "outros")
+    )
+
+def treinar_modelo_com_pares(textos, categorias_conhecidas, diretorio_cache=None,
+                             tamanho_maximo_cache=cache_modelos.TAMANHO_MAXIMO_CACHE_PADRAO, indice='exato'):
+    """
+    Treina o modelo de similaridade a partir de pares já selecionados.
+    
+    Sem descrições suficientes para montar o vocabulário TF-IDF (termos em pelo
+    menos 2 descrições), não há modelo e a etapa de similaridade é pulada.
+    
+    Args:
+        textos (list): Descrições preprocessadas dos produtos com categoria conhecida
+        categorias_conhecidas: Array com a categoria de cada descrição
+        diretorio_cache (str): Diretório do cache de modelos (None desativa o cache)
+        tamanho_maximo_cache (int): Tamanho máximo do cache em bytes
+        indice (str): Busca dos vizinhos: 'exato' (força bruta), 'aproximado' (listas invertidas)
+            ou 'centroides' (um centroide por categoria)
+    
+    Returns:
+        tuple: (vectorizer, modelo, categorias_conhecidas)
+    """
+    if indice not in INDICES_SIMILARIDADE:
+        raise ValueError(f"Índice de similaridade desconhecido: {indice} (use {', '.join(INDICES_SIMILARIDADE)})")
+    
+    if len(textos) == 0:
+        print("Aviso: Não há produtos com categorias conhecidas para treinar o modelo.")
+        return None, None, None
     
     # Criar o vetorizador TF-IDF
     vectorizer = TfidfVectorizer(
@@ -205,18 +614,51 @@ def treinar_modelo_similaridade(df, coluna_descricao, coluna_categoria):
         ngram_range=(1, 2)  # Considera unigramas e bigramas
     )
     
-    # Transformar as descrições em vetores TF-IDF
-    X = vectorizer.fit_transform(df_conhecidos['descricao_prep'])
+    # Criar o modelo KNN (busca exata ou índice aproximado com a mesma interface) ou de centroides
+    if indice == 'centroides':
+        codigos_categorias, nomes_categorias = pd.factorize(pd.Series(categorias_conhecidas, dtype=object))
+        modelo = CentroidesCategorias(len(nomes_categorias))
+    elif indice == 'aproximado':
+        modelo = IndiceInvertido(n_neighbors=5)
+    else:
+        modelo = NearestNeighbors(
+            n_neighbors=5,      # Considera os 5 vizinhos mais próximos
+            metric='cosine'     # Usa similaridade de cosseno
+        )
+    
+    # A chave do conteúdo de treino identifica o modelo no cache de modelos e no de resultados
+    parametros = {'vectorizer': vectorizer.get_params(), 'modelo': modelo.get_params()}
+    chave = cache_modelos.calcular_chave_modelo(textos, categorias_conhecidas, parametros)
+    
+    # Procurar um modelo já treinado com exatamente os mesmos dados e parâmetros
+    if diretorio_cache:
+        modelo_cache = cache_modelos.carregar_modelo(diretorio_cache, chave)
+        if modelo_cache is not None:
+            print(f"Modelo de similaridade carregado do cache ({chave[:12]}).")
+            modelo_cache[1].chave_modelo_ = chave
+            return modelo_cache
+    
+    # Transformar as descrições em vetores TF-IDF; com poucas descrições nenhum termo
+    # atinge `min_df` e o vetorizador recusa o treino, então a similaridade é pulada
+    try:
+        X = vectorizer.fit_transform(textos)
+    except ValueError as erro:
+        print(f"Aviso: Poucas descrições com categoria conhecida para treinar o modelo ({len(textos)}): {erro}")
+        return None, None, None
     
-    # Treinar o modelo KNN
-    modelo = NearestNeighbors(
-        n_neighbors=5,      # Considera os 5 vizinhos mais próximos
-        metric='cosine'     # Usa similaridade de cosseno
-    )
-    modelo.fit(X)
+    # Treinar o modelo KNN (ou somar os vetores de cada categoria nos centroides)
+    if indice == 'centroides':
+        modelo.fit(X, codigos_categorias)
+        categorias_conhecidas = np.asarray(nomes_categorias, dtype=object)
+    else:
+        modelo.fit(X)
+    del X
+    modelo.chave_modelo_ = chave
     
-    # Armazenar as categorias conhecidas
-    categorias_conhecidas = df_conhecidos[coluna_categoria].values
+    if diretorio_cache:
+        cache_modelos.salvar_modelo(
+            diretorio_cache, chave, (vectorizer, modelo, categorias_conhecidas), tamanho_maximo_cache
+        )
     
     return vectorizer, modelo, categorias_conhecidas
 
@@ -227,7 +669,7 @@ def categorizar_por_similaridade(descricao, vectorizer, modelo, categorias_conhe
     Args:
         descricao (str): Descrição do produto
         vectorizer: Vetorizador TF-IDF treinado
-        modelo: Modelo KNN treinado
+        modelo: Modelo KNN (ou de centroides) treinado
         categorias_conhecidas: Array de categorias conhecidas
         
     Returns:
@@ -236,6 +678,12 @@ def categorizar_por_similaridade(descricao, vectorizer, modelo, categorias_conhe
     if not isinstance(descricao, str) or descricao.strip() == "":
         return None, 0.0
     
+    if isinstance(modelo, CentroidesCategorias):
+        categorias, confiancas = categorizar_por_similaridade_em_lote(
+            pd.Series([descricao], dtype=object), vectorizer, modelo, categorias_conhecidas
+        )
+        return categorias.iloc[0], confiancas.iloc[0]
+    
     # Preprocessar a descrição
     descricao_prep = preprocessar_texto(descricao)
     
@@ -265,6 +713,136 @@ def categorizar_por_similaridade(descricao, vectorizer, modelo, categorias_conhe
     
     return None, 0.0
 
+def categorizar_por_similaridade_em_lote(descricoes, vectorizer, modelo, categorias_conhecidas, tamanho_bloco=10000,
+                                         descricoes_prep=None):
+    """
+    Categoriza uma série de produtos com base em similaridade de texto.
+    
+    Todas as descrições são transformadas em uma única matriz esparsa e os
+    vizinhos são buscados em blocos de `tamanho_bloco` linhas, limitando a
+    memória usada pela matriz de distâncias. O voto ponderado por similaridade
+    reproduz `categorizar_por_similaridade`, inclusive o desempate. Com um modelo
+    de centroides, cada bloco é pontuado contra os centroides das categorias.
+    
+    Args:
+        descricoes (Series): Descrições dos produtos
+        vectorizer: Vetorizador TF-IDF treinado
+        modelo: Modelo KNN (ou de centroides) treinado
+        categorias_conhecidas: Array de categorias conhecidas
+        tamanho_bloco (int): Número máximo de descrições consultadas por chamada ao KNN
+        descricoes_prep (Series): Descrições já preprocessadas, alinhadas a `descricoes` (opcional)
+    
+    Returns:
+        tuple: (Series de categorias, Series de confianças), alinhadas ao índice da entrada
+    """
+    descricoes = pd.Series(descricoes)
+    categorias = pd.Series(np.full(len(descricoes), None, dtype=object), index=descricoes.index)
+    confiancas = pd.Series(0.0, index=descricoes.index, dtype=float)
+    
+    validas = np.array([isinstance(d, str) and d.strip() != "" for d in descricoes.values], dtype=bool)
+    if not validas.any():
+        return categorias, confiancas
+    
+    # Descrições repetidas produzem o mesmo vetor, então basta consultar as únicas
+    if descricoes_prep is not None:
+        textos = np.asarray(descricoes_prep, dtype=object)[validas]
+    else:
+        textos = preprocessar_serie(descricoes[validas]).values
+    codigos, textos_unicos = pd.factorize(pd.Series(textos, dtype=object))
+    
+    codigos_categorias, nomes_categorias = pd.factorize(pd.Series(categorias_conhecidas, dtype=object))
+    categoria_unica = np.empty(len(textos_unicos), dtype=object)
+    confianca_unica = np.empty(len(textos_unicos), dtype=float)
+    
+    for inicio in range(0, len(textos_unicos), tamanho_bloco):
+        bloco = textos_unicos[inicio:inicio + tamanho_bloco]
+        X = vectorizer.transform(bloco)
+        if isinstance(modelo, CentroidesCategorias):
+            melhores, confiancas_bloco = modelo.categorizar(X)
+            categoria_unica[inicio:inicio + len(bloco)] = nomes_categorias.values[codigos_categorias[melhores]]
+            confianca_unica[inicio:inicio + len(bloco)] = confiancas_bloco
+            continue
+        
+        distancias, indices = modelo.kneighbors(X)
+        
+        # Converter distâncias para similaridades (1 - distância)
+        similaridades = 1 - distancias
+        vizinhos = codigos_categorias[indices]
+        
+        # Pontuação de cada vizinho = soma das similaridades dos vizinhos com a mesma categoria,
+        # acumulada na mesma ordem do dicionário da versão por linha
+        pontuacoes = np.zeros_like(similaridades)
+        total = np.zeros(len(bloco))
+        for j in range(similaridades.shape[1]):
+            pontuacoes += np.where(vizinhos == vizinhos[:, [j]], similaridades[:, [j]], 0.0)
+            total = total + similaridades[:, j]
+        
+        # O primeiro vizinho com pontuação máxima corresponde à categoria que entrou
+        # primeiro no dicionário entre as empatadas
+        melhor = np.argmax(pontuacoes, axis=1)
+        linhas = np.arange(len(bloco))
+        categoria_unica[inicio:inicio + len(bloco)] = nomes_categorias.values[vizinhos[linhas, melhor]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confianca_unica[inicio:inicio + len(bloco)] = pontuacoes[linhas, melhor] / total
+    
+    categorias[validas] = categoria_unica[codigos]
+    confiancas[validas] = confianca_unica[codigos]
+    
+    return categorias, confiancas
+
+def indice_do_modelo(modelo):
+    """
+    Returns:
+        str: Modo de similaridade do modelo ('exato', 'aproximado' ou 'centroides'), None sem modelo
+    """
+    if modelo is None:
+        return None
+    if isinstance(modelo, CentroidesCategorias):
+        return 'centroides'
+    if isinstance(modelo, IndiceInvertido):
+        return 'aproximado'
+    return 'exato'
+
+def resolver_limiar_confianca(limiar_confianca, modelo):
+    """
+    Args:
+        limiar_confianca (float): Limiar informado, ou None para usar o padrão do modo do modelo
+        modelo: Modelo de similaridade treinado (None sem modelo)
+    
+    Returns:
+        float: Limiar de confiança aplicado à similaridade
+    """
+    if limiar_confianca is not None:
+        return limiar_confianca
+    return LIMIAR_CONFIANCA_PADRAO[indice_do_modelo(modelo) or 'exato']
+
+def impressao_modelo(vectorizer, modelo, categorias_modelo):
+    """
+    Identifica o conteúdo de um modelo de similaridade.
+    
+    Modelos treinados por `treinar_modelo_com_pares` (e os montados por um
+    `ModeloIncremental`) trazem a chave do próprio conteúdo em `chave_modelo_`;
+    para os demais, a impressão é o hash do modelo serializado.
+    
+    Args:
+        vectorizer: Vetorizador treinado
+        modelo: Modelo KNN (ou de centroides) treinado
+        categorias_modelo: Array de categorias conhecidas
+    
+    Returns:
+        str: Impressão hexadecimal do modelo (None sem modelo)
+    """
+    if vectorizer is None or modelo is None:
+        return None
+    
+    chave = getattr(modelo, 'chave_modelo_', None)
+    if chave is not None:
+        return chave
+    
+    h = hashlib.blake2b(digest_size=20)
+    h.update(pickle.dumps((vectorizer, modelo, list(categorias_modelo)), protocol=pickle.HIGHEST_PROTOCOL))
+    return h.hexdigest()
+
 def carregar_categorias_referencia(caminho_arquivo):
     """
     Carrega a planilha ou arquivo de categorias de referência.
@@ -375,7 +953,8 @@ def carregar_categorias_referencia(caminho_arquivo):
         # Adicionar todas as categorias extraídas ao dicionário de retorno
         resultado = {
             'mapeamento': mapeamento,
-            'categorias': list(categorias_extraidas)
+            'categorias': list(categorias_extraidas),
+            'caminhos': list(dict.fromkeys(c.strip() for c in categorias if isinstance(c, str)))
         }
         
         return resultado
@@ -385,7 +964,644 @@ def carregar_categorias_referencia(caminho_arquivo):
         traceback.print_exc()
         return {'mapeamento': {}, 'categorias': []}
 
-def categorizar_produtos(df, coluna_descricao, coluna_categoria, limiar_confianca=0.4, arquivo_categorias=None):
+class TaxonomiaCompilada:
+    """
+    Taxonomia de referência pronta para uso na categorização.
+    
+    Reúne os caminhos deduplicados do arquivo, o mapeamento de categorias
+    com "Outros", as categorias extraídas e as estruturas derivadas delas:
+    as palavras-chave de cada categoria, o índice do mapeamento e um índice
+    invertido palavra -> categorias usado na pontuação por palavras.
+    """
+    
+    def __init__(self, caminhos, mapeamento, categorias):
+        """
+        Args:
+            caminhos (list): Linhas distintas do arquivo de referência
+            mapeamento (dict): Mapeamento categoria com "Outros" -> categoria principal
+            categorias (list): Categorias extraídas do arquivo
+        """
+        self.caminhos = caminhos
+        self.mapeamento = mapeamento
+        self.categorias = categorias
+        
+        self.palavras_categorias = {categoria: preprocessar_texto(categoria).split() for categoria in categorias}
+        self.indice_mapeamento = IndiceMapeamento(mapeamento)
+        
+        # Índice invertido palavra -> [(id da categoria, ocorrências da palavra no nome)]
+        contagens = {}
+        for id_categoria, categoria in enumerate(categorias):
+            for palavra in self.palavras_categorias[categoria]:
+                chave = (palavra, id_categoria)
+                contagens[chave] = contagens.get(chave, 0) + 1
+        self.indice_palavras = {}
+        for (palavra, id_categoria), contagem in contagens.items():
+            self.indice_palavras.setdefault(palavra, []).append((id_categoria, contagem))
+        
+        self.palavras = list(self.indice_palavras)
+        self.automato = AutomatoPalavras(self.palavras)
+    
+    def melhor_categoria_por_palavras(self, descricao_prep):
+        """
+        Escolhe a categoria cujo nome tem mais palavras contidas na descrição.
+        
+        Equivale a somar, para cada categoria na ordem da lista, as palavras do
+        nome presentes (como substring) na descrição e ficar com a primeira de
+        maior pontuação.
+        
+        Args:
+            descricao_prep (str): Descrição preprocessada
+        
+        Returns:
+            tuple: (categoria ou None, pontuação)
+        """
+        pontuacoes = {}
+        encontradas = {id_palavra for id_palavra, _, _ in self.automato.ocorrencias(descricao_prep)}
+        for id_palavra in encontradas:
+            for id_categoria, contagem in self.indice_palavras[self.palavras[id_palavra]]:
+                pontuacoes[id_categoria] = pontuacoes.get(id_categoria, 0) + contagem
+        
+        if not pontuacoes:
+            return None, 0
+        
+        max_pontuacao = max(pontuacoes.values())
+        id_melhor = min(id_categoria for id_categoria, pontuacao in pontuacoes.items() if pontuacao == max_pontuacao)
+        return self.categorias[id_melhor], max_pontuacao
+    
+    def para_dict(self):
+        """Dados serializáveis da taxonomia (as estruturas derivadas são reconstruídas ao carregar)."""
+        return {'caminhos': self.caminhos, 'mapeamento': self.mapeamento, 'categorias': self.categorias}
+
+# Taxonomias já carregadas neste processo, por caminho absoluto
+_taxonomias_carregadas = {}
+
+# Incrementar sempre que a interpretação do arquivo de referência mudar
+VERSAO_TAXONOMIA = 1
+
+def _hash_arquivo(caminho_arquivo):
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def carregar_taxonomia(caminho_arquivo):
+    """
+    Carrega a taxonomia de referência compilada.
+    
+    O resultado da interpretação do arquivo é salvo ao lado dele
+    (`<arquivo>.compilado.json`) e reaproveitado enquanto a data de modificação
+    e o tamanho do arquivo não mudarem; se mudarem, o conteúdo é comparado pelo
+    hash antes de recompilar. Dentro do mesmo processo a taxonomia fica em memória.
+    
+    Args:
+        caminho_arquivo (str): Caminho para o arquivo de categorias
+    
+    Returns:
+        TaxonomiaCompilada: Taxonomia pronta para uso
+    """
+    caminho_arquivo = os.path.abspath(caminho_arquivo)
+    info = os.stat(caminho_arquivo)
+    assinatura = (info.st_mtime_ns, info.st_size)
+    
+    em_memoria = _taxonomias_carregadas.get(caminho_arquivo)
+    if em_memoria is not None and em_memoria[0] == assinatura:
+        return em_memoria[1]
+    
+    caminho_artefato = f"{caminho_arquivo}.compilado.json"
+    artefato = None
+    if os.path.exists(caminho_artefato):
+        try:
+            with open(caminho_artefato, 'r', encoding='utf-8') as f:
+                artefato = json.load(f)
+            if artefato.get('versao') != VERSAO_TAXONOMIA:
+                artefato = None
+        except (OSError, ValueError) as e:
+            print(f"Aviso: artefato de taxonomia inválido ({e}); será recompilado.")
+            artefato = None
+    
+    hash_arquivo = None
+    if artefato is not None and (artefato['mtime_ns'], artefato['tamanho']) != assinatura:
+        # O arquivo foi tocado: só recompilar se o conteúdo realmente mudou
+        hash_arquivo = _hash_arquivo(caminho_arquivo)
+        if artefato['hash'] != hash_arquivo:
+            artefato = None
+        else:
+            artefato['mtime_ns'], artefato['tamanho'] = assinatura
+            _salvar_artefato_taxonomia(caminho_artefato, artefato)
+    
+    if artefato is not None:
+        print(f"Taxonomia de referência carregada do artefato compilado: {caminho_artefato}")
+        taxonomia = TaxonomiaCompilada(**artefato['taxonomia'])
+    else:
+        resultado = carregar_categorias_referencia(caminho_arquivo)
+        taxonomia = TaxonomiaCompilada(
+            resultado.get('caminhos', []), resultado.get('mapeamento', {}), resultado.get('categorias', [])
+        )
+        if resultado.get('mapeamento') or resultado.get('categorias'):
+            _salvar_artefato_taxonomia(caminho_artefato, {
+                'versao': VERSAO_TAXONOMIA,
+                'mtime_ns': assinatura[0],
+                'tamanho': assinatura[1],
+                'hash': hash_arquivo or _hash_arquivo(caminho_arquivo),
+                'taxonomia': taxonomia.para_dict()
+            })
+    
+    _taxonomias_carregadas[caminho_arquivo] = (assinatura, taxonomia)
+    return taxonomia
+
+def _salvar_artefato_taxonomia(caminho_artefato, artefato):
+    try:
+        cache_modelos.escrever_atomico(
+            caminho_artefato, json.dumps(artefato, ensure_ascii=False).encode('utf-8')
+        )
+    except OSError as e:
+        # Diretório somente leitura: seguir apenas com a versão em memória
+        print(f"Aviso: não foi possível salvar a taxonomia compilada: {e}")
+
+class IndiceMapeamento:
+    """
+    Índice do mapeamento de categorias para encontrar rapidamente a melhor
+    correspondência aproximada de uma categoria com "Outros".
+    
+    Só recebem pontuação as origens que compartilham uma palavra com a
+    categoria (índice invertido, necessário para Jaccard > 0) ou que estão
+    contidas nela / a contêm (pontuação 0.9 de `calcular_similaridade`).
+    Todas as demais teriam similaridade 0 e nunca seriam escolhidas.
+    """
+    
+    def __init__(self, mapeamento):
+        """
+        Args:
+            mapeamento (dict): Dicionário categoria de origem -> categoria de destino
+        """
+        self.origens = list(mapeamento.keys())
+        self.destinos = list(mapeamento.values())
+        origens_minusculas = [str(origem).lower() for origem in self.origens]
+        
+        # Índice invertido palavra -> origens que a contêm
+        self.indice_palavras = {}
+        for id_origem, origem in enumerate(origens_minusculas):
+            for palavra in set(origem.split()):
+                self.indice_palavras.setdefault(palavra, []).append(id_origem)
+        
+        # Origens contidas na categoria: autômato sobre todas as origens não vazias
+        self.ids_nao_vazios = [i for i, origem in enumerate(origens_minusculas) if origem]
+        self.ids_vazios = [i for i, origem in enumerate(origens_minusculas) if not origem]
+        self.automato = AutomatoPalavras([origens_minusculas[i] for i in self.ids_nao_vazios])
+        
+        # Origens que contêm a categoria: busca no texto concatenado de todas as origens
+        self.concatenado = "\x00".join(origens_minusculas)
+        self.inicios = []
+        posicao = 0
+        for origem in origens_minusculas:
+            self.inicios.append(posicao)
+            posicao += len(origem) + 1
+        self.origens_minusculas = origens_minusculas
+    
+    def candidatos(self, categoria):
+        """Ids das origens que podem ter similaridade maior que zero com a categoria."""
+        ids = set(self.ids_vazios)
+        for palavra in set(categoria.split()):
+            ids.update(self.indice_palavras.get(palavra, ()))
+        
+        for id_local, _, _ in self.automato.ocorrencias(categoria):
+            ids.add(self.ids_nao_vazios[id_local])
+        
+        if categoria:
+            inicio = self.concatenado.find(categoria)
+            while inicio != -1:
+                id_origem = bisect.bisect_right(self.inicios, inicio) - 1
+                if inicio + len(categoria) <= self.inicios[id_origem] + len(self.origens_minusculas[id_origem]):
+                    ids.add(id_origem)
+                inicio = self.concatenado.find(categoria, inicio + 1)
+        else:
+            ids.update(range(len(self.origens)))
+        
+        return sorted(ids)
+    
+    def melhor_correspondencia(self, categoria):
+        """
+        Encontra a origem mais similar à categoria, com o mesmo critério de
+        desempate (primeira na ordem do mapeamento) da busca completa.
+        
+        Args:
+            categoria (str): Categoria em minúsculas
+        
+        Returns:
+            tuple: (categoria de destino, similaridade)
+        """
+        melhor_correspondencia = None
+        max_similaridade = 0
+        
+        for id_origem in self.candidatos(categoria):
+            similaridade = calcular_similaridade(categoria, self.origens[id_origem])
+            if similaridade > max_similaridade:
+                max_similaridade = similaridade
+                melhor_correspondencia = self.destinos[id_origem]
+        
+        return melhor_correspondencia, max_similaridade
+
+def resolver_mapeamento_categorias(categorias, mapeamento, indice=None, limiar_similaridade=0.7):
+    """
+    Resolve o mapeamento de referência para uma coluna de categorias.
+    
+    Cada categoria distinta é resolvida uma única vez: primeiro pelo mapeamento
+    exato e, para as que contêm "outros", pela melhor correspondência aproximada
+    com similaridade acima de `limiar_similaridade`.
+    
+    Args:
+        categorias (Series): Categorias originais
+        mapeamento (dict): Dicionário categoria de origem (minúsculas) -> categoria de destino
+        indice (IndiceMapeamento): Índice já construído para o mapeamento (opcional)
+        limiar_similaridade (float): Similaridade mínima (exclusiva) para aceitar a correspondência
+    
+    Returns:
+        Series: Categoria de destino de cada linha (None quando não há mapeamento)
+    """
+    categorias = pd.Series(categorias)
+    codigos, unicas = pd.factorize(categorias, use_na_sentinel=False)
+    
+    # Mesma normalização da versão por linha (str(valor).lower(), inclusive para NaN)
+    unicas_minusculas = pd.Series([str(categoria).lower() for categoria in unicas], dtype=object)
+    exatas = unicas_minusculas.isin(list(mapeamento.keys())).values
+    destinos = np.full(len(unicas), None, dtype=object)
+    destinos[exatas] = unicas_minusculas[exatas].map(mapeamento).values
+    
+    # Categorias sem mapeamento exato que contêm "outros" buscam a melhor correspondência
+    pendentes = np.flatnonzero(~exatas & unicas_minusculas.str.contains("outros", regex=False).values)
+    if len(pendentes) > 0:
+        if indice is None:
+            indice = IndiceMapeamento(mapeamento)
+        for posicao in pendentes:
+            melhor_correspondencia, max_similaridade = indice.melhor_correspondencia(unicas_minusculas[posicao])
+            if melhor_correspondencia and max_similaridade > limiar_similaridade:
+                destinos[posicao] = melhor_correspondencia
+    
+    return pd.Series(destinos[codigos], index=categorias.index, dtype=object)
+
+# Tudo o que a classificação dos pares únicos precisa além das descrições
+ContextoClassificacao = namedtuple(
+    'ContextoClassificacao',
+    ['motor_regras', 'vectorizer', 'modelo', 'categorias_modelo', 'taxonomia', 'limiar_confianca']
+)
+
+# Abaixo deste número de pares por processo o custo de iniciar o processo supera o ganho
+MINIMO_PARES_POR_PROCESSO = 5000
+
+def _sem_perfil(nome, linhas_entrada=None):
+    # Etapa sem medição, usada quando nenhum medidor é informado
+    return contextlib.nullcontext({})
+
+def classificar_pares_unicos(descricoes_unicas, prep_unicas, contexto, perfil=None):
+    """
+    Aplica regras, similaridade e regras agressivas a pares (descrição, categoria) únicos.
+    
+    Cada par é classificado de forma independente dos demais, então o resultado
+    de uma fatia é idêntico ao da mesma fatia classificada junto com as outras.
+    
+    Args:
+        descricoes_unicas (Series): Descrição de cada par único
+        prep_unicas (Series): Descrição preprocessada de cada par único
+        contexto (ContextoClassificacao): Regras compiladas, modelo de similaridade e taxonomia
+        perfil (MedidorEtapas): Medidor das etapas (None não mede)
+    
+    Returns:
+        tuple: Arrays (categorias_regras, categorias_similaridade, confiancas_similaridade, categorias_agressivas)
+    """
+    motor_regras, vectorizer, modelo, categorias_modelo, taxonomia, limiar_confianca = contexto
+    etapa = perfil.etapa if perfil is not None else _sem_perfil
+    
+    # Categorizar por regras todos os pares únicos de uma só vez
+    with etapa("regras", len(descricoes_unicas)) as registro:
+        categorias_regras = motor_regras.categorizar(descricoes_unicas, prep_unicas).values
+        registro['linhas_saida'] = int(pd.notna(categorias_regras).sum())
+    
+    # Categorizar por similaridade, em lote, os pares que as regras não resolveram
+    mascara_sem_regra = pd.isna(categorias_regras)
+    with etapa("similaridade", int(mascara_sem_regra.sum())) as registro:
+        categorias_similaridade = np.full(len(descricoes_unicas), None, dtype=object)
+        confiancas_similaridade = np.zeros(len(descricoes_unicas), dtype=float)
+        if vectorizer is not None and modelo is not None:
+            if mascara_sem_regra.any():
+                categorias_lote, confiancas_lote = categorizar_por_similaridade_em_lote(
+                    descricoes_unicas[mascara_sem_regra], vectorizer, modelo, categorias_modelo,
+                    descricoes_prep=prep_unicas[mascara_sem_regra]
+                )
+                categorias_similaridade[mascara_sem_regra] = categorias_lote.values
+                confiancas_similaridade[mascara_sem_regra] = confiancas_lote.values
+        registro['linhas_saida'] = int((pd.notna(categorias_similaridade) & (confiancas_similaridade >= limiar_confianca)).sum())
+    
+    # Tentar com as categorias conhecidas do arquivo os pares que a similaridade não resolveu
+    with etapa("regras_agressivas") as registro:
+        categorias_agressivas = np.full(len(descricoes_unicas), None, dtype=object)
+        avaliados = 0
+        if vectorizer is not None and modelo is not None:
+            for posicao, descricao_prep in enumerate(prep_unicas.values):
+                resolvido_por_similaridade = (
+                    categorias_similaridade[posicao] and confiancas_similaridade[posicao] >= limiar_confianca
+                )
+                if categorias_regras[posicao] or resolvido_por_similaridade:
+                    continue
+                
+                if taxonomia is None:
+                    continue
+                
+                avaliados += 1
+                # Pontuação baseada na presença de palavras das categorias na descrição
+                melhor_categoria, max_pontuacao = taxonomia.melhor_categoria_por_palavras(descricao_prep)
+                
+                if melhor_categoria and max_pontuacao > 0:
+                    categorias_agressivas[posicao] = melhor_categoria
+        registro['linhas_entrada'] = avaliados
+        registro['linhas_saida'] = int(pd.notna(categorias_agressivas).sum())
+    return categorias_regras, categorias_similaridade, confiancas_similaridade, categorias_agressivas
+
+# Contexto recebido por cada processo do pool na inicialização
+_contexto_processo = None
+
+def _inicializar_processo(contexto):
+    global _contexto_processo
+    _contexto_processo = contexto
+
+def _classificar_fatia(fatia):
+    descricoes_unicas, prep_unicas = fatia
+    return classificar_pares_unicos(descricoes_unicas, prep_unicas, _contexto_processo)
+
+def classificar_pares_em_paralelo(descricoes_unicas, prep_unicas, contexto, workers=1, perfil=None):
+    """
+    Classifica os pares únicos dividindo-os em fatias contíguas entre processos.
+    
+    O contexto (regras compiladas, vectorizer/KNN e taxonomia) é enviado a cada
+    processo uma única vez, na inicialização do pool; cada tarefa recebe apenas
+    a sua fatia de descrições. Os resultados são concatenados na ordem das
+    fatias, portanto são idênticos aos da execução em um único processo.
+    
+    Args:
+        descricoes_unicas (Series): Descrição de cada par único
+        prep_unicas (Series): Descrição preprocessada de cada par único
+        contexto (ContextoClassificacao): Regras compiladas, modelo de similaridade e taxonomia
+        workers (int): Número máximo de processos
+        perfil (MedidorEtapas): Medidor das etapas (None não mede); com vários processos
+            a classificação é medida como uma única etapa
+    
+    Returns:
+        tuple: Mesmo retorno de `classificar_pares_unicos`
+    """
+    workers = min(workers or 1, len(descricoes_unicas) // MINIMO_PARES_POR_PROCESSO)
+    if workers <= 1:
+        return classificar_pares_unicos(descricoes_unicas, prep_unicas, contexto, perfil)
+    etapa = perfil.etapa if perfil is not None else _sem_perfil
+    
+    limites = np.linspace(0, len(descricoes_unicas), workers + 1).astype(int)
+    fatias = [
+        (descricoes_unicas.iloc[inicio:fim], prep_unicas.iloc[inicio:fim])
+        for inicio, fim in zip(limites[:-1], limites[1:])
+    ]
+    print(f"Classificando {len(descricoes_unicas)} pares únicos em {workers} processos...")
+    
+    with etapa("classificacao_paralela", len(descricoes_unicas)), ProcessPoolExecutor(
+        max_workers=workers, initializer=_inicializar_processo, initargs=(contexto,)
+    ) as pool:
+        resultados = list(pool.map(_classificar_fatia, fatias))
+    
+    return tuple(np.concatenate(partes) for partes in zip(*resultados))
+
+def classificar_pares_com_cache(descricoes_unicas, prep_unicas, categorias_unicas, contexto, regras,
+                                arquivo_cache_resultados, workers=1, perfil=None):
+    """
+    Classifica os pares únicos consultando antes o cache persistente de resultados.
+    
+    Cada par encontrado no cache volta para a posição da etapa da cascata que o
+    resolveu (regras, similaridade ou regras agressivas), então a decisão final
+    segue a mesma precedência. Só os pares ausentes passam pela cascata, e os
+    que ela resolve são gravados no cache em seguida.
+    
+    Args:
+        descricoes_unicas (Series): Descrição de cada par único
+        prep_unicas (Series): Descrição preprocessada de cada par único
+        categorias_unicas (Series): Categoria original de cada par único
+        contexto (ContextoClassificacao): Regras compiladas, modelo de similaridade e taxonomia
+        regras (dict): Regras usadas no motor, que fazem parte da chave do cache
+        arquivo_cache_resultados (str): Arquivo SQLite do cache de resultados
+        workers (int): Número máximo de processos
+        perfil (MedidorEtapas): Medidor das etapas (None não mede)
+    
+    Returns:
+        tuple: Mesmo retorno de `classificar_pares_unicos`
+    """
+    _, vectorizer, modelo, categorias_modelo, taxonomia, limiar_confianca = contexto
+    tem_modelo = vectorizer is not None and modelo is not None
+    etapa = perfil.etapa if perfil is not None else _sem_perfil
+    
+    # O resultado das regras não depende do modelo de similaridade, então tem uma chave sem ele
+    # e continua valendo depois de um novo treino; os demais métodos usam a chave com o modelo
+    dados_taxonomia = taxonomia.para_dict() if taxonomia is not None else None
+    contexto_regras = cache_resultados.calcular_contexto(regras, dados_taxonomia, limiar_confianca)
+    contexto_modelo = cache_resultados.calcular_contexto(
+        regras, dados_taxonomia, limiar_confianca,
+        indice_do_modelo(modelo) if tem_modelo else None, impressao_modelo(vectorizer, modelo, categorias_modelo)
+    )
+    chaves_regras = cache_resultados.calcular_chaves(contexto_regras, prep_unicas.values, categorias_unicas.values)
+    chaves = cache_resultados.calcular_chaves(contexto_modelo, prep_unicas.values, categorias_unicas.values)
+    
+    categorias_regras = np.full(len(chaves), None, dtype=object)
+    categorias_similaridade = np.full(len(chaves), None, dtype=object)
+    confiancas_similaridade = np.zeros(len(chaves), dtype=float)
+    categorias_agressivas = np.full(len(chaves), None, dtype=object)
+    
+    with cache_resultados.CacheResultados(arquivo_cache_resultados) as cache:
+        with etapa("cache_resultados", len(chaves)) as registro:
+            encontrados, categorias, metodos, confiancas = cache.consultar(chaves_regras)
+            encontrados &= metodos == 'regras'
+            sem_regra = np.flatnonzero(~encontrados)
+            if len(sem_regra) > 0:
+                resultado_modelo = cache.consultar([chaves[indice] for indice in sem_regra])
+                for destino, parte in zip([encontrados, categorias, metodos, confiancas], resultado_modelo):
+                    destino[sem_regra] = parte
+            registro['linhas_saida'] = int(encontrados.sum())
+        for metodo, destino in [('regras', categorias_regras), ('similaridade', categorias_similaridade),
+                                ('regras_agressivas', categorias_agressivas)]:
+            mascara = encontrados & (metodos == metodo)
+            destino[mascara] = categorias[mascara]
+        confiancas_similaridade[encontrados] = confiancas[encontrados]
+        print(f"Pares encontrados no cache de resultados: {int(encontrados.sum())} de {len(chaves)}")
+        
+        faltantes = np.flatnonzero(~encontrados)
+        if len(faltantes) == 0:
+            return categorias_regras, categorias_similaridade, confiancas_similaridade, categorias_agressivas
+        
+        resultados = classificar_pares_em_paralelo(
+            descricoes_unicas.iloc[faltantes], prep_unicas.iloc[faltantes], contexto, workers, perfil
+        )
+        for destino, parte in zip([categorias_regras, categorias_similaridade, confiancas_similaridade,
+                                   categorias_agressivas], resultados):
+            destino[faltantes] = parte
+        
+        # Método que resolveria cada par novo (None quando só os últimos recursos se aplicam)
+        novas_categorias = np.full(len(faltantes), None, dtype=object)
+        novos_metodos = np.full(len(faltantes), None, dtype=object)
+        for posicao, indice in enumerate(faltantes):
+            if categorias_regras[indice]:
+                novas_categorias[posicao], novos_metodos[posicao] = categorias_regras[indice], 'regras'
+            elif not tem_modelo:
+                continue
+            elif categorias_similaridade[indice] and confiancas_similaridade[indice] >= limiar_confianca:
+                novas_categorias[posicao], novos_metodos[posicao] = categorias_similaridade[indice], 'similaridade'
+            elif categorias_agressivas[indice]:
+                novas_categorias[posicao], novos_metodos[posicao] = categorias_agressivas[indice], 'regras_agressivas'
+        
+        with etapa("gravacao_cache", len(faltantes)):
+            cache.gravar(
+                [chaves_regras[indice] if metodo == 'regras' else chaves[indice]
+                 for indice, metodo in zip(faltantes, novos_metodos)],
+                novas_categorias, novos_metodos, confiancas_similaridade[faltantes]
+            )
+    
+    return categorias_regras, categorias_similaridade, confiancas_similaridade, categorias_agressivas
+
+def obter_categoria_mais_comum(categorias, categoria_fixa=None):
+    """
+    Escolhe a categoria usada como último recurso.
+    
+    Args:
+        categorias (Series): Coluna de categorias corrigidas no estado atual
+        categoria_fixa (str): Categoria já definida (ex.: calculada sobre o arquivo inteiro no modo em blocos)
+    
+    Returns:
+        str: Categoria mais comum ou None se ela for "Outros" ou não houver categorias
+    """
+    if categoria_fixa is not None:
+        return categoria_fixa if str(categoria_fixa).lower() != "outros" else None
+    
+    categorias_comuns = categorias.value_counts()
+    if not categorias_comuns.empty and categorias_comuns.index[0].lower() != "outros":
+        return categorias_comuns.index[0]
+    return None
+
+def _preenchidos(valores):
+    """Máscara dos valores verdadeiros (categoria encontrada), com a mesma regra de `if valor:`."""
+    return np.fromiter((bool(valor) for valor in valores), dtype=bool, count=len(valores))
+
+def resolver_ultimo_recurso(categorias_iniciais, posicoes_pendentes, novas_categorias, mascara_ultimo_recurso,
+                            categoria_padrao):
+    """
+    Resolve as linhas que chegam ao último recurso com a categoria mais comum do momento.
+    
+    Reproduz o processamento linha a linha: as linhas pendentes são resolvidas em
+    ordem, e cada linha que chega ao último recurso recebe a categoria mais comum
+    da coluna naquele momento (linhas anteriores já resolvidas, seguintes ainda com
+    o valor original), ou `categoria_padrao` se ela for "Outros" ou não existir.
+    Em vez de contar a coluna inteira a cada linha, as contagens são atualizadas
+    com as linhas resolvidas entre dois últimos recursos. Só quando há empate na
+    contagem a coluna é montada e contada como em `obter_categoria_mais_comum`,
+    para manter o mesmo desempate.
+    
+    Args:
+        categorias_iniciais (ndarray): Coluna de categorias corrigidas antes da cascata (object)
+        posicoes_pendentes (ndarray): Posição de cada linha pendente na coluna, em ordem
+        novas_categorias (ndarray): Categoria de cada linha pendente dada pelas etapas anteriores;
+            as linhas do último recurso são preenchidas aqui
+        mascara_ultimo_recurso (ndarray): Linhas pendentes que chegam ao último recurso
+        categoria_padrao: Categoria usada quando não há categoria mais comum válida
+    
+    Returns:
+        ndarray: Máscara das linhas do último recurso que receberam a categoria mais comum
+    """
+    usou_mais_comum = np.zeros(len(novas_categorias), dtype=bool)
+    ultimos_recursos = np.flatnonzero(mascara_ultimo_recurso)
+    if len(ultimos_recursos) == 0:
+        return usou_mais_comum
+    
+    # Códigos comuns à coluna inicial, às categorias novas e à categoria padrão (ausentes ficam com -1)
+    codigos, valores = pd.factorize(np.concatenate([categorias_iniciais, novas_categorias, [categoria_padrao]]))
+    valores = pd.Index(valores, dtype=object)
+    codigos_antigos = codigos[:len(categorias_iniciais)][posicoes_pendentes]
+    codigos_novos = codigos[len(categorias_iniciais):-1].copy()
+    codigo_padrao = codigos[-1]
+    
+    # Uma posição extra no final recebe os valores ausentes (código -1) e é sempre zerada
+    contagens = np.bincount(codigos[:len(categorias_iniciais)] + 1, minlength=len(valores) + 1)
+    contagens = np.roll(contagens, -1)
+    contagens[-1] = 0
+    
+    aplicadas = 0
+    for indice in ultimos_recursos:
+        # Linhas resolvidas pelas etapas anteriores desde o último recurso anterior
+        np.subtract.at(contagens, codigos_antigos[aplicadas:indice], 1)
+        np.add.at(contagens, codigos_novos[aplicadas:indice], 1)
+        contagens[-1] = 0
+        
+        maximo = contagens[:-1].max()
+        empatadas = np.flatnonzero(contagens[:-1] == maximo)
+        if maximo == 0:
+            mais_comum = None
+        elif len(empatadas) == 1:
+            mais_comum = valores[empatadas[0]]
+        else:
+            coluna = categorias_iniciais.copy()
+            coluna[posicoes_pendentes[:indice]] = novas_categorias[:indice]
+            mais_comum = obter_categoria_mais_comum(pd.Series(coluna, dtype=object))
+        if mais_comum is not None and mais_comum.lower() == "outros":
+            mais_comum = None
+        
+        if mais_comum is not None:
+            novas_categorias[indice] = mais_comum
+            codigos_novos[indice] = valores.get_loc(mais_comum)
+            usou_mais_comum[indice] = True
+        else:
+            novas_categorias[indice] = categoria_padrao
+            codigos_novos[indice] = codigo_padrao
+        
+        # A linha passa do valor original para a categoria escolhida
+        contagens[codigos_antigos[indice]] -= 1
+        contagens[codigos_novos[indice]] += 1
+        contagens[-1] = 0
+        aplicadas = indice + 1
+    
+    return usou_mais_comum
+
+def fatorar_pares(descricoes, categorias):
+    """
+    Atribui um código inteiro a cada par (descrição, categoria) distinto.
+    
+    Args:
+        descricoes (Series): Descrições dos produtos
+        categorias (Series): Categorias originais, alinhadas às descrições
+    
+    Returns:
+        tuple: (códigos por linha, posição da primeira linha de cada par)
+    """
+    codigos_descricao, _ = pd.factorize(descricoes, use_na_sentinel=False)
+    codigos_categoria, categorias_unicas = pd.factorize(categorias, use_na_sentinel=False)
+    
+    combinados = codigos_descricao.astype(np.int64) * (len(categorias_unicas) + 1) + codigos_categoria
+    codigos, _ = pd.factorize(combinados)
+    
+    # Os códigos seguem a ordem da primeira ocorrência, então esta é a posição de cada par
+    _, primeiras = np.unique(codigos, return_index=True)
+    
+    return codigos, primeiras
+
+def imprimir_resumo_perfil(perfil, arquivo=None):
+    """
+    Imprime o resumo das etapas medidas (tempo, CPU, linhas e pico de memória).
+    
+    Args:
+        perfil (MedidorEtapas): Medidor com as etapas registradas
+        arquivo: Fluxo de texto de destino (padrão: saída padrão)
+    """
+    resumo = perfil.resumo()
+    if resumo.empty:
+        return
+    for coluna in ['linhas_entrada', 'linhas_saida']:
+        resumo[coluna] = resumo[coluna].astype(object).where(resumo[coluna].notna(), "-")
+    print("Perfil por etapa:", file=arquivo)
+    print(resumo.to_string(index=False, float_format=lambda valor: f"{valor:.3f}", na_rep="-"), file=arquivo)
+
+def categorizar_produtos(df, coluna_descricao, coluna_categoria, limiar_confianca=None, arquivo_categorias=None,
+                         diretorio_cache_modelos=None, modelo_similaridade=None, categoria_mais_comum=None,
+                         workers=1, arquivo_cache_resultados=None, perfil=None, indice_similaridade='exato'):
     """
     Categoriza produtos com base em regras e similaridade de texto.
     
@@ -393,65 +1609,67 @@ def categorizar_produtos(df, coluna_descricao, coluna_categoria, limiar_confianc
         df (DataFrame): DataFrame com os dados
         coluna_descricao (str): Nome da coluna com as descrições
         coluna_categoria (str): Nome da coluna com as categorias
-        limiar_confianca (float): Limiar de confiança para aceitar categorias por similaridade
+        limiar_confianca (float): Limiar de confiança para aceitar categorias por similaridade; None usa
+            o padrão do modo do modelo (`LIMIAR_CONFIANCA_PADRAO`: 0.4 no KNN, 0.15 nos centroides)
         arquivo_categorias (str): Caminho para o arquivo de categorias de referência
+        diretorio_cache_modelos (str): Diretório do cache de modelos de similaridade (None desativa o cache)
+        modelo_similaridade (tuple): Modelo já treinado (vectorizer, modelo, categorias) ou um `ModeloIncremental`;
+            se omitido, é treinado com `df`
+        categoria_mais_comum (str): Categoria fixa para o último recurso; se omitida, usa a mais comum no próprio `df`
+        workers (int): Número de processos usados para classificar os pares únicos (1 = sem paralelismo)
+        arquivo_cache_resultados (str): Arquivo do cache de resultados por par entre execuções (None desativa o cache)
+        perfil (MedidorEtapas): Medidor que registra cada etapa da categorização (None não mede);
+            True cria um medidor (tempo, CPU, linhas e pico de memória) e imprime o resumo ao final
+        indice_similaridade (str): Busca na similaridade: 'exato', 'aproximado' ou 'centroides'
         
     Returns:
         DataFrame: DataFrame com a nova coluna de categorias corrigidas
     """
-    # Criar uma cópia do DataFrame
-    df_resultado = df.copy()
+    imprimir_perfil = perfil is True
+    if imprimir_perfil:
+        perfil = MedidorEtapas()
+    etapa = perfil.etapa if perfil is not None else _sem_perfil
+    
+    # Cópia rasa: as colunas existentes são compartilhadas com `df` e só as colunas novas são escritas
+    df_resultado = df.copy(deep=False)
     
     # Criar a coluna de categoria corrigida, inicialmente com os valores originais
-    df_resultado['categoria_corrigida'] = df_resultado[coluna_categoria]
+    # (cópia própria da coluna, pois ela é alterada linha a linha mais adiante)
+    df_resultado['categoria_corrigida'] = df_resultado[coluna_categoria].copy()
     
     # Carregar mapeamento de categorias se o arquivo for fornecido
     mapeamento_categorias = {}
     categorias_conhecidas_arquivo = []
+    taxonomia = None
     
     if arquivo_categorias and os.path.exists(arquivo_categorias):
-        print(f"Carregando mapeamento de categorias de: {arquivo_categorias}")
-        resultado_categorias = carregar_categorias_referencia(arquivo_categorias)
-        mapeamento_categorias = resultado_categorias['mapeamento']
-        categorias_conhecidas_arquivo = resultado_categorias['categorias']
-        print(f"Carregado mapeamento de {len(mapeamento_categorias)} categorias.")
-        print(f"Categorias conhecidas do arquivo: {categorias_conhecidas_arquivo[:10]}...")
+        with etapa("taxonomia"):
+            print(f"Carregando mapeamento de categorias de: {arquivo_categorias}")
+            taxonomia = carregar_taxonomia(arquivo_categorias)
+            mapeamento_categorias = taxonomia.mapeamento
+            categorias_conhecidas_arquivo = taxonomia.categorias
+            print(f"Carregado mapeamento de {len(mapeamento_categorias)} categorias.")
+            print(f"Categorias conhecidas do arquivo: {categorias_conhecidas_arquivo[:10]}...")
     
     # Aplicar mapeamento de categorias para todas as linhas
     if mapeamento_categorias:
-        print("Aplicando mapeamento de categorias...")
-        categorias_mapeadas = 0
-        
-        for idx, row in df_resultado.iterrows():
-            categoria_atual = str(row[coluna_categoria]).lower()
+        with etapa("mapeamento", len(df_resultado)) as registro:
+            print("Aplicando mapeamento de categorias...")
             
-            # Verificar mapeamento exato
-            if categoria_atual in mapeamento_categorias:
-                categoria_original = row[coluna_categoria]
-                categoria_nova = mapeamento_categorias[categoria_atual]
-                df_resultado.at[idx, 'categoria_corrigida'] = categoria_nova
-                categorias_mapeadas += 1
-                continue
+            # Resolver mapeamento exato e correspondências com "Outros" por categoria distinta
+            categorias_destino = resolver_mapeamento_categorias(
+                df_resultado[coluna_categoria], mapeamento_categorias, indice=taxonomia.indice_mapeamento
+            )
+            mascara_mapeadas = categorias_destino.notna().values
+            categorias_mapeadas = int(mascara_mapeadas.sum())
             
-            # Verificar se é "Outros" ou contém "Outros"
-            if "outros" in categoria_atual:
-                # Tentar encontrar a melhor correspondência no mapeamento
-                melhor_correspondencia = None
-                max_similaridade = 0
-                
-                for cat_origem, cat_destino in mapeamento_categorias.items():
-                    # Calcular similaridade entre strings
-                    similaridade = calcular_similaridade(categoria_atual, cat_origem)
-                    if similaridade > max_similaridade:
-                        max_similaridade = similaridade
-                        melhor_correspondencia = cat_destino
-                
-                # Se encontrou uma correspondência com boa similaridade
-                if melhor_correspondencia and max_similaridade > 0.7:
-                    df_resultado.at[idx, 'categoria_corrigida'] = melhor_correspondencia
-                    categorias_mapeadas += 1
-        
-        print(f"Total de {categorias_mapeadas} categorias mapeadas diretamente.")
+            if categorias_mapeadas > 0:
+                coluna_corrigida = df_resultado['categoria_corrigida'].to_numpy(dtype=object, copy=True)
+                coluna_corrigida[mascara_mapeadas] = categorias_destino.values[mascara_mapeadas]
+                df_resultado['categoria_corrigida'] = coluna_corrigida
+            
+            print(f"Total de {categorias_mapeadas} categorias mapeadas diretamente.")
+            registro['linhas_saida'] = categorias_mapeadas
     
     # Criar regras de categorização
     regras = criar_regras_categorias()
@@ -460,120 +1678,163 @@ def categorizar_produtos(df, coluna_descricao, coluna_categoria, limiar_confianc
     for categoria in categorias_conhecidas_arquivo:
         if categoria not in regras:
             # Usar o nome da categoria como palavra-chave
-            palavras = preprocessar_texto(categoria).split()
+            palavras = taxonomia.palavras_categorias[categoria]
             if palavras:
                 if categoria not in regras:
                     regras[categoria] = []
                 regras[categoria].extend(palavras)
     
-    # Treinar o modelo de similaridade
-    vectorizer, modelo, categorias_modelo = treinar_modelo_similaridade(
-        df_resultado, coluna_descricao, coluna_categoria
-    )
+    # Normalizar a coluna de descrições uma única vez para todas as etapas
+    with etapa("preprocessamento", len(df_resultado)) as registro:
+        descricoes_prep = preprocessar_serie(df_resultado[coluna_descricao])
+        registro['linhas_saida'] = len(descricoes_prep)
+    
+    # Treinar o modelo de similaridade (ou usar o modelo recebido)
+    with etapa("treino", len(df_resultado) if modelo_similaridade is None else None):
+        if modelo_similaridade is not None:
+            if isinstance(modelo_similaridade, ModeloIncremental):
+                modelo_similaridade = modelo_similaridade.modelo_similaridade()
+            vectorizer, modelo, categorias_modelo = modelo_similaridade
+        else:
+            vectorizer, modelo, categorias_modelo = treinar_modelo_similaridade(
+                df_resultado, coluna_descricao, coluna_categoria, diretorio_cache=diretorio_cache_modelos,
+                descricoes_prep=descricoes_prep, indice=indice_similaridade
+            )
+    limiar_confianca = resolver_limiar_confianca(limiar_confianca, modelo)
     
     # Identificar produtos que ainda estão como "Outros" ou sem categoria
-    mascara_sem_categoria = (
-        df_resultado['categoria_corrigida'].isna() | 
-        (df_resultado['categoria_corrigida'] == "") | 
-        (df_resultado['categoria_corrigida'].str.lower() == "outros") |
-        (df_resultado['categoria_corrigida'].str.lower() == "nan")
-    )
-    
-    produtos_sem_categoria = df_resultado[mascara_sem_categoria]
+    with etapa("pendentes", len(df_resultado)) as registro:
+        mascara_sem_categoria = (
+            df_resultado['categoria_corrigida'].isna() | 
+            (df_resultado['categoria_corrigida'] == "") | 
+            (df_resultado['categoria_corrigida'].str.lower() == "outros") |
+            (df_resultado['categoria_corrigida'].str.lower() == "nan")
+        )
+        
+        # Apenas as colunas usadas na classificação (não copia as demais colunas das linhas pendentes)
+        produtos_sem_categoria = df_resultado.loc[
+            mascara_sem_categoria, list(dict.fromkeys([coluna_descricao, coluna_categoria]))
+        ]
+        prep_sem_categoria = descricoes_prep[mascara_sem_categoria.values]
+        registro['linhas_saida'] = len(produtos_sem_categoria)
     
     # Contador para estatísticas
     stats = {
         'total': len(produtos_sem_categoria),
+        'unicos': 0,
         'regras': 0,
         'similaridade': 0,
         'sem_categoria': 0
     }
     
-    # Processar cada produto sem categoria
-    for idx, row in produtos_sem_categoria.iterrows():
-        descricao = row[coluna_descricao]
-        
-        # Tentar categorizar por regras
-        categoria_regras = categorizar_por_regras(descricao, regras)
-        
-        if categoria_regras:
-            df_resultado.at[idx, 'categoria_corrigida'] = categoria_regras
-            df_resultado.at[idx, 'metodo_categorizacao'] = 'regras'
-            stats['regras'] += 1
-        elif vectorizer is not None and modelo is not None:
-            # Tentar categorizar por similaridade
-            categoria_similaridade, confianca = categorizar_por_similaridade(
-                descricao, vectorizer, modelo, categorias_modelo
-            )
+    # Deduplicar os pares (descrição, categoria original): as etapas de classificação
+    # dependem apenas deles, então cada par único é classificado uma única vez
+    with etapa("pares_unicos", len(produtos_sem_categoria)) as registro:
+        codigos_pares, primeiras = fatorar_pares(
+            produtos_sem_categoria[coluna_descricao], produtos_sem_categoria[coluna_categoria]
+        )
+        descricoes_unicas = produtos_sem_categoria[coluna_descricao].iloc[primeiras]
+        prep_unicas = prep_sem_categoria.iloc[primeiras]
+        registro['linhas_saida'] = len(descricoes_unicas)
+    stats['unicos'] = len(descricoes_unicas)
+    
+    # Classificar os pares únicos, divididos entre processos se `workers` > 1
+    with etapa("compilar_regras"):
+        motor_regras = MotorRegras(regras)
+    contexto = ContextoClassificacao(
+        motor_regras, vectorizer, modelo, categorias_modelo, taxonomia, limiar_confianca
+    )
+    if arquivo_cache_resultados:
+        categorias_unicas = produtos_sem_categoria[coluna_categoria].iloc[primeiras]
+        resultados = classificar_pares_com_cache(
+            descricoes_unicas, prep_unicas, categorias_unicas, contexto, regras, arquivo_cache_resultados, workers,
+            perfil
+        )
+    else:
+        resultados = classificar_pares_em_paralelo(descricoes_unicas, prep_unicas, contexto, workers, perfil)
+    categorias_regras, categorias_similaridade, confiancas_similaridade, categorias_agressivas = resultados
+    
+    # Resolver os produtos sem categoria em etapas, cada uma sobre as linhas ainda pendentes,
+    # usando o resultado do seu par único; os resultados são gravados de uma só vez ao final
+    with etapa("fallbacks", len(produtos_sem_categoria)) as registro:
+        tem_modelo = vectorizer is not None and modelo is not None
+        novas_categorias = np.full(len(codigos_pares), None, dtype=object)
+        metodos = np.full(len(codigos_pares), None, dtype=object)
+        confiancas = np.full(len(codigos_pares), np.nan)
+        pendentes = np.ones(len(codigos_pares), dtype=bool)
+        
+        # Regras
+        mascara = _preenchidos(categorias_regras)[codigos_pares]
+        novas_categorias[mascara] = categorias_regras[codigos_pares[mascara]]
+        metodos[mascara] = 'regras'
+        pendentes &= ~mascara
+        
+        if tem_modelo:
+            # Similaridade acima do limiar de confiança
+            confiancas_pares = confiancas_similaridade[codigos_pares]
+            mascara = pendentes & _preenchidos(categorias_similaridade)[codigos_pares] & (confiancas_pares >= limiar_confianca)
+            novas_categorias[mascara] = categorias_similaridade[codigos_pares[mascara]]
+            metodos[mascara] = 'similaridade'
+            confiancas[mascara] = confiancas_pares[mascara]
+            pendentes &= ~mascara
             
-            if categoria_similaridade and confianca >= limiar_confianca:
-                df_resultado.at[idx, 'categoria_corrigida'] = categoria_similaridade
-                df_resultado.at[idx, 'metodo_categorizacao'] = 'similaridade'
-                df_resultado.at[idx, 'confianca_categorizacao'] = confianca
-                stats['similaridade'] += 1
-            else:
-                # Tentar com as categorias conhecidas do arquivo
-                melhor_categoria = None
-                max_pontuacao = 0
-                
-                descricao_prep = preprocessar_texto(descricao)
-                
-                for categoria in categorias_conhecidas_arquivo:
-                    # Calcular pontuação baseada na presença de palavras da categoria na descrição
-                    palavras_categoria = preprocessar_texto(categoria).split()
-                    pontuacao = sum(1 for palavra in palavras_categoria if palavra in descricao_prep)
-                    
-                    if pontuacao > max_pontuacao:
-                        max_pontuacao = pontuacao
-                        melhor_categoria = categoria
-                
-                if melhor_categoria and max_pontuacao > 0:
-                    df_resultado.at[idx, 'categoria_corrigida'] = melhor_categoria
-                    df_resultado.at[idx, 'metodo_categorizacao'] = 'regras_agressivas'
-                    stats['regras'] += 1
-                else:
-                    # Usar a categoria mais comum como último recurso
-                    categorias_comuns = df_resultado['categoria_corrigida'].value_counts()
-                    if not categorias_comuns.empty and categorias_comuns.index[0].lower() != "outros":
-                        categoria_mais_comum = categorias_comuns.index[0]
-                        df_resultado.at[idx, 'categoria_corrigida'] = categoria_mais_comum
-                        df_resultado.at[idx, 'metodo_categorizacao'] = 'categoria_mais_comum'
-                        stats['similaridade'] += 1
-                    else:
-                        # Se temos categorias conhecidas do arquivo, usar a primeira
-                        if categorias_conhecidas_arquivo:
-                            df_resultado.at[idx, 'categoria_corrigida'] = categorias_conhecidas_arquivo[0]
-                            df_resultado.at[idx, 'metodo_categorizacao'] = 'categoria_padrao_arquivo'
-                            stats['sem_categoria'] += 1
-                        else:
-                            df_resultado.at[idx, 'categoria_corrigida'] = "Maquiagem"  # Categoria padrão como último recurso
-                            df_resultado.at[idx, 'metodo_categorizacao'] = 'sem_correspondencia'
-                            stats['sem_categoria'] += 1
+            # Palavras das categorias de referência (regras agressivas)
+            mascara = pendentes & _preenchidos(categorias_agressivas)[codigos_pares]
+            novas_categorias[mascara] = categorias_agressivas[codigos_pares[mascara]]
+            metodos[mascara] = 'regras_agressivas'
+            pendentes &= ~mascara
+        
+        # Último recurso: categoria mais comum e, se não houver, a categoria padrão
+        if categorias_conhecidas_arquivo:
+            categoria_padrao, metodo_padrao = categorias_conhecidas_arquivo[0], 'categoria_padrao_arquivo'
         else:
-            # Usar a categoria mais comum como último recurso
-            categorias_comuns = df_resultado['categoria_corrigida'].value_counts()
-            if not categorias_comuns.empty and categorias_comuns.index[0].lower() != "outros":
-                categoria_mais_comum = categorias_comuns.index[0]
-                df_resultado.at[idx, 'categoria_corrigida'] = categoria_mais_comum
-                df_resultado.at[idx, 'metodo_categorizacao'] = 'categoria_mais_comum'
-                stats['similaridade'] += 1
-            else:
-                # Se temos categorias conhecidas do arquivo, usar a primeira
-                if categorias_conhecidas_arquivo:
-                    df_resultado.at[idx, 'categoria_corrigida'] = categorias_conhecidas_arquivo[0]
-                    df_resultado.at[idx, 'metodo_categorizacao'] = 'categoria_padrao_arquivo'
-                    stats['sem_categoria'] += 1
+            categoria_padrao = "Maquiagem"  # Categoria padrão como último recurso
+            metodo_padrao = 'sem_correspondencia' if tem_modelo else 'sem_modelo'
+        
+        posicoes_pendentes = np.flatnonzero(mascara_sem_categoria.values)
+        coluna_corrigida = df_resultado['categoria_corrigida'].to_numpy(dtype=object, copy=True)
+        if categoria_mais_comum is not None:
+            # Categoria fixa (modo em blocos): a mesma para todas as linhas
+            categoria_comum = obter_categoria_mais_comum(None, categoria_mais_comum)
+            usou_mais_comum = pendentes if categoria_comum is not None else np.zeros_like(pendentes)
+            novas_categorias[pendentes] = categoria_comum if categoria_comum is not None else categoria_padrao
+        else:
+            usou_mais_comum = resolver_ultimo_recurso(
+                coluna_corrigida, posicoes_pendentes, novas_categorias, pendentes, categoria_padrao
+            )
+        metodos[usou_mais_comum] = 'categoria_mais_comum'
+        metodos[pendentes & ~usou_mais_comum] = metodo_padrao
+        
+        stats['regras'] = int(np.isin(metodos, ['regras', 'regras_agressivas']).sum())
+        stats['similaridade'] = int(np.isin(metodos, ['similaridade', 'categoria_mais_comum']).sum())
+        stats['sem_categoria'] = int(np.isin(metodos, ['categoria_padrao_arquivo', 'sem_correspondencia', 'sem_modelo']).sum())
+        
+        # Gravar as colunas de resultado (as colunas novas só são criadas se houver linhas pendentes)
+        if len(posicoes_pendentes) > 0:
+            coluna_corrigida[posicoes_pendentes] = novas_categorias
+            df_resultado['categoria_corrigida'] = coluna_corrigida
+            for coluna, valores in [('metodo_categorizacao', metodos), ('confianca_categorizacao', confiancas)]:
+                mascara = pd.notna(valores)
+                if coluna not in df_resultado.columns and not mascara.any():
+                    continue
+                if coluna in df_resultado.columns:
+                    coluna_resultado = df_resultado[coluna].to_numpy(dtype=valores.dtype, copy=True)
                 else:
-                    df_resultado.at[idx, 'categoria_corrigida'] = "Maquiagem"  # Categoria padrão como último recurso
-                    df_resultado.at[idx, 'metodo_categorizacao'] = 'sem_modelo'
-                    stats['sem_categoria'] += 1
+                    coluna_resultado = np.full(len(df_resultado), np.nan, dtype=valores.dtype)
+                coluna_resultado[posicoes_pendentes[mascara]] = valores[mascara]
+                df_resultado[coluna] = coluna_resultado
+        registro['linhas_saida'] = len(posicoes_pendentes)
     
     # Exibir estatísticas
     if stats['total'] > 0:
         print(f"Total de produtos sem categoria após mapeamento: {stats['total']}")
+        print(f"Pares (descrição, categoria) únicos classificados: {stats['unicos']} "
+              f"(redução de {stats['total']/stats['unicos']:.1f}x)")
         print(f"Categorizados por regras: {stats['regras']} ({stats['regras']/stats['total']*100:.1f}%)")
         print(f"Categorizados por similaridade: {stats['similaridade']} ({stats['similaridade']/stats['total']*100:.1f}%)")
         print(f"Mantidos como 'Outros': {stats['sem_categoria']} ({stats['sem_categoria']/stats['total']*100:.1f}%)")
+    if imprimir_perfil:
+        imprimir_resumo_perfil(perfil)
     
     # Verificar se ainda existem produtos com categoria "Outros"
     outros_restantes = (df_resultado['categoria_corrigida'].str.lower() == "outros").sum()
@@ -801,27 +2062,540 @@ def mapear_categorias_similares(df, coluna_categoria):
     
     return mapeamento
 
+# Colunas adicionadas pela categorização (fixas para que todos os blocos tenham o mesmo esquema)
+COLUNAS_RESULTADO = ['categoria_corrigida', 'metodo_categorizacao', 'confianca_categorizacao']
+
+# Extensões reconhecidas para cada formato de arquivo
+EXTENSOES_FORMATOS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.json': 'jsonl',
+    '.xlsx': 'excel',
+    '.xls': 'excel',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather'
+}
+
+# Compressão usada quando nenhuma é informada
+COMPRESSAO_PADRAO = {'parquet': 'zstd', 'feather': 'lz4'}
+
+# Sufixos de compressão aceitos em arquivos de texto (ex.: vendas.csv.gz)
+SUFIXOS_COMPRESSAO = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+# Funções de abertura de arquivos de texto comprimidos, usadas na escrita em blocos
+ABRIR_COMPRIMIDO = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+
+def formato_arquivo(caminho_arquivo):
+    """
+    Identifica o formato de um arquivo pela extensão.
+    
+    Args:
+        caminho_arquivo (str): Caminho do arquivo
+    
+    Returns:
+        str: 'csv', 'jsonl', 'excel', 'parquet' ou 'feather'
+    """
+    nome, extensao = os.path.splitext(caminho_arquivo.lower())
+    if extensao in SUFIXOS_COMPRESSAO:
+        extensao = os.path.splitext(nome)[1]
+        if EXTENSOES_FORMATOS.get(extensao) not in ['csv', 'jsonl']:
+            raise ValueError(f"Compressão por sufixo só é suportada em CSV e JSONL: {caminho_arquivo}")
+    if extensao not in EXTENSOES_FORMATOS:
+        raise ValueError(f"Formato de arquivo não suportado: {extensao}")
+    return EXTENSOES_FORMATOS[extensao]
+
+def _colunas_como_texto(df, colunas_texto):
+    # Colunas codificadas como dicionário chegam como Categorical, que não aceita novas categorias
+    for coluna in colunas_texto or []:
+        if coluna in df.columns and isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype(object)
+    return df
+
+def ler_arquivo(caminho_arquivo, colunas=None, colunas_texto=None):
+    """
+    Lê um arquivo de entrada inteiro, carregando apenas as colunas pedidas.
+    
+    Args:
+        caminho_arquivo (str): Caminho do arquivo (CSV, JSONL, Excel, Parquet ou Feather/Arrow)
+        colunas (list): Colunas a carregar (None carrega todas)
+        colunas_texto (list): Colunas que devem chegar como texto (object)
+    
+    Returns:
+        DataFrame: Dados lidos
+    """
+    formato = formato_arquivo(caminho_arquivo)
+    
+    if formato == 'csv':
+        df = pd.read_csv(caminho_arquivo, usecols=colunas)
+    elif formato == 'jsonl':
+        df = pd.read_json(caminho_arquivo, lines=True, dtype=False, convert_dates=False)
+        if colunas is not None:
+            df = df[[coluna for coluna in df.columns if coluna in colunas]]
+    elif formato == 'excel':
+        df = pd.read_excel(caminho_arquivo, usecols=colunas)
+    elif formato == 'parquet':
+        df = pd.read_parquet(caminho_arquivo, columns=colunas)
+    else:
+        df = pd.read_feather(caminho_arquivo, columns=colunas)
+    
+    return _colunas_como_texto(df, colunas_texto)
+
+def ler_em_blocos(caminho_arquivo, tamanho_bloco, colunas=None, colunas_texto=None):
+    """
+    Lê um arquivo de entrada em blocos de até `tamanho_bloco` linhas.
+    
+    CSV, JSONL e Parquet são lidos de forma incremental; arquivos Feather/Arrow
+    são mapeados em memória e convertidos bloco a bloco. Planilhas Excel não
+    permitem leitura parcial e são carregadas inteiras antes de serem fatiadas.
+    
+    Args:
+        caminho_arquivo (str): Caminho do arquivo (CSV, JSONL, Excel, Parquet ou Feather/Arrow)
+        tamanho_bloco (int): Número máximo de linhas por bloco
+        colunas (list): Colunas a carregar (None carrega todas)
+        colunas_texto (list): Colunas lidas sempre como texto, para que o tipo não varie entre blocos
+    
+    Returns:
+        iterator: Blocos como DataFrames
+    """
+    formato = formato_arquivo(caminho_arquivo)
+    
+    if formato == 'csv':
+        tipos = {coluna: object for coluna in (colunas_texto or [])}
+        leitor = pd.read_csv(caminho_arquivo, chunksize=tamanho_bloco, usecols=colunas, dtype=tipos)
+        with leitor:
+            yield from leitor
+    elif formato == 'jsonl':
+        leitor = pd.read_json(
+            caminho_arquivo, lines=True, chunksize=tamanho_bloco, dtype=False, convert_dates=False
+        )
+        with leitor:
+            for bloco in leitor:
+                yield bloco[[coluna for coluna in bloco.columns if coluna in colunas]] if colunas is not None else bloco
+    elif formato == 'excel':
+        df = pd.read_excel(caminho_arquivo, usecols=colunas)
+        for inicio in range(0, len(df), tamanho_bloco):
+            yield df.iloc[inicio:inicio + tamanho_bloco]
+    elif formato == 'parquet':
+        import pyarrow.parquet as pq
+        
+        arquivo = pq.ParquetFile(caminho_arquivo)
+        for lote in arquivo.iter_batches(batch_size=tamanho_bloco, columns=colunas):
+            yield _colunas_como_texto(lote.to_pandas(), colunas_texto)
+    else:
+        import pyarrow.feather as feather
+        
+        tabela = feather.read_table(caminho_arquivo, columns=colunas, memory_map=True)
+        for inicio in range(0, tabela.num_rows, tamanho_bloco):
+            yield _colunas_como_texto(tabela.slice(inicio, tamanho_bloco).to_pandas(), colunas_texto)
+
+def _como_dicionario(df, colunas_dicionario):
+    """Converte as colunas de texto indicadas em Categorical (gravadas como dicionário no Arrow)."""
+    convertidas = {
+        coluna: df[coluna].astype('category')
+        for coluna in colunas_dicionario or []
+        if coluna in df.columns and df[coluna].dtype == object
+    }
+    return df.assign(**convertidas) if convertidas else df
+
+def salvar_arquivo(df, caminho_arquivo, compressao=None, colunas_dicionario=None):
+    """
+    Salva o DataFrame no formato indicado pela extensão do arquivo.
+    
+    Em Parquet e Feather as colunas de `colunas_dicionario` (categorias, com
+    poucos valores distintos) são gravadas com codificação de dicionário.
+    
+    Args:
+        df (DataFrame): Dados a salvar
+        caminho_arquivo (str): Caminho do arquivo de saída
+        compressao (str): Codec de compressão (None usa o padrão do formato; 'none' desativa)
+        colunas_dicionario (list): Colunas a gravar com codificação de dicionário
+    """
+    formato = formato_arquivo(caminho_arquivo)
+    if compressao is None:
+        compressao = COMPRESSAO_PADRAO.get(formato, 'infer')
+    
+    if formato == 'csv':
+        df.to_csv(caminho_arquivo, index=False, compression=None if compressao == 'none' else compressao)
+    elif formato == 'jsonl':
+        df.to_json(caminho_arquivo, orient='records', lines=True, force_ascii=False, date_format='iso',
+                   compression=None if compressao == 'none' else compressao)
+    elif formato == 'excel':
+        df.to_excel(caminho_arquivo, index=False)
+    elif formato == 'parquet':
+        _como_dicionario(df, colunas_dicionario).to_parquet(
+            caminho_arquivo, index=False, compression=None if compressao == 'none' else compressao
+        )
+    else:
+        _como_dicionario(df, colunas_dicionario).to_feather(
+            caminho_arquivo, compression='uncompressed' if compressao == 'none' else compressao
+        )
+
+class EscritorBlocos:
+    """
+    Acrescenta blocos categorizados a um arquivo de saída.
+    
+    CSV recebe o cabeçalho só no primeiro bloco e JSONL é escrito linha a linha.
+    Parquet grava um row group por bloco; o esquema é o do primeiro bloco e as
+    colunas de `colunas_dicionario` usam codificação de dicionário nas páginas.
+    Feather/Arrow grava um lote por bloco sem tipo dicionário, pois o formato de
+    arquivo IPC não permite dicionários diferentes entre lotes.
+    """
+    
+    def __init__(self, destino, compressao=None, colunas_dicionario=None):
+        """
+        Args:
+            destino: Caminho do arquivo de saída ou fluxo de texto aberto (escrito em JSONL)
+            compressao (str): Codec de compressão (None usa o padrão do formato; 'none' desativa)
+            colunas_dicionario (list): Colunas a gravar com codificação de dicionário (Parquet)
+        """
+        self.formato = formato_arquivo(destino) if isinstance(destino, str) else 'jsonl'
+        if self.formato == 'excel':
+            raise ValueError("Excel não permite escrita incremental; use CSV, JSONL, Parquet ou Feather")
+        
+        if compressao is None:
+            sufixo = os.path.splitext(destino)[1].lower() if isinstance(destino, str) else ''
+            compressao = COMPRESSAO_PADRAO.get(self.formato, SUFIXOS_COMPRESSAO.get(sufixo))
+        self.compressao = None if compressao == 'none' else compressao
+        self.colunas_dicionario = colunas_dicionario or []
+        self.destino = destino
+        self.arquivo = None
+        self.escritor = None
+        self.esquema = None
+        self.blocos = 0
+        
+        if self.formato in ['csv', 'jsonl']:
+            if not isinstance(destino, str):
+                self.arquivo = destino
+            elif self.compressao is not None:
+                if self.compressao not in ABRIR_COMPRIMIDO:
+                    raise ValueError(f"Compressão não suportada na escrita em blocos: {self.compressao}")
+                self.arquivo = ABRIR_COMPRIMIDO[self.compressao](destino, 'wt', encoding='utf-8', newline='')
+            else:
+                self.arquivo = open(destino, 'w', encoding='utf-8', newline='')
+    
+    def escrever(self, df_bloco):
+        if self.formato == 'csv':
+            df_bloco.to_csv(self.arquivo, index=False, header=(self.blocos == 0))
+        elif self.formato == 'jsonl':
+            texto = df_bloco.to_json(orient='records', lines=True, force_ascii=False, date_format='iso')
+            if texto and not texto.endswith("\n"):
+                texto += "\n"
+            self.arquivo.write(texto)
+        else:
+            self._escrever_arrow(df_bloco)
+        self.blocos += 1
+    
+    def _escrever_arrow(self, df_bloco):
+        import pyarrow as pa
+        
+        # O esquema do primeiro bloco vale para todos; colunas sem nenhum valor nele não podem ficar com tipo nulo
+        tabela = pa.Table.from_pandas(df_bloco, schema=self.esquema, preserve_index=False)
+        if self.escritor is None:
+            campos = [
+                campo.with_type(pa.float64() if campo.name == 'confianca_categorizacao' else pa.string())
+                if pa.types.is_null(campo.type) else campo
+                for campo in tabela.schema
+            ]
+            self.esquema = pa.schema(campos)
+            tabela = tabela.cast(self.esquema)
+            if self.formato == 'parquet':
+                import pyarrow.parquet as pq
+                
+                dicionario = [coluna for coluna in self.colunas_dicionario if coluna in tabela.column_names]
+                self.escritor = pq.ParquetWriter(
+                    self.destino, self.esquema, compression=self.compressao or 'none', use_dictionary=dicionario
+                )
+            else:
+                opcoes = pa.ipc.IpcWriteOptions(compression=self.compressao)
+                self.escritor = pa.ipc.new_file(self.destino, self.esquema, options=opcoes)
+        self.escritor.write_table(tabela)
+    
+    def fechar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+        if self.arquivo is not None:
+            if self.arquivo is self.destino:
+                self.arquivo.flush()
+            else:
+                self.arquivo.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+def categorizar_em_blocos(arquivo_entrada, arquivo_saida, coluna_descricao, coluna_categoria, limiar_confianca=None,
+                          arquivo_categorias=None, tamanho_bloco=100000, diretorio_cache_modelos=None, workers=1,
+                          colunas=None, compressao=None, arquivo_cache_resultados=None, perfil=None,
+                          indice_similaridade='exato', modelo_incremental=None, atualizar_modelo=False):
+    """
+    Categoriza um arquivo grande em blocos, com memória limitada ao tamanho do bloco.
+    
+    A primeira passada lê apenas as colunas de descrição e categoria para montar
+    os pares de treino do modelo de similaridade e contar as categorias após o
+    mapeamento. A segunda passada categoriza cada bloco com o modelo compartilhado
+    e acrescenta o resultado ao arquivo de saída.
+    
+    Com `modelo_incremental`, a primeira passada não guarda os pares de treino:
+    se `atualizar_modelo` for True, cada bloco é absorvido pelo modelo (que deve
+    ser salvo por quem chamou), e a categorização usa o modelo resultante.
+    
+    No modo em blocos a "categoria mais comum" usada como último recurso é fixa:
+    é a categoria mais frequente do arquivo inteiro após o mapeamento de categorias
+    (empates resolvidos pela primeira ocorrência). Assim o resultado de uma linha não
+    depende do bloco em que ela caiu nem das linhas categorizadas antes dela.
+    
+    Args:
+        arquivo_entrada (str): Caminho do arquivo de entrada (CSV, JSONL, Excel, Parquet ou Feather/Arrow)
+        arquivo_saida: Caminho do arquivo de saída (CSV, JSONL, Parquet ou Feather/Arrow) ou fluxo de texto aberto (JSONL)
+        coluna_descricao (str): Nome da coluna com as descrições
+        coluna_categoria (str): Nome da coluna com as categorias
+        limiar_confianca (float): Limiar de confiança para aceitar categorias por similaridade (None usa
+            o padrão do modo do modelo)
+        arquivo_categorias (str): Caminho para o arquivo de categorias de referência
+        tamanho_bloco (int): Número de linhas por bloco
+        diretorio_cache_modelos (str): Diretório do cache de modelos de similaridade (None desativa o cache)
+        workers (int): Número de processos usados para classificar cada bloco
+        colunas (list): Colunas repassadas à saída além da descrição e da categoria (None repassa todas)
+        compressao (str): Codec de compressão da saída (None usa o padrão do formato)
+        arquivo_cache_resultados (str): Arquivo do cache de resultados por par (None desativa o cache)
+        perfil (MedidorEtapas): Medidor das etapas; as etapas de cada bloco são registradas separadamente
+        indice_similaridade (str): Busca na similaridade: 'exato', 'aproximado' ou 'centroides'
+        modelo_incremental (ModeloIncremental): Modelo usado no lugar do treino do KNN (opcional)
+        atualizar_modelo (bool): Absorver no `modelo_incremental` as linhas de categoria conhecida do arquivo
+    
+    Returns:
+        int: Número de linhas categorizadas
+    """
+    etapa = perfil.etapa if perfil is not None else _sem_perfil
+    taxonomia = None
+    if arquivo_categorias and os.path.exists(arquivo_categorias):
+        taxonomia = carregar_taxonomia(arquivo_categorias)
+    
+    # Primeira passada: pares de treino e contagem das categorias após o mapeamento
+    with etapa("primeira_passada", 0) as registro:
+        textos_treino = []
+        categorias_treino = []
+        contagem_categorias = {}
+        for bloco in ler_em_blocos(arquivo_entrada, tamanho_bloco, colunas=[coluna_descricao, coluna_categoria],
+                                   colunas_texto=[coluna_descricao, coluna_categoria]):
+            registro['linhas_entrada'] = registro.get('linhas_entrada', 0) + len(bloco)
+            categorias = bloco[coluna_categoria]
+            mascara_conhecidos = mascara_categorias_conhecidas(categorias).values
+            if modelo_incremental is not None:
+                if atualizar_modelo:
+                    atualizar_modelo_incremental(modelo_incremental, bloco, coluna_descricao, coluna_categoria)
+            elif mascara_conhecidos.any():
+                textos_treino.extend(preprocessar_serie(bloco[coluna_descricao][mascara_conhecidos]).tolist())
+                categorias_treino.extend(categorias.values[mascara_conhecidos])
+            
+            if taxonomia is not None and taxonomia.mapeamento:
+                categorias_destino = resolver_mapeamento_categorias(
+                    categorias, taxonomia.mapeamento, indice=taxonomia.indice_mapeamento
+                )
+                categorias = categorias_destino.where(categorias_destino.notna(), categorias)
+            for categoria, quantidade in categorias.value_counts(sort=False).items():
+                contagem_categorias[categoria] = contagem_categorias.get(categoria, 0) + quantidade
+        registro['linhas_saida'] = len(textos_treino)
+    
+    categoria_mais_comum = max(contagem_categorias, key=contagem_categorias.get) if contagem_categorias else None
+    print(f"Pares de treino coletados: {len(textos_treino)}")
+    if categoria_mais_comum is not None:
+        print(f"Categoria mais comum (fixa para todos os blocos): {categoria_mais_comum}")
+    
+    with etapa("treino", len(textos_treino)):
+        if modelo_incremental is not None:
+            modelo_similaridade = modelo_incremental.modelo_similaridade()
+        else:
+            modelo_similaridade = treinar_modelo_com_pares(
+                textos_treino, np.array(categorias_treino, dtype=object), diretorio_cache_modelos,
+                indice=indice_similaridade
+            )
+    del textos_treino, categorias_treino
+    
+    # Segunda passada: categorizar e acrescentar bloco a bloco
+    colunas_leitura = colunas_projetadas(colunas, coluna_descricao, coluna_categoria)
+    colunas_dicionario = [coluna_categoria, 'categoria_corrigida', 'metodo_categorizacao']
+    
+    total_linhas = 0
+    with EscritorBlocos(arquivo_saida, compressao, colunas_dicionario) as escritor:
+        for numero, bloco in enumerate(ler_em_blocos(arquivo_entrada, tamanho_bloco, colunas=colunas_leitura,
+                                                     colunas_texto=[coluna_descricao, coluna_categoria])):
+            print(f"Categorizando bloco {numero + 1} ({total_linhas + 1}-{total_linhas + len(bloco)})...")
+            df_bloco = categorizar_produtos(
+                bloco, coluna_descricao, coluna_categoria, limiar_confianca, arquivo_categorias,
+                modelo_similaridade=modelo_similaridade, categoria_mais_comum=categoria_mais_comum,
+                workers=workers, arquivo_cache_resultados=arquivo_cache_resultados, perfil=perfil
+            )
+            colunas_saida = [coluna for coluna in df_bloco.columns if coluna not in COLUNAS_RESULTADO] + COLUNAS_RESULTADO
+            df_bloco = df_bloco.reindex(columns=colunas_saida)
+            df_bloco['metodo_categorizacao'] = df_bloco['metodo_categorizacao'].astype(object)
+            with etapa("escrita", len(df_bloco)):
+                escritor.escrever(df_bloco)
+            total_linhas += len(bloco)
+    
+    return total_linhas
+
+def colunas_projetadas(colunas, coluna_descricao, coluna_categoria):
+    """
+    Lista as colunas a ler do arquivo: as repassadas à saída mais as usadas na categorização.
+    
+    Args:
+        colunas (list): Colunas repassadas à saída (None para todas)
+        coluna_descricao (str): Nome da coluna com as descrições
+        coluna_categoria (str): Nome da coluna com as categorias
+    
+    Returns:
+        list: Colunas a ler ou None para ler todas
+    """
+    if colunas is None:
+        return None
+    return list(dict.fromkeys(list(colunas) + [coluna_descricao, coluna_categoria]))
+
+@contextlib.contextmanager
+def perfil_cprofile(arquivo):
+    """
+    Executa o bloco `with` sob o cProfile e grava as estatísticas em `arquivo`.
+    
+    Args:
+        arquivo (str): Arquivo de saída das estatísticas (None não perfila)
+    """
+    if not arquivo:
+        yield
+        return
+    
+    perfilador = cProfile.Profile()
+    perfilador.enable()
+    try:
+        yield
+    finally:
+        perfilador.disable()
+        perfilador.dump_stats(arquivo)
+        print(f"Perfil do cProfile salvo em: {arquivo}", file=sys.stderr)
+
+def executar_em_blocos(args):
+    """
+    Executa a CLI no modo em blocos, incluindo o modo de fluxo com '-' (JSONL).
+    
+    Args:
+        args (Namespace): Argumentos da linha de comando
+    """
+    tamanho_bloco = args.chunksize or 100000
+    if tamanho_bloco <= 0:
+        print("O valor de --chunksize deve ser positivo.")
+        return
+    
+    # A entrada é percorrida duas vezes, então a entrada padrão é copiada para um arquivo temporário
+    arquivo_temporario = None
+    arquivo_entrada = args.arquivo_entrada
+    if arquivo_entrada == '-':
+        descritor, arquivo_temporario = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(descritor, 'wb') as f:
+            shutil.copyfileobj(sys.stdin.buffer, f)
+        arquivo_entrada = arquivo_temporario
+    
+    # Determinar o arquivo de saída
+    if args.arquivo_saida:
+        arquivo_saida = args.arquivo_saida
+    elif args.arquivo_entrada == '-':
+        arquivo_saida = '-'
+    else:
+        nome_base, ext = os.path.splitext(args.arquivo_entrada)
+        if ext.lower() in ['.xlsx', '.xls']:
+            ext = '.csv'  # Excel não permite escrita incremental
+        arquivo_saida = f"{nome_base}_categorizado{ext}"
+    
+    # Validar o formato de saída antes da primeira passada
+    try:
+        if arquivo_saida != '-' and formato_arquivo(arquivo_saida) == 'excel':
+            raise ValueError("Excel não permite escrita incremental; use CSV, JSONL, Parquet ou Feather")
+    except ValueError as e:
+        print(e)
+        return
+    
+    # Na saída padrão ficam apenas os dados; as mensagens vão para a saída de erro
+    saida_padrao = sys.stdout
+    perfil = MedidorEtapas() if args.perfil else None
+    mensagens = contextlib.redirect_stdout(sys.stderr) if arquivo_saida == '-' else contextlib.nullcontext()
+    
+    try:
+        with mensagens, perfil_cprofile(args.arquivo_perfil):
+            modelo_incremental = carregar_modelo_incremental(args.modelo_incremental) if args.modelo_incremental else None
+            total_linhas = categorizar_em_blocos(
+                arquivo_entrada,
+                saida_padrao if arquivo_saida == '-' else arquivo_saida,
+                args.coluna_descricao,
+                args.coluna_categoria,
+                args.limiar_confianca,
+                args.arquivo_categorias,
+                tamanho_bloco=tamanho_bloco,
+                diretorio_cache_modelos=None if args.sem_cache else args.cache_modelos,
+                workers=args.workers,
+                colunas=args.colunas,
+                compressao=args.compressao,
+                arquivo_cache_resultados=None if args.sem_cache else args.cache_resultados,
+                perfil=perfil,
+                indice_similaridade=args.indice_similaridade,
+                modelo_incremental=modelo_incremental,
+                atualizar_modelo=args.atualizar_modelo
+            )
+            if args.atualizar_modelo:
+                salvar_modelo_incremental(modelo_incremental, args.modelo_incremental)
+                print(f"Modelo incremental salvo em: {args.modelo_incremental} ({modelo_incremental.documentos} linhas absorvidas no total)")
+            if arquivo_saida != '-':
+                print(f"Arquivo salvo como: {arquivo_saida} ({total_linhas} linhas)")
+            if perfil is not None:
+                imprimir_resumo_perfil(perfil)
+    except (KeyError, ValueError) as e:
+        print(f"Erro ao processar em blocos: {e}", file=sys.stderr)
+    finally:
+        if arquivo_temporario is not None:
+            os.remove(arquivo_temporario)
+
 def main():
     parser = argparse.ArgumentParser(description='Categoriza produtos automaticamente.')
-    parser.add_argument('arquivo_entrada', help='Caminho para o arquivo de entrada (CSV, Excel)')
+    parser.add_argument('arquivo_entrada', help="Caminho para o arquivo de entrada (CSV, JSONL, Excel, Parquet, Feather/Arrow) ou '-' para ler JSONL da entrada padrão")
     parser.add_argument('--coluna-descricao', default='Descrição do produto', help='Nome da coluna com as descrições dos produtos')
     parser.add_argument('--coluna-categoria', default='Categoria do produto', help='Nome da coluna com as categorias dos produtos')
-    parser.add_argument('--limiar-confianca', type=float, default=0.4, help='Limiar de confiança para aceitar categorias por similaridade')
+    parser.add_argument('--limiar-confianca', type=float, help='Limiar de confiança para aceitar categorias por similaridade (padrão: 0.4 nos índices exato e aproximado, 0.15 nos centroides e no modelo incremental)')
     parser.add_argument('--arquivo-categorias', help='Caminho para o arquivo de categorias de referência')
-    parser.add_argument('--arquivo-saida', help='Caminho para o arquivo de saída (opcional)')
+    parser.add_argument('--arquivo-saida', help="Caminho para o arquivo de saída (opcional) ou '-' para escrever JSONL na saída padrão")
+    parser.add_argument('--cache-modelos', default=cache_modelos.DIRETORIO_CACHE_PADRAO, help='Diretório do cache de modelos de similaridade treinados')
+    parser.add_argument('--cache-resultados', default=cache_resultados.ARQUIVO_CACHE_PADRAO, help='Arquivo do cache de resultados da categorização por descrição')
+    parser.add_argument('--sem-cache', action='store_true', help='Não usar os caches de modelos e de resultados (sempre treinar e classificar)')
+    parser.add_argument('--workers', type=int, default=1, help='Número de processos usados na categorização')
+    parser.add_argument('--chunksize', type=int, help='Processar o arquivo em blocos com este número de linhas (memória limitada)')
+    parser.add_argument('--colunas', nargs='+', help='Colunas repassadas à saída além da descrição e da categoria (padrão: todas)')
+    parser.add_argument('--compressao', help="Compressão da saída (Parquet: zstd, snappy, gzip...; Feather: lz4, zstd; CSV: gzip, bz2...; 'none' desativa)")
+    parser.add_argument('--indice-similaridade', choices=INDICES_SIMILARIDADE, default='exato', help="Busca na similaridade: 'exato', 'aproximado' (listas invertidas, mais rápido em treinos grandes) ou 'centroides' (um centroide por categoria)")
+    parser.add_argument('--modelo-incremental', help='Arquivo do modelo incremental (hashing + centroides) usado no lugar do KNN; criado se não existir')
+    parser.add_argument('--atualizar-modelo', action='store_true', help='Absorver no modelo incremental as linhas de categoria conhecida do arquivo antes de categorizar e salvá-lo')
+    parser.add_argument('--profile', '--perfil', dest='perfil', action='store_true', help='Medir tempo, CPU, linhas e pico de memória de cada etapa e imprimir o resumo')
+    parser.add_argument('--profile-arquivo', dest='arquivo_perfil', help='Gravar também o perfil do cProfile neste arquivo (abrir com pstats ou snakeviz)')
     
     args = parser.parse_args()
     
-    # Determinar o formato do arquivo de entrada
-    extensao = os.path.splitext(args.arquivo_entrada)[1].lower()
+    if args.atualizar_modelo and not args.modelo_incremental:
+        parser.error("--atualizar-modelo requer --modelo-incremental")
     
-    # Carregar o arquivo
-    if extensao == '.csv':
-        df = pd.read_csv(args.arquivo_entrada)
-    elif extensao in ['.xlsx', '.xls']:
-        df = pd.read_excel(args.arquivo_entrada)
-    else:
-        print(f"Formato de arquivo não suportado: {extensao}")
+    if args.chunksize is not None or args.arquivo_entrada == '-' or args.arquivo_saida == '-':
+        executar_em_blocos(args)
+        return
+    
+    # Carregar o arquivo (apenas as colunas necessárias, se --colunas for informado)
+    try:
+        df = ler_arquivo(
+            args.arquivo_entrada,
+            colunas=colunas_projetadas(args.colunas, args.coluna_descricao, args.coluna_categoria),
+            colunas_texto=[args.coluna_descricao, args.coluna_categoria]
+        )
+    except ValueError as e:
+        print(e)
         return
     
     # Verificar se as colunas existem
@@ -833,14 +2607,36 @@ def main():
         print(f"Coluna de categoria '{args.coluna_categoria}' não encontrada no arquivo.")
         return
     
+    # Carregar o modelo incremental e absorver as linhas do arquivo, se pedido
+    modelo_incremental = None
+    if args.modelo_incremental:
+        try:
+            modelo_incremental = carregar_modelo_incremental(args.modelo_incremental)
+        except ValueError as e:
+            print(e)
+            return
+        if args.atualizar_modelo:
+            absorvidas = atualizar_modelo_incremental(
+                modelo_incremental, df, args.coluna_descricao, args.coluna_categoria
+            )
+            salvar_modelo_incremental(modelo_incremental, args.modelo_incremental)
+            print(f"Modelo incremental atualizado com {absorvidas} linhas e salvo em: {args.modelo_incremental}")
+    
     # Categorizar os produtos
-    df_resultado = categorizar_produtos(
-        df, 
-        args.coluna_descricao, 
-        args.coluna_categoria, 
-        args.limiar_confianca,
-        args.arquivo_categorias
-    )
+    with perfil_cprofile(args.arquivo_perfil):
+        df_resultado = categorizar_produtos(
+            df, 
+            args.coluna_descricao, 
+            args.coluna_categoria, 
+            args.limiar_confianca,
+            args.arquivo_categorias,
+            diretorio_cache_modelos=None if args.sem_cache else args.cache_modelos,
+            workers=args.workers,
+            arquivo_cache_resultados=None if args.sem_cache else args.cache_resultados,
+            perfil=True if args.perfil else None,
+            indice_similaridade=args.indice_similaridade,
+            modelo_similaridade=modelo_incremental
+        )
     
     # Determinar o arquivo de saída
     if args.arquivo_saida:
@@ -849,11 +2645,15 @@ def main():
         nome_base, ext = os.path.splitext(args.arquivo_entrada)
         arquivo_saida = f"{nome_base}_categorizado{ext}"
     
-    # Salvar o resultado
-    if arquivo_saida.endswith('.csv'):
-        df_resultado.to_csv(arquivo_saida, index=False)
-    else:
-        df_resultado.to_excel(arquivo_saida, index=False)
+    # Salvar o resultado (em Parquet/Feather as colunas de categoria são gravadas como dicionário)
+    try:
+        salvar_arquivo(
+            df_resultado, arquivo_saida, compressao=args.compressao,
+            colunas_dicionario=[args.coluna_categoria, 'categoria_corrigida', 'metodo_categorizacao']
+        )
+    except ValueError as e:
+        print(e)
+        return
     
     print(f"Arquivo salvo como: {arquivo_saida}")
 
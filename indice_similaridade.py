@@ -0,0 +1,236 @@
+import numpy as np
+from scipy import sparse
+from sklearn.neighbors import NearestNeighbors
+
+# Consultas processadas por vez (limita a matriz de pontuações dos candidatos)
+CONSULTAS_POR_BLOCO = 1000
+
+def _maiores_por_linha(matriz, limite):
+    """
+    Seleciona, em cada linha de uma matriz CSR, as `limite` entradas de maior valor.
+    
+    Args:
+        matriz (csr_matrix): Matriz esparsa com índices canônicos
+        limite (int): Número máximo de entradas mantidas por linha
+    
+    Returns:
+        tuple: Arrays (linhas, colunas, valores) das entradas mantidas, ordenadas por linha
+            e, dentro da linha, por valor decrescente
+    """
+    linhas = np.repeat(np.arange(matriz.shape[0]), np.diff(matriz.indptr))
+    ordem = np.lexsort((-matriz.data, linhas))
+    posicao_na_linha = np.arange(len(ordem)) - matriz.indptr[linhas[ordem]]
+    mantidas = ordem[posicao_na_linha < limite]
+    return linhas[mantidas], matriz.indices[mantidas], matriz.data[mantidas]
+
+class IndiceInvertido:
+    """
+    Busca aproximada dos vizinhos mais próximos (cosseno) em vetores TF-IDF esparsos.
+    
+    Cada termo guarda uma lista invertida com as `tamanho_lista` linhas de treino
+    de maior peso nesse termo. Uma consulta usa apenas os seus `termos_consulta`
+    termos de maior peso para somar as pontuações parciais das linhas dessas
+    listas, re-pontua exatamente os `candidatos` melhores e devolve os
+    `n_neighbors` mais similares. O custo de uma consulta fica limitado por
+    `termos_consulta * tamanho_lista`, sem depender do número de linhas de treino.
+    
+    A interface (`fit`, `kneighbors`, `get_params`) é a mesma do `NearestNeighbors`
+    com `metric='cosine'`, então o índice pode substituí-lo no modelo de
+    similaridade. Os vetores devem estar normalizados (norma L2), como os do
+    `TfidfVectorizer`. Quando há menos de `n_neighbors` candidatos com algum termo
+    em comum, as posições restantes são completadas com a linha 0 e distância 1
+    (similaridade zero, sem peso no voto). Vizinhos com a mesma similaridade
+    (descrições repetidas no treino) são desempatados pela menor linha.
+    """
+    
+    def __init__(self, n_neighbors=5, termos_consulta=8, tamanho_lista=500, candidatos=50):
+        """
+        Args:
+            n_neighbors (int): Número de vizinhos devolvidos por consulta
+            termos_consulta (int): Termos de maior peso de cada consulta usados na busca
+            tamanho_lista (int): Linhas de treino mantidas na lista invertida de cada termo
+            candidatos (int): Candidatos re-pontuados exatamente por consulta
+        """
+        self.n_neighbors = n_neighbors
+        self.termos_consulta = termos_consulta
+        self.tamanho_lista = tamanho_lista
+        self.candidatos = candidatos
+    
+    def get_params(self, deep=True):
+        return {
+            'n_neighbors': self.n_neighbors,
+            'termos_consulta': self.termos_consulta,
+            'tamanho_lista': self.tamanho_lista,
+            'candidatos': self.candidatos,
+            'indice': 'invertido'
+        }
+    
+    def fit(self, X):
+        """
+        Monta as listas invertidas a partir da matriz de treino.
+        
+        Args:
+            X (sparse matrix): Vetores TF-IDF de treino (linhas x termos)
+        
+        Returns:
+            IndiceInvertido: O próprio índice
+        """
+        self.matriz_ = sparse.csr_matrix(X, dtype=np.float64)
+        self.matriz_.sort_indices()
+        
+        # Listas invertidas (termos x linhas) truncadas às linhas de maior peso em cada termo
+        por_termo = self.matriz_.T.tocsr()
+        por_termo.sort_indices()
+        termos, linhas, pesos = _maiores_por_linha(por_termo, self.tamanho_lista)
+        self.listas_ = sparse.csr_matrix((pesos, (termos, linhas)), shape=por_termo.shape)
+        return self
+    
+    def kneighbors(self, X, n_neighbors=None):
+        """
+        Busca os vizinhos aproximados de cada consulta.
+        
+        Args:
+            X (sparse matrix): Vetores TF-IDF das consultas
+            n_neighbors (int): Número de vizinhos (padrão: o do construtor)
+        
+        Returns:
+            tuple: Arrays (distancias, indices) de forma (consultas, n_neighbors), em ordem
+                crescente de distância cosseno
+        """
+        k = n_neighbors or self.n_neighbors
+        X = sparse.csr_matrix(X, dtype=np.float64)
+        X.sort_indices()
+        distancias = np.ones((X.shape[0], k))
+        indices = np.zeros((X.shape[0], k), dtype=np.intp)
+        
+        for inicio in range(0, X.shape[0], CONSULTAS_POR_BLOCO):
+            bloco = X[inicio:inicio + CONSULTAS_POR_BLOCO]
+            
+            # Pontuação parcial: apenas os termos de maior peso de cada consulta
+            linhas, termos, pesos = _maiores_por_linha(bloco, self.termos_consulta)
+            consultas = sparse.csr_matrix((pesos, (linhas, termos)), shape=bloco.shape)
+            parciais = (consultas @ self.listas_).tocsr()
+            parciais.sort_indices()
+            linhas, candidatos, _ = _maiores_por_linha(parciais, max(self.candidatos, k))
+            if len(linhas) == 0:
+                continue
+            
+            # Similaridade exata de cada par (consulta, candidato)
+            similaridades = np.asarray(bloco[linhas].multiply(self.matriz_[candidatos]).sum(axis=1)).ravel()
+            ordem = np.lexsort((candidatos, -similaridades, linhas))
+            linhas_ordenadas = linhas[ordem]
+            inicio_linha = np.searchsorted(linhas_ordenadas, linhas_ordenadas, side='left')
+            posicao = np.arange(len(ordem)) - inicio_linha
+            mantidos = posicao < k
+            destino = inicio + linhas_ordenadas[mantidos]
+            distancias[destino, posicao[mantidos]] = 1 - similaridades[ordem][mantidos]
+            indices[destino, posicao[mantidos]] = candidatos[ordem][mantidos]
+        
+        return distancias, indices
+
+def recall_vizinhos(indice, X, k=5):
+    """
+    Mede o recall@k de um índice aproximado em relação à busca exata.
+    
+    A busca exata usa `NearestNeighbors` (força bruta, cosseno) sobre a mesma
+    matriz de treino. Como descrições repetidas no treino empatam, um vizinho
+    aproximado conta como acerto quando a sua similaridade é pelo menos a do
+    k-ésimo vizinho exato da consulta.
+    
+    Args:
+        indice (IndiceInvertido): Índice aproximado já treinado
+        X (sparse matrix): Vetores TF-IDF das consultas
+        k (int): Número de vizinhos avaliados
+    
+    Returns:
+        float: Fração média dos k vizinhos exatos recuperados pelo índice
+    """
+    exato = NearestNeighbors(n_neighbors=k, metric='cosine', algorithm='brute').fit(indice.matriz_)
+    distancias_exatas, _ = exato.kneighbors(X)
+    distancias_aproximadas, _ = indice.kneighbors(X, n_neighbors=k)
+    
+    # Tolerância para as diferenças de arredondamento entre as duas buscas
+    limite = distancias_exatas[:, [-1]] + 1e-9
+    acertos = (distancias_aproximadas <= limite).sum(axis=1)
+    return float(np.mean(np.minimum(acertos, k) / k))
+
+class CentroidesCategorias:
+    """
+    Modelo de similaridade com um centroide TF-IDF por categoria.
+    
+    Cada centroide é a soma dos vetores de treino da categoria, normalizada
+    (norma L2), e os centroides formam uma matriz esparsa categorias x termos.
+    Classificar um lote é um único produto esparso seguido de um argmax, e nem
+    a memória do modelo nem o tempo de consulta dependem do número de linhas de
+    treino. A confiança é a margem entre as duas maiores similaridades,
+    relativa à maior: `(s1 - s2) / s1` (1 quando só uma categoria tem termos em
+    comum com a descrição, 0 quando nenhuma tem). Essa margem costuma ser bem
+    menor que a fração de votos do KNN, então o limiar de confiança padrão
+    deste modo é mais baixo (0.15, em `categorizar_produtos.LIMIAR_CONFIANCA_PADRAO`).
+    """
+    
+    def __init__(self, n_categorias):
+        """
+        Args:
+            n_categorias (int): Número de categorias (linhas da matriz de centroides)
+        """
+        self.n_categorias = n_categorias
+    
+    def get_params(self, deep=True):
+        return {'n_categorias': self.n_categorias, 'modelo': 'centroides'}
+    
+    def fit(self, X, codigos):
+        """
+        Calcula os centroides a partir dos vetores de treino.
+        
+        Args:
+            X (sparse matrix): Vetores TF-IDF de treino
+            codigos (ndarray): Código (0 a n_categorias - 1) da categoria de cada linha
+        
+        Returns:
+            CentroidesCategorias: O próprio modelo
+        """
+        # Matriz de pertinência (categorias x linhas): a soma por categoria é um produto esparso
+        pertinencia = sparse.csr_matrix(
+            (np.ones(len(codigos)), (codigos, np.arange(len(codigos)))), shape=(self.n_categorias, X.shape[0])
+        )
+        return self.fit_somas(pertinencia @ X)
+    
+    def fit_somas(self, somas):
+        """
+        Define os centroides a partir das somas já acumuladas por categoria.
+        
+        Args:
+            somas (sparse matrix): Soma dos vetores de cada categoria (categorias x termos)
+        
+        Returns:
+            CentroidesCategorias: O próprio modelo
+        """
+        somas = sparse.csr_matrix(somas)
+        normas = np.sqrt(np.asarray(somas.multiply(somas).sum(axis=1)).ravel())
+        normas[normas == 0] = 1.0
+        self.centroides_ = (sparse.diags(1 / normas) @ somas).tocsr()
+        return self
+    
+    def categorizar(self, X):
+        """
+        Escolhe o centroide mais similar a cada vetor.
+        
+        Args:
+            X (sparse matrix): Vetores TF-IDF das consultas
+        
+        Returns:
+            tuple: Arrays (codigos, confiancas) com o código da categoria escolhida e a
+                margem relativa entre as duas maiores similaridades
+        """
+        similaridades = (X @ self.centroides_.T).toarray()
+        melhores = np.argmax(similaridades, axis=1)
+        if similaridades.shape[1] > 1:
+            duas_maiores = -np.partition(-similaridades, 1, axis=1)[:, :2]
+        else:
+            duas_maiores = np.column_stack([similaridades[:, 0], np.zeros(len(similaridades))])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            confiancas = np.where(
+                duas_maiores[:, 0] > 0, (duas_maiores[:, 0] - duas_maiores[:, 1]) / duas_maiores[:, 0], 0.0
+            )
+        return melhores, confiancas
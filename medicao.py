@@ -0,0 +1,119 @@
+import contextlib
+import time
+import tracemalloc
+
+import pandas as pd
+
+MEGABYTE = 1024 * 1024
+
+COLUNAS_TABELA = ['etapa', 'tempo_s', 'cpu_s', 'linhas_entrada', 'linhas_saida', 'pico_mb', 'retido_mb']
+
+def memoria_dataframe_mb(df):
+    """
+    Returns:
+        float: Memória ocupada pelo DataFrame em MB, incluindo o conteúdo dos textos
+    """
+    return df.memory_usage(deep=True).sum() / MEGABYTE
+
+class MedidorEtapas:
+    """
+    Mede o tempo, o uso de CPU e o pico de memória alocada em cada etapa do processamento.
+    
+    A medição de memória usa `tracemalloc`, que também contabiliza os buffers
+    do NumPy (e, portanto, as colunas do pandas). O pico informado é relativo à
+    memória já alocada no início da etapa, ou seja, mostra quanto a etapa
+    precisou a mais. As etapas não devem ser aninhadas, pois cada uma reinicia
+    o pico. Como o `tracemalloc` deixa as alocações mais lentas, medições de
+    tempo (benchmarks) devem usar `memoria=False`.
+    
+    O tempo de CPU é o do processo atual (`time.process_time`), então não inclui
+    o trabalho feito em processos filhos.
+    """
+    
+    def __init__(self, ativo=True, memoria=True):
+        """
+        Args:
+            ativo (bool): Se False, as etapas não são medidas (sem custo adicional)
+            memoria (bool): Se False, mede apenas o tempo de cada etapa
+        """
+        self.ativo = ativo
+        self.memoria = memoria
+        self.etapas = []
+    
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas_entrada=None):
+        """
+        Mede o bloco `with` como uma etapa.
+        
+        O bloco recebe o registro da etapa (um dict) e pode preencher
+        `registro['linhas_saida']` com o número de linhas produzidas.
+        
+        Args:
+            nome (str): Nome da etapa exibido no relatório
+            linhas_entrada (int): Número de linhas recebidas pela etapa (opcional)
+        """
+        if not self.ativo:
+            yield {}
+            return
+        
+        iniciou = self.memoria and not tracemalloc.is_tracing()
+        if iniciou:
+            tracemalloc.start()
+        if self.memoria:
+            inicio, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        registro = {'etapa': nome, 'linhas_entrada': linhas_entrada}
+        relogio = time.perf_counter()
+        cpu = time.process_time()
+        
+        try:
+            yield registro
+        finally:
+            registro['tempo_s'] = time.perf_counter() - relogio
+            registro['cpu_s'] = time.process_time() - cpu
+            if self.memoria:
+                atual, pico = tracemalloc.get_traced_memory()
+                if iniciou:
+                    tracemalloc.stop()
+                registro['pico_mb'] = (pico - inicio) / MEGABYTE
+                registro['retido_mb'] = (atual - inicio) / MEGABYTE
+            self.etapas.append(registro)
+    
+    def tabela(self):
+        """
+        Returns:
+            DataFrame: Uma linha por etapa com o tempo e a CPU (s), as linhas de entrada e
+            saída, o pico e a memória retida ao final (MB)
+        """
+        return pd.DataFrame(self.etapas, columns=COLUNAS_TABELA)
+    
+    def resumo(self):
+        """
+        Agrupa as etapas de mesmo nome (ex.: a mesma etapa em vários blocos).
+        
+        Tempos, CPU, linhas e memória retida são somados; o pico é o maior observado.
+        
+        Returns:
+            DataFrame: Uma linha por nome de etapa, na ordem da primeira ocorrência, mais o total
+        """
+        tabela = self.tabela()
+        if tabela.empty:
+            return tabela
+        
+        resumo = tabela.groupby('etapa', sort=False).agg(
+            execucoes=('etapa', 'size'),
+            tempo_s=('tempo_s', 'sum'),
+            cpu_s=('cpu_s', 'sum'),
+            linhas_entrada=('linhas_entrada', lambda valores: valores.sum(min_count=1)),
+            linhas_saida=('linhas_saida', lambda valores: valores.sum(min_count=1)),
+            pico_mb=('pico_mb', 'max'),
+            retido_mb=('retido_mb', lambda valores: valores.sum(min_count=1))
+        )
+        resumo.loc['total'] = [
+            resumo['execucoes'].sum(), resumo['tempo_s'].sum(), resumo['cpu_s'].sum(),
+            None, None, resumo['pico_mb'].max(), resumo['retido_mb'].sum(min_count=1)
+        ]
+        resumo['execucoes'] = resumo['execucoes'].astype(int)
+        for coluna in ['linhas_entrada', 'linhas_saida']:
+            resumo[coluna] = resumo[coluna].astype('Int64')
+        return resumo.reset_index()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+import cache_modelos
+from indice_similaridade import CentroidesCategorias
+
+# Incrementar sempre que o formato do objeto salvo mudar
+VERSAO_FORMATO = 1
+
+# Colunas do espaço de hashing: fixo, limita a memória do modelo independentemente do vocabulário
+N_ATRIBUTOS_PADRAO = 2 ** 18
+
+class VetorizadorHashing:
+    """
+    Vetorizador sem vocabulário: hashing dos termos ponderado pelo IDF do modelo incremental.
+    
+    Expõe o mesmo `transform` do `TfidfVectorizer` usado pela similaridade.
+    """
+    
+    def __init__(self, hashing, idf):
+        """
+        Args:
+            hashing (HashingVectorizer): Vetorizador de hashing do modelo
+            idf (ndarray): Peso IDF de cada coluna do espaço de hashing
+        """
+        self.hashing = hashing
+        self.idf = idf
+    
+    def transform(self, textos):
+        """
+        Returns:
+            csr_matrix: Vetores TF-IDF (norma L2) das descrições
+        """
+        return normalize(self.hashing.transform(textos) @ sparse.diags(self.idf), norm='l2')
+
+class ModeloIncremental:
+    """
+    Modelo de categorização atualizado a cada nova exportação, sem retreinar o histórico.
+    
+    As descrições passam por um `HashingVectorizer` (sem vocabulário, com número
+    fixo de colunas) e o modelo acumula, por categoria, a soma dos vetores de
+    treino, além da frequência de documentos de cada coluna para o IDF. Como
+    `partial_fit` apenas soma os novos lotes, absorver as exportações mês a mês
+    dá o mesmo modelo que treinar com todas juntas, e categorias novas são
+    acrescentadas quando aparecem. A memória fica limitada por categorias x
+    `n_atributos`, sem depender do número de linhas já absorvidas. Um mesmo
+    arquivo absorvido duas vezes conta em dobro.
+    
+    `modelo_similaridade` devolve a tupla (vectorizer, modelo, categorias) aceita
+    por `categorizar_produtos`, com um modelo de centroides (`CentroidesCategorias`)
+    que traz em `chave_modelo_` a impressão do estado atual (`impressao`), usada
+    pelo cache de resultados para não reaproveitar categorias de um estado anterior.
+    """
+    
+    def __init__(self, n_atributos=N_ATRIBUTOS_PADRAO, ngram_range=(1, 2)):
+        """
+        Args:
+            n_atributos (int): Número de colunas do espaço de hashing
+            ngram_range (tuple): Tamanhos dos n-gramas de palavras
+        """
+        self.versao_formato = VERSAO_FORMATO
+        self.hashing = HashingVectorizer(
+            n_features=n_atributos, ngram_range=ngram_range, alternate_sign=False, norm='l2'
+        )
+        self.categorias = []
+        self.somas = sparse.csr_matrix((0, n_atributos))
+        self.frequencia_documentos = np.zeros(n_atributos, dtype=np.int64)
+        self.documentos = 0
+    
+    def partial_fit(self, textos, categorias):
+        """
+        Absorve um lote de descrições com categoria conhecida.
+        
+        Args:
+            textos (list): Descrições preprocessadas
+            categorias: Categoria de cada descrição
+        
+        Returns:
+            ModeloIncremental: O próprio modelo
+        """
+        if len(textos) == 0:
+            return self
+        
+        X = self.hashing.transform(textos)
+        categorias = pd.Series(np.asarray(categorias, dtype=object), dtype=object)
+        
+        # Categorias vistas pela primeira vez ganham uma linha vazia de somas
+        novas = pd.unique(categorias[~categorias.isin(self.categorias)])
+        if len(novas) > 0:
+            self.categorias.extend(novas.tolist())
+            self.somas = sparse.vstack([self.somas, sparse.csr_matrix((len(novas), X.shape[1]))]).tocsr()
+        
+        codigos = pd.Index(self.categorias, dtype=object).get_indexer(categorias)
+        pertinencia = sparse.csr_matrix(
+            (np.ones(len(codigos)), (codigos, np.arange(len(codigos)))), shape=(len(self.categorias), X.shape[0])
+        )
+        self.somas = (self.somas + pertinencia @ X).tocsr()
+        self.frequencia_documentos += np.bincount(X.indices, minlength=X.shape[1])
+        self.documentos += X.shape[0]
+        return self
+    
+    def idf(self):
+        """
+        Returns:
+            ndarray: Peso IDF suavizado de cada coluna (mesma fórmula do `TfidfVectorizer`)
+        """
+        return np.log((1 + self.documentos) / (1 + self.frequencia_documentos)) + 1
+    
+    def impressao(self):
+        """
+        Calcula o hash do estado do modelo (parâmetros, categorias e somas acumuladas).
+        
+        Returns:
+            str: Impressão hexadecimal, igual para modelos com o mesmo estado
+        """
+        somas = self.somas.copy()
+        somas.sum_duplicates()
+        somas.sort_indices()
+        parametros = {
+            'versao_formato': self.versao_formato,
+            'n_atributos': self.hashing.n_features,
+            'ngram_range': list(self.hashing.ngram_range),
+            'documentos': int(self.documentos)
+        }
+        
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps(parametros, sort_keys=True).encode('utf-8'))
+        h.update(json.dumps([str(categoria) for categoria in self.categorias], ensure_ascii=False).encode('utf-8'))
+        for array in (somas.indptr, somas.indices, somas.data, self.frequencia_documentos):
+            h.update(np.ascontiguousarray(array).tobytes())
+        return h.hexdigest()
+    
+    def modelo_similaridade(self):
+        """
+        Monta o modelo de similaridade com o estado atual.
+        
+        Returns:
+            tuple: (vectorizer, modelo, categorias_conhecidas), ou (None, None, None) se
+                nenhuma descrição tiver sido absorvida
+        """
+        if not self.categorias:
+            return None, None, None
+        
+        idf = self.idf()
+        modelo = CentroidesCategorias(len(self.categorias)).fit_somas(self.somas @ sparse.diags(idf))
+        modelo.chave_modelo_ = self.impressao()
+        return VetorizadorHashing(self.hashing, idf), modelo, np.array(self.categorias, dtype=object)
+
+def carregar_modelo_incremental(caminho):
+    """
+    Carrega um modelo incremental salvo, ou cria um vazio se o arquivo não existir.
+    
+    Args:
+        caminho (str): Arquivo do modelo
+    
+    Returns:
+        ModeloIncremental: Modelo carregado ou novo
+    """
+    if not os.path.exists(caminho):
+        return ModeloIncremental()
+    
+    with open(caminho, 'rb') as f:
+        modelo = pickle.load(f)
+    if not isinstance(modelo, ModeloIncremental) or getattr(modelo, 'versao_formato', None) != VERSAO_FORMATO:
+        raise ValueError(f"Arquivo de modelo incremental inválido ou de outra versão: {caminho}")
+    return modelo
+
+def salvar_modelo_incremental(modelo, caminho):
+    """
+    Grava o modelo incremental de forma atômica.
+    
+    Args:
+        modelo (ModeloIncremental): Modelo a salvar
+        caminho (str): Arquivo do modelo
+    """
+    if os.path.dirname(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    cache_modelos.escrever_atomico(caminho, pickle.dumps(modelo, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import benchmark_categorizacao
+
+COLUNA_DESCRICAO = 'Descrição do produto'
+COLUNA_CATEGORIA = 'Categoria do produto'
+
+@pytest.fixture(scope='session')
+def vendas_sinteticas():
+    """Vendas sintéticas pequenas e determinísticas do gerador do benchmark."""
+    return benchmark_categorizacao.gerar_dados(3000, semente=3)
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+import categorizar_produtos
+from armazenamento import ArmazemVendas, chaves_linhas
+
+COLUNAS_APP = {
+    'Número': 'numero_pedido',
+    'Data da venda': 'data_venda',
+    'Quantidade de produtos': 'quantidade',
+    'Valor total da venda': 'valor_total',
+    'Categoria do produto': 'categoria',
+    'Descrição do produto': 'descricao'
+}
+
+def _vendas():
+    return pd.DataFrame({
+        'numero_pedido': [1, 1, 1, 2],
+        'data_venda': pd.to_datetime(['2024-01-05', '2024-01-05', '2024-01-05', '2024-01-06']),
+        'quantidade': [1, 1, 1, 2],
+        'valor_total': [10.0, 10.0, 25.5, 40.0],
+        'categoria': ['Maquiagem', 'Maquiagem', 'Cabelos', 'Corpo'],
+        'descricao': ['batom matte', 'batom matte', 'shampoo', 'creme corporal']
+    })
+
+def test_chaves_estaveis_entre_formatos():
+    df = _vendas()
+    planilha = df.assign(numero_pedido=df['numero_pedido'].astype(float), quantidade=df['quantidade'].astype(float))
+    assert np.array_equal(chaves_linhas(df), chaves_linhas(planilha))
+
+def test_itens_identicos_tem_chaves_distintas():
+    chaves = chaves_linhas(_vendas())
+    assert len(set(chaves.tolist())) == 4
+
+def test_acrescentar_e_idempotente(tmp_path):
+    df = _vendas()
+    chaves = chaves_linhas(df)
+    with ArmazemVendas(str(tmp_path / 'vendas.sqlite')) as armazem:
+        assert armazem.versao() == 0
+        assert armazem.acrescentar(df, chaves, arquivo='a.csv') == 4
+        versao = armazem.versao()
+        assert not armazem.linhas_novas(chaves).any()
+        assert armazem.acrescentar(df, chaves, arquivo='a.csv') == 0
+        assert armazem.versao() == versao
+        carregado = armazem.carregar()
+        assert carregado['descricao'].tolist() == df['descricao'].tolist()
+        assert carregado['data_venda'].equals(df['data_venda'])
+        assert armazem.cargas()['linhas_novas'].tolist() == [4, 0]
+
+def test_carregar_colunas(tmp_path):
+    df = _vendas()
+    with ArmazemVendas(str(tmp_path / 'vendas.sqlite')) as armazem:
+        armazem.acrescentar(df, chaves_linhas(df))
+        parcial = armazem.carregar(colunas=['categoria', 'descricao'])
+    assert list(parcial.columns) == ['categoria', 'descricao']
+    assert parcial['categoria'].tolist() == df['categoria'].tolist()
+
+def test_poucas_linhas_sem_modelo():
+    df = pd.DataFrame({'descricao': ['batom matte vermelho', 'produto sem nome'], 'categoria': ['Maquiagem', 'Outros']})
+    resultado = categorizar_produtos.categorizar_produtos(df, 'descricao', 'categoria')
+    assert resultado['categoria_corrigida'].iloc[0] == 'Maquiagem'
+    assert resultado['metodo_categorizacao'].iloc[1] != 'similaridade'
+
+def test_carga_pequena_usa_modelo_da_base(tmp_path, vendas_sinteticas):
+    # Mesmo fluxo de `ingest_file` no app: base já carregada e um arquivo com poucas linhas novas
+    historico = vendas_sinteticas.rename(columns=COLUNAS_APP)
+    conhecidas = categorizar_produtos.mascara_categorias_conhecidas(historico['categoria']).values
+    historico = historico[conhecidas].reset_index(drop=True)
+    delta = historico.head(2).assign(categoria='Outros', numero_pedido=-1)
+    
+    with ArmazemVendas(str(tmp_path / 'vendas.sqlite')) as armazem:
+        armazem.acrescentar(historico, chaves_linhas(historico))
+        assert armazem.linhas_novas(chaves_linhas(delta)).all()
+        treino = pd.concat(
+            [armazem.carregar(colunas=['descricao', 'categoria']), delta[['descricao', 'categoria']]],
+            ignore_index=True
+        )
+    
+    modelo = categorizar_produtos.treinar_modelo_similaridade(treino, 'descricao', 'categoria')
+    assert modelo[0] is not None
+    resultado = categorizar_produtos.categorizar_produtos(
+        delta, 'descricao', 'categoria', modelo_similaridade=modelo
+    )
+    assert len(resultado) == 2
+    assert (resultado['categoria_corrigida'] != 'Outros').any()
@@ -0,0 +1,31 @@
+import pytest
+
+import benchmark_categorizacao
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO
+
+def test_gerar_dados_deterministico():
+    dados = benchmark_categorizacao.gerar_dados(2000, semente=1)
+    assert dados.equals(benchmark_categorizacao.gerar_dados(2000, semente=1))
+    assert not dados.equals(benchmark_categorizacao.gerar_dados(2000, semente=2))
+    
+    assert len(dados) == 2000
+    sem_categoria = dados[COLUNA_CATEGORIA].isna() | (dados[COLUNA_CATEGORIA].astype(str).str.strip() == '')
+    assert sem_categoria.mean() == pytest.approx(0.15, abs=0.03)
+    assert dados[COLUNA_DESCRICAO].nunique() <= 2000 * (1 - 0.7)
+
+def test_executar_benchmark_mede_as_etapas():
+    resultado = benchmark_categorizacao.executar_benchmark(800, semente=1, repeticoes=2, usar_taxonomia=False)
+    assert resultado['linhas'] == 800
+    assert resultado['tempo_total_s'] > 0
+    assert {'preprocessamento', 'treino', 'regras', 'similaridade'} <= set(resultado['etapas'])
+    assert sum(resultado['metodos'].values()) <= 800
+
+def test_comparar_resultados():
+    anterior = {'resultados': [{'linhas': 10, 'etapas': {'regras': 2.0, 'treino': 1.0}, 'tempo_total_s': 3.0}]}
+    atual = {'resultados': [
+        {'linhas': 10, 'etapas': {'regras': 1.0, 'treino': 1.0}, 'tempo_total_s': 2.0},
+        {'linhas': 20, 'etapas': {'regras': 5.0}, 'tempo_total_s': 5.0}
+    ]}
+    comparacao = benchmark_categorizacao.comparar_resultados(anterior, atual)
+    assert comparacao.index.tolist() == [(10, 'regras'), (10, 'treino'), (10, 'total')]
+    assert comparacao['razao'].tolist() == [0.5, 1.0, pytest.approx(2 / 3)]
@@ -0,0 +1,53 @@
+import os
+
+import cache_modelos
+import categorizar_produtos
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO
+
+def test_chave_depende_do_conteudo_e_da_ordem():
+    chave = cache_modelos.calcular_chave_modelo(['batom', 'shampoo'], ['Maquiagem', 'Cabelos'], {'k': 5})
+    assert chave == cache_modelos.calcular_chave_modelo(['batom', 'shampoo'], ['Maquiagem', 'Cabelos'], {'k': 5})
+    assert chave != cache_modelos.calcular_chave_modelo(['shampoo', 'batom'], ['Cabelos', 'Maquiagem'], {'k': 5})
+    assert chave != cache_modelos.calcular_chave_modelo(['batom', 'shampoo'], ['Maquiagem', 'Corpo'], {'k': 5})
+    assert chave != cache_modelos.calcular_chave_modelo(['batom', 'shampoo'], ['Maquiagem', 'Cabelos'], {'k': 3})
+    # O separador impede que textos diferentes concatenem no mesmo conteúdo
+    assert cache_modelos.calcular_chave_modelo(['a b', 'c'], ['X', 'Y'], {}) != \
+        cache_modelos.calcular_chave_modelo(['a', 'b c'], ['X', 'Y'], {})
+
+def test_salvar_e_carregar(tmp_path):
+    diretorio = str(tmp_path / 'modelos')
+    assert cache_modelos.carregar_modelo(diretorio, 'ausente') is None
+    cache_modelos.salvar_modelo(diretorio, 'chave', {'modelo': [1, 2, 3]})
+    assert cache_modelos.carregar_modelo(diretorio, 'chave') == {'modelo': [1, 2, 3]}
+    assert [nome for nome in os.listdir(diretorio) if nome.endswith('.tmp')] == []
+
+def test_arquivo_corrompido_e_descartado(tmp_path):
+    caminho = tmp_path / f'chave{cache_modelos.EXTENSAO}'
+    caminho.write_bytes(b'nao e pickle')
+    assert cache_modelos.carregar_modelo(str(tmp_path), 'chave') is None
+    assert not caminho.exists()
+
+def test_limite_remove_os_menos_usados(tmp_path):
+    diretorio = str(tmp_path)
+    for numero, chave in enumerate(['antigo', 'sem_uso', 'novo']):
+        cache_modelos.salvar_modelo(diretorio, chave, b'x' * 1000)
+        os.utime(os.path.join(diretorio, chave + cache_modelos.EXTENSAO), (numero, numero))
+    
+    # Carregar marca o modelo como usado recentemente
+    cache_modelos.carregar_modelo(diretorio, 'antigo')
+    assert cache_modelos.limpar_cache(diretorio, tamanho_maximo=2500, preservar='novo') == 1
+    restantes = sorted(nome[:-len(cache_modelos.EXTENSAO)] for nome in os.listdir(diretorio))
+    assert restantes == ['antigo', 'novo']
+
+def test_modelo_treinado_vem_do_cache(tmp_path, vendas_sinteticas):
+    diretorio = str(tmp_path)
+    treinado = categorizar_produtos.treinar_modelo_similaridade(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, diretorio_cache=diretorio
+    )
+    do_cache = categorizar_produtos.treinar_modelo_similaridade(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, diretorio_cache=diretorio
+    )
+    assert len(os.listdir(diretorio)) == 1
+    assert do_cache[1].chave_modelo_ == treinado[1].chave_modelo_
+    assert list(do_cache[2]) == list(treinado[2])
+    assert do_cache[0].vocabulary_ == treinado[0].vocabulary_
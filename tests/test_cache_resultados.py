@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+import cache_resultados
+import categorizar_produtos
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO
+
+def _categorizar(df, **parametros):
+    return categorizar_produtos.categorizar_produtos(df, COLUNA_DESCRICAO, COLUNA_CATEGORIA, **parametros)
+
+def _resultado(df):
+    return df[['categoria_corrigida', 'metodo_categorizacao', 'confianca_categorizacao']].fillna('-')
+
+def test_contexto_depende_do_modelo():
+    regras = {'Cabelo': ['shampoo']}
+    base = cache_resultados.calcular_contexto(regras, None, 0.4)
+    assert cache_resultados.calcular_contexto(regras, None, 0.4) == base
+    assert cache_resultados.calcular_contexto(regras, None, 0.4, 'exato', 'a') != base
+    assert cache_resultados.calcular_contexto(regras, None, 0.4, 'exato', 'a') != \
+        cache_resultados.calcular_contexto(regras, None, 0.4, 'centroides', 'a')
+    assert cache_resultados.calcular_contexto(regras, None, 0.4, 'exato', 'a') != \
+        cache_resultados.calcular_contexto(regras, None, 0.4, 'exato', 'b')
+
+def test_gravar_e_consultar(tmp_path):
+    chaves = cache_resultados.calcular_chaves(b'ctx', ['batom matte', 'shampoo'], ['', 'Outros'])
+    with cache_resultados.CacheResultados(str(tmp_path / 'cache.sqlite')) as cache:
+        cache.gravar(chaves, ['Maquiagem', None], ['similaridade', None], [0.8, 0.0])
+        encontrados, categorias, metodos, confiancas = cache.consultar(chaves)
+    assert encontrados.tolist() == [True, False]
+    assert categorias[0] == 'Maquiagem' and metodos[0] == 'similaridade' and confiancas[0] == 0.8
+
+def test_limite_descarta_menos_usados(tmp_path):
+    chaves = cache_resultados.calcular_chaves(b'ctx', ['a', 'b', 'c'], ['', '', ''])
+    with cache_resultados.CacheResultados(str(tmp_path / 'cache.sqlite'), maximo_entradas=2) as cache:
+        for chave in chaves:
+            cache.gravar([chave], ['Corpo'], ['regras'], [0.0])
+        encontrados, _, _, _ = cache.consultar(chaves)
+    assert encontrados.tolist() == [False, True, True]
+
+@pytest.mark.parametrize('indice', ['exato', 'aproximado', 'centroides'])
+def test_cache_nao_reaproveita_outro_modo(tmp_path, vendas_sinteticas, indice):
+    arquivo_cache = str(tmp_path / 'resultados.sqlite')
+    
+    # Primeira execução grava os resultados de outro modo de similaridade
+    outro = 'centroides' if indice != 'centroides' else 'exato'
+    _categorizar(vendas_sinteticas, arquivo_cache_resultados=arquivo_cache, indice_similaridade=outro)
+    
+    com_cache = _categorizar(vendas_sinteticas, arquivo_cache_resultados=arquivo_cache, indice_similaridade=indice)
+    sem_cache = _categorizar(vendas_sinteticas, indice_similaridade=indice)
+    pd.testing.assert_frame_equal(_resultado(com_cache), _resultado(sem_cache))
+    
+    # Execução seguinte, já com o cache preenchido pelo mesmo modo
+    de_novo = _categorizar(vendas_sinteticas, arquivo_cache_resultados=arquivo_cache, indice_similaridade=indice)
+    pd.testing.assert_frame_equal(_resultado(de_novo), _resultado(sem_cache))
+
+def test_cache_nao_reaproveita_modelo_retreinado(tmp_path, vendas_sinteticas):
+    arquivo_cache = str(tmp_path / 'resultados.sqlite')
+    metade = vendas_sinteticas.iloc[:1500]
+    modelo_metade = categorizar_produtos.treinar_modelo_similaridade(metade, COLUNA_DESCRICAO, COLUNA_CATEGORIA)
+    
+    _categorizar(vendas_sinteticas, arquivo_cache_resultados=arquivo_cache, modelo_similaridade=modelo_metade)
+    com_cache = _categorizar(vendas_sinteticas, arquivo_cache_resultados=arquivo_cache)
+    sem_cache = _categorizar(vendas_sinteticas)
+    pd.testing.assert_frame_equal(_resultado(com_cache), _resultado(sem_cache))
+
+def test_impressao_do_modelo(vendas_sinteticas):
+    modelo = categorizar_produtos.treinar_modelo_similaridade(vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA)
+    outro = categorizar_produtos.treinar_modelo_similaridade(
+        vendas_sinteticas.iloc[:1500], COLUNA_DESCRICAO, COLUNA_CATEGORIA
+    )
+    assert categorizar_produtos.impressao_modelo(*modelo) == categorizar_produtos.impressao_modelo(
+        *categorizar_produtos.treinar_modelo_similaridade(vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA)
+    )
+    assert categorizar_produtos.impressao_modelo(*modelo) != categorizar_produtos.impressao_modelo(*outro)
+    assert categorizar_produtos.impressao_modelo(None, None, None) is None
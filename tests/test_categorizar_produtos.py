@@ -0,0 +1,223 @@
+import gzip
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import categorizar_produtos
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO, RAIZ
+
+# Resultado da versão original (linha a linha) de `categorizar_produtos` para entradas com
+# descrições nulas, em branco, maiúsculas e acentuadas e categorias vazias, nulas, "nan" e "Outros"
+ARQUIVO_REFERENCIA = os.path.join(os.path.dirname(__file__), 'dados', 'categorizacao_referencia.json.gz')
+ARQUIVO_CATEGORIAS = os.path.join(RAIZ, 'categorias-produtos.md')
+
+def _categorizar(df, **parametros):
+    return categorizar_produtos.categorizar_produtos(df, COLUNA_DESCRICAO, COLUNA_CATEGORIA, **parametros)
+
+def _resultado(df):
+    return df[['categoria_corrigida', 'metodo_categorizacao', 'confianca_categorizacao']].fillna('-')
+
+@pytest.mark.parametrize('indice', categorizar_produtos.INDICES_SIMILARIDADE)
+def test_limiar_padrao_por_modo(vendas_sinteticas, indice):
+    padrao = categorizar_produtos.LIMIAR_CONFIANCA_PADRAO[indice]
+    resultado = _categorizar(vendas_sinteticas, indice_similaridade=indice)
+    pd.testing.assert_frame_equal(
+        _resultado(resultado), _resultado(_categorizar(vendas_sinteticas, indice_similaridade=indice, limiar_confianca=padrao))
+    )
+    aceitas = resultado['metodo_categorizacao'] == 'similaridade'
+    assert (resultado.loc[aceitas, 'confianca_categorizacao'] >= padrao).all()
+
+def test_limiar_dos_centroides_e_menor():
+    padroes = categorizar_produtos.LIMIAR_CONFIANCA_PADRAO
+    assert padroes['centroides'] < padroes['exato'] == padroes['aproximado']
+
+def test_resolver_limiar_confianca():
+    centroides = categorizar_produtos.CentroidesCategorias(2)
+    assert categorizar_produtos.resolver_limiar_confianca(None, centroides) == 0.15
+    assert categorizar_produtos.resolver_limiar_confianca(None, None) == 0.4
+    assert categorizar_produtos.resolver_limiar_confianca(0.25, centroides) == 0.25
+
+@pytest.fixture(scope='module')
+def referencia():
+    with gzip.open(ARQUIVO_REFERENCIA, 'rt', encoding='utf-8') as f:
+        dados = json.load(f)
+    dados['df'] = pd.DataFrame(dados['linhas'], columns=[COLUNA_DESCRICAO, COLUNA_CATEGORIA])
+    return dados
+
+def _comparar_com_referencia(resultado, esperado):
+    assert list(resultado.columns) == esperado['colunas']
+    for coluna, valores in esperado['valores'].items():
+        obtidos = resultado[coluna].astype(object).where(resultado[coluna].notna(), None).tolist()
+        if coluna == 'confianca_categorizacao':
+            np.testing.assert_allclose(
+                np.array(obtidos, dtype=float), np.array(valores, dtype=float), rtol=1e-9, atol=1e-12
+            )
+        else:
+            assert obtidos == valores, coluna
+
+@pytest.mark.parametrize('cenario', ['sem_taxonomia', 'com_taxonomia'])
+@pytest.mark.parametrize('parametros', [{}, {'workers': 2}, {'indice_similaridade': 'exato', 'limiar_confianca': 0.4}])
+def test_equivale_a_versao_original(referencia, cenario, parametros):
+    arquivo = ARQUIVO_CATEGORIAS if cenario == 'com_taxonomia' else None
+    resultado = categorizar_produtos.categorizar_produtos(
+        referencia['df'], COLUNA_DESCRICAO, COLUNA_CATEGORIA, arquivo_categorias=arquivo, **parametros
+    )
+    _comparar_com_referencia(resultado, referencia['resultados'][cenario])
+
+@pytest.mark.parametrize('cenario', ['sem_taxonomia', 'com_taxonomia'])
+def test_equivale_a_versao_original_com_caches(referencia, cenario, tmp_path):
+    arquivo = ARQUIVO_CATEGORIAS if cenario == 'com_taxonomia' else None
+    for _ in range(2):
+        resultado = categorizar_produtos.categorizar_produtos(
+            referencia['df'], COLUNA_DESCRICAO, COLUNA_CATEGORIA, arquivo_categorias=arquivo,
+            diretorio_cache_modelos=str(tmp_path / 'modelos'), arquivo_cache_resultados=str(tmp_path / 'resultados.sqlite')
+        )
+        _comparar_com_referencia(resultado, referencia['resultados'][cenario])
+
+def _descricoes_variadas(referencia):
+    extras = [
+        'BB Cream FPS 30', 'bb creamy', 'Eau de Parfum 100ml', 'shampoo', 'shampoos', 'Batom batom matte',
+        'Máscara de Cílios à prova d\'água', 'perfume e shampoo', '', '   ', None, np.nan, 123
+    ]
+    return pd.Series(referencia['df'][COLUNA_DESCRICAO].tolist() + extras, dtype=object)
+
+def test_motor_regras_equivale_as_regras_linha_a_linha(referencia):
+    regras = categorizar_produtos.criar_regras_categorias()
+    descricoes = _descricoes_variadas(referencia)
+    esperado = [categorizar_produtos.categorizar_por_regras(descricao, regras) for descricao in descricoes]
+    
+    motor = categorizar_produtos.MotorRegras(regras)
+    assert motor.categorizar(descricoes).tolist() == esperado
+    prep = categorizar_produtos.preprocessar_serie(descricoes)
+    assert motor.categorizar(descricoes, prep).tolist() == esperado
+    assert categorizar_produtos.categorizar_por_regras_em_lote(descricoes, regras).tolist() == esperado
+
+def test_motor_regras_desempata_pela_ordem_das_regras():
+    regras = {'Primeira': ['creme'], 'Segunda': ['creme'], 'Composta': ['creme facial', 'facial']}
+    motor = categorizar_produtos.MotorRegras(regras)
+    descricoes = pd.Series(['creme', 'creme facial', 'cremes', 'loção'], index=[5, 6, 7, 8])
+    resultado = motor.categorizar(descricoes)
+    assert resultado.index.tolist() == [5, 6, 7, 8]
+    assert resultado.tolist() == [categorizar_produtos.categorizar_por_regras(d, regras) for d in descricoes]
+    assert resultado.tolist() == ['Primeira', 'Composta', 'Primeira', None]
+
+# Sem nenhum termo em comum, a versão linha a linha divide 0 por 0 (confiança NaN)
+@pytest.mark.filterwarnings('ignore:invalid value encountered:RuntimeWarning')
+def test_similaridade_em_lote_equivale_a_linha_a_linha(referencia, vendas_sinteticas):
+    vectorizer, modelo, categorias = categorizar_produtos.treinar_modelo_similaridade(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA
+    )
+    descricoes = _descricoes_variadas(referencia)
+    esperado = [
+        categorizar_produtos.categorizar_por_similaridade(descricao, vectorizer, modelo, categorias)
+        for descricao in descricoes
+    ]
+    
+    # Blocos pequenos para exercitar a divisão das consultas
+    obtidas, confiancas = categorizar_produtos.categorizar_por_similaridade_em_lote(
+        descricoes, vectorizer, modelo, categorias, tamanho_bloco=97
+    )
+    assert obtidas.index.equals(descricoes.index)
+    assert obtidas.tolist() == [categoria for categoria, _ in esperado]
+    np.testing.assert_allclose(confiancas.to_numpy(dtype=float), [confianca for _, confianca in esperado], rtol=1e-9)
+
+def test_preprocessar_serie_equivale_a_linha_a_linha(referencia):
+    descricoes = _descricoes_variadas(referencia)
+    descricoes = pd.concat([descricoes, pd.Series(['Ação™ ½ ﬁo – Crème brûlée', 'ＡＢＣ  def\tghi\n', 'ß œ'])])
+    descricoes.index = range(100, 100 + len(descricoes))
+    resultado = categorizar_produtos.preprocessar_serie(descricoes)
+    assert resultado.index.equals(descricoes.index)
+    assert resultado.tolist() == [categorizar_produtos.preprocessar_texto(descricao) for descricao in descricoes]
+
+def _mapear_linha_a_linha(categoria, mapeamento):
+    # Versão original: mapeamento exato e, com "outros", varredura de todo o mapeamento
+    categoria_atual = str(categoria).lower()
+    if categoria_atual in mapeamento:
+        return mapeamento[categoria_atual]
+    if "outros" in categoria_atual:
+        melhor_correspondencia, max_similaridade = None, 0
+        for origem, destino in mapeamento.items():
+            similaridade = categorizar_produtos.calcular_similaridade(categoria_atual, origem)
+            if similaridade > max_similaridade:
+                melhor_correspondencia, max_similaridade = destino, similaridade
+        if melhor_correspondencia and max_similaridade > 0.7:
+            return melhor_correspondencia
+    return None
+
+def _categorias_com_outros(mapeamento):
+    origens = list(mapeamento)
+    categorias = [None, np.nan, '', 'Outros', 'OUTROS', 'nan', 'outros outros', 'Sem relação com nada']
+    categorias += [origem.upper() for origem in origens[::7]]
+    categorias += [origem + ' > Outros' for origem in origens[::5]]
+    categorias += ['Outros > ' + ' '.join(origem.split()[:2]) for origem in origens[::3]]
+    categorias += [origem.replace('outros', 'Outros').rstrip(' >') for origem in origens if 'outros' in origem][:50]
+    return pd.Series(categorias, dtype=object)
+
+def test_indice_mapeamento_equivale_a_busca_completa():
+    mapeamento = categorizar_produtos.carregar_taxonomia(ARQUIVO_CATEGORIAS).mapeamento
+    indice = categorizar_produtos.IndiceMapeamento(mapeamento)
+    for categoria in _categorias_com_outros(mapeamento).dropna().str.lower():
+        melhor, similaridade = None, 0
+        for origem, destino in mapeamento.items():
+            atual = categorizar_produtos.calcular_similaridade(categoria, origem)
+            if atual > similaridade:
+                melhor, similaridade = destino, atual
+        assert indice.melhor_correspondencia(categoria) == (melhor, similaridade), categoria
+
+def test_resolver_mapeamento_equivale_a_linha_a_linha():
+    mapeamento = categorizar_produtos.carregar_taxonomia(ARQUIVO_CATEGORIAS).mapeamento
+    categorias = _categorias_com_outros(mapeamento)
+    categorias.index = categorias.index * 3
+    resultado = categorizar_produtos.resolver_mapeamento_categorias(categorias, mapeamento)
+    assert resultado.index.equals(categorias.index)
+    assert resultado.tolist() == [_mapear_linha_a_linha(categoria, mapeamento) for categoria in categorias]
+    assert resultado.notna().sum() > len(categorias) // 2
+
+def _ultimo_recurso_linha_a_linha(categorias_iniciais, posicoes_pendentes, novas_categorias, mascara_ultimo_recurso,
+                                  categoria_padrao):
+    # Versão linha a linha: a coluna inteira é contada a cada linha que chega ao último recurso
+    coluna = pd.Series(categorias_iniciais.copy(), dtype=object)
+    resultado = novas_categorias.copy()
+    usou_mais_comum = np.zeros(len(resultado), dtype=bool)
+    for indice, posicao in enumerate(posicoes_pendentes):
+        if mascara_ultimo_recurso[indice]:
+            mais_comum = categorizar_produtos.obter_categoria_mais_comum(coluna)
+            usou_mais_comum[indice] = mais_comum is not None
+            resultado[indice] = mais_comum if mais_comum is not None else categoria_padrao
+        coluna.iloc[posicao] = resultado[indice]
+    return resultado, usou_mais_comum
+
+@pytest.mark.parametrize('semente', range(20))
+def test_resolver_ultimo_recurso_equivale_a_linha_a_linha(semente):
+    rng = np.random.default_rng(semente)
+    opcoes = np.array(['Maquiagem', 'Cabelos', 'Skincare', 'Outros', 'outros', None], dtype=object)
+    linhas = int(rng.integers(1, 60))
+    categorias_iniciais = rng.choice(opcoes, linhas, p=[0.15, 0.15, 0.1, 0.3, 0.1, 0.2])
+    posicoes_pendentes = np.sort(rng.choice(linhas, int(rng.integers(1, linhas + 1)), replace=False))
+    novas_categorias = rng.choice(opcoes[:3], len(posicoes_pendentes)).astype(object)
+    mascara_ultimo_recurso = rng.random(len(posicoes_pendentes)) < 0.5
+    novas_categorias[mascara_ultimo_recurso] = None
+    categoria_padrao = 'Outros' if semente % 2 else 'Padrão'
+    
+    esperado, usou_esperado = _ultimo_recurso_linha_a_linha(
+        categorias_iniciais, posicoes_pendentes, novas_categorias, mascara_ultimo_recurso, categoria_padrao
+    )
+    usou = categorizar_produtos.resolver_ultimo_recurso(
+        categorias_iniciais, posicoes_pendentes, novas_categorias, mascara_ultimo_recurso, categoria_padrao
+    )
+    assert novas_categorias.tolist() == esperado.tolist()
+    assert usou.tolist() == usou_esperado.tolist()
+
+def test_workers_nao_mudam_o_resultado(referencia, vendas_sinteticas, monkeypatch, capsys):
+    # Fatias pequenas para que os processos sejam de fato usados com poucos pares
+    monkeypatch.setattr(categorizar_produtos, 'MINIMO_PARES_POR_PROCESSO', 50)
+    for df in (vendas_sinteticas, referencia['df']):
+        sequencial = _categorizar(df)
+        capsys.readouterr()
+        paralelo = _categorizar(df, workers=3)
+        assert 'em 3 processos' in capsys.readouterr().out
+        pd.testing.assert_frame_equal(_resultado(paralelo), _resultado(sequencial))
+    _comparar_com_referencia(paralelo, referencia['resultados']['sem_taxonomia'])
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import categorizar_produtos
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO, RAIZ
+
+SCRIPT = os.path.join(RAIZ, 'categorizar_produtos.py')
+
+def _resultado(df):
+    resultado = df[categorizar_produtos.COLUNAS_RESULTADO].copy()
+    resultado['confianca_categorizacao'] = resultado['confianca_categorizacao'].astype(float).round(9)
+    return resultado.astype(object).where(resultado.notna(), None).reset_index(drop=True)
+
+def _em_blocos(arquivo_entrada, arquivo_saida, tamanho_bloco, **parametros):
+    categorizar_produtos.categorizar_em_blocos(
+        str(arquivo_entrada), str(arquivo_saida), COLUNA_DESCRICAO, COLUNA_CATEGORIA,
+        tamanho_bloco=tamanho_bloco, **parametros
+    )
+    return categorizar_produtos.ler_arquivo(str(arquivo_saida))
+
+@pytest.fixture
+def arquivo_vendas(tmp_path, vendas_sinteticas):
+    caminho = tmp_path / 'vendas.csv'
+    vendas_sinteticas.to_csv(caminho, index=False)
+    return caminho
+
+def test_resultado_nao_depende_do_tamanho_do_bloco(tmp_path, arquivo_vendas, vendas_sinteticas):
+    inteiro = _em_blocos(arquivo_vendas, tmp_path / 'inteiro.csv', len(vendas_sinteticas))
+    em_blocos = _em_blocos(arquivo_vendas, tmp_path / 'blocos.csv', 700)
+    assert len(em_blocos) == len(vendas_sinteticas)
+    pd.testing.assert_frame_equal(_resultado(em_blocos), _resultado(inteiro))
+    
+    # Um bloco só equivale à categorização em memória com a categoria mais comum do arquivo
+    entrada = pd.read_csv(arquivo_vendas, dtype={COLUNA_DESCRICAO: object, COLUNA_CATEGORIA: object})
+    contagem = entrada[COLUNA_CATEGORIA].value_counts(sort=False)
+    em_memoria = categorizar_produtos.categorizar_produtos(
+        entrada, COLUNA_DESCRICAO, COLUNA_CATEGORIA, categoria_mais_comum=contagem.idxmax()
+    )
+    pd.testing.assert_frame_equal(_resultado(inteiro), _resultado(em_memoria))
+
+def test_jsonl_pela_entrada_e_saida_padrao(tmp_path, vendas_sinteticas):
+    entrada = vendas_sinteticas.head(500)
+    linhas = entrada.to_json(orient='records', lines=True, force_ascii=False, date_format='iso')
+    processo = subprocess.run(
+        [sys.executable, SCRIPT, '-', '--sem-cache', '--chunksize', '200'],
+        input=linhas, capture_output=True, text=True, encoding='utf-8', cwd=str(tmp_path), check=True
+    )
+    
+    # Na saída padrão só há dados; as mensagens vão para a saída de erro
+    registros = [json.loads(linha) for linha in processo.stdout.splitlines()]
+    assert len(registros) == len(entrada)
+    assert [registro[COLUNA_DESCRICAO] for registro in registros] == entrada[COLUNA_DESCRICAO].tolist()
+    assert all(set(categorizar_produtos.COLUNAS_RESULTADO) <= set(registro) for registro in registros)
+    assert 'Categorizando bloco' in processo.stderr
+
+@pytest.mark.parametrize('extensao', ['.csv.gz', '.jsonl', '.parquet', '.feather'])
+def test_formatos_de_entrada_e_saida(tmp_path, arquivo_vendas, vendas_sinteticas, extensao):
+    esperado = _em_blocos(arquivo_vendas, tmp_path / 'esperado.csv', 700)
+    
+    entrada = tmp_path / f'vendas{extensao}'
+    categorizar_produtos.salvar_arquivo(vendas_sinteticas, str(entrada))
+    relido = categorizar_produtos.ler_arquivo(str(entrada), colunas=[COLUNA_DESCRICAO, COLUNA_CATEGORIA])
+    assert list(relido.columns) == [COLUNA_DESCRICAO, COLUNA_CATEGORIA]
+    assert len(relido) == len(vendas_sinteticas)
+    
+    saida = tmp_path / f'saida{extensao}'
+    obtido = _em_blocos(entrada, saida, 700, colunas=[COLUNA_DESCRICAO, COLUNA_CATEGORIA])
+    assert list(obtido.columns) == [COLUNA_DESCRICAO, COLUNA_CATEGORIA] + categorizar_produtos.COLUNAS_RESULTADO
+    pd.testing.assert_frame_equal(_resultado(obtido), _resultado(esperado))
+
+def test_formato_nao_suportado():
+    with pytest.raises(ValueError):
+        categorizar_produtos.formato_arquivo('vendas.txt')
+    with pytest.raises(ValueError):
+        categorizar_produtos.formato_arquivo('vendas.parquet.gz')
+
+@pytest.mark.parametrize('argumentos', [[], ['--chunksize', '700']], ids=['inteiro', 'em_blocos'])
+def test_perfil_pela_linha_de_comando(tmp_path, arquivo_vendas, argumentos):
+    comando = [sys.executable, SCRIPT, str(arquivo_vendas), '--sem-cache'] + argumentos
+    subprocess.run(comando + ['--arquivo-saida', 'sem_perfil.csv'], capture_output=True, cwd=str(tmp_path), check=True)
+    processo = subprocess.run(
+        comando + ['--arquivo-saida', 'com_perfil.csv', '--profile', '--profile-arquivo', 'perfil.prof'],
+        capture_output=True, text=True, encoding='utf-8', cwd=str(tmp_path), check=True
+    )
+    
+    saida = processo.stdout + processo.stderr
+    assert 'Perfil por etapa:' in saida
+    for etapa in ['preprocessamento', 'treino', 'regras', 'similaridade', 'total']:
+        assert etapa in saida
+    assert (tmp_path / 'perfil.prof').stat().st_size > 0
+    
+    # Medir as etapas não altera o resultado
+    sem_perfil = categorizar_produtos.ler_arquivo(str(tmp_path / 'sem_perfil.csv'))
+    com_perfil = categorizar_produtos.ler_arquivo(str(tmp_path / 'com_perfil.csv'))
+    pd.testing.assert_frame_equal(_resultado(com_perfil), _resultado(sem_perfil))
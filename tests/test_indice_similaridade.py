@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.neighbors import NearestNeighbors
+
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO
+from indice_similaridade import CentroidesCategorias, IndiceInvertido, recall_vizinhos
+
+def _vetores(descricoes):
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2)).fit(descricoes)
+    return vectorizer, vectorizer.transform(descricoes)
+
+def test_indice_invertido_exato_quando_cobre_todo_o_treino(vendas_sinteticas):
+    descricoes = vendas_sinteticas[COLUNA_DESCRICAO].dropna().str.lower().head(400).tolist()
+    _, X = _vetores(descricoes)
+    
+    # Listas, termos e candidatos sem truncamento: a busca é exata
+    indice = IndiceInvertido(n_neighbors=5, termos_consulta=X.shape[1], tamanho_lista=X.shape[0],
+                             candidatos=X.shape[0]).fit(X)
+    distancias, indices = indice.kneighbors(X)
+    exatas, _ = NearestNeighbors(n_neighbors=5, metric='cosine', algorithm='brute').fit(X).kneighbors(X)
+    np.testing.assert_allclose(distancias, exatas, atol=1e-9)
+    
+    # Empates (descrições repetidas) ficam com a menor linha
+    similaridades = (X @ X.T).toarray()
+    for consulta in range(X.shape[0]):
+        ordem = np.lexsort((np.arange(X.shape[0]), -np.round(similaridades[consulta], 9)))
+        assert indices[consulta].tolist() == ordem[:5].tolist()
+    
+    assert recall_vizinhos(indice, X) == 1.0
+
+def test_posicoes_sem_candidatos_sao_completadas():
+    X = sparse.csr_matrix(np.array([[1.0, 0, 0], [0, 1.0, 0], [0, 0, 1.0]]))
+    indice = IndiceInvertido(n_neighbors=3).fit(X)
+    distancias, indices = indice.kneighbors(sparse.csr_matrix(np.array([[0, 1.0, 0], [0, 0, 0]])))
+    assert indices.tolist() == [[1, 0, 0], [0, 0, 0]]
+    np.testing.assert_allclose(distancias, [[0, 1, 1], [1, 1, 1]])
+
+def test_recall_do_indice_aproximado(vendas_sinteticas):
+    descricoes = vendas_sinteticas[COLUNA_DESCRICAO].dropna().str.lower().tolist()
+    vectorizer, X = _vetores(descricoes[:2500])
+    indice = IndiceInvertido(n_neighbors=5).fit(X)
+    consultas = vectorizer.transform(descricoes[2500:])
+    
+    assert indice.kneighbors(consultas)[1].shape == (consultas.shape[0], 5)
+    assert recall_vizinhos(indice, consultas) > 0.9
+
+def test_centroides_equivalem_as_somas_normalizadas(vendas_sinteticas):
+    dados = vendas_sinteticas.dropna(subset=[COLUNA_DESCRICAO, COLUNA_CATEGORIA])
+    _, X = _vetores(dados[COLUNA_DESCRICAO].str.lower().tolist())
+    codigos, categorias = pd.factorize(dados[COLUNA_CATEGORIA])
+    modelo = CentroidesCategorias(len(categorias)).fit(X, codigos)
+    
+    densa = X.toarray()
+    for codigo in range(len(categorias)):
+        soma = densa[codigos == codigo].sum(axis=0)
+        np.testing.assert_allclose(modelo.centroides_[codigo].toarray().ravel(), soma / np.linalg.norm(soma))
+    
+    escolhidos, confiancas = modelo.categorizar(X)
+    similaridades = densa @ modelo.centroides_.toarray().T
+    assert escolhidos.tolist() == similaridades.argmax(axis=1).tolist()
+    duas_maiores = -np.sort(-similaridades, axis=1)[:, :2]
+    np.testing.assert_allclose(confiancas, (duas_maiores[:, 0] - duas_maiores[:, 1]) / duas_maiores[:, 0])
+
+def test_margem_dos_centroides_nos_extremos():
+    X = sparse.csr_matrix(np.array([[1.0, 0, 0], [0, 1.0, 0], [0, 0, 1.0]]))
+    modelo = CentroidesCategorias(3).fit(X[:2], np.array([0, 1]))
+    escolhidos, confiancas = modelo.categorizar(X)
+    assert escolhidos[:2].tolist() == [0, 1]
+    assert confiancas.tolist() == [1.0, 1.0, 0.0]
+    
+    # Uma categoria só: a margem é relativa a zero
+    unica = CentroidesCategorias(1).fit(X[:1], np.array([0]))
+    assert unica.categorizar(X)[1].tolist() == [1.0, 0.0, 0.0]
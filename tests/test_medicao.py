@@ -0,0 +1,72 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from medicao import COLUNAS_TABELA, MEGABYTE, MedidorEtapas, memoria_dataframe_mb
+
+def test_etapa_registra_tempo_linhas_e_memoria():
+    medidor = MedidorEtapas()
+    with medidor.etapa('Alocação', linhas_entrada=10) as registro:
+        dados = np.ones(4 * MEGABYTE // 8)
+        registro['linhas_saida'] = 5
+    
+    assert len(medidor.etapas) == 1
+    etapa = medidor.etapas[0]
+    assert etapa['etapa'] == 'Alocação'
+    assert etapa['linhas_entrada'] == 10
+    assert etapa['linhas_saida'] == 5
+    assert etapa['tempo_s'] >= 0 and etapa['cpu_s'] >= 0
+    assert etapa['pico_mb'] >= 3.9
+    assert etapa['retido_mb'] >= 3.9
+    assert not tracemalloc.is_tracing()
+    del dados
+
+def test_etapa_sem_memoria_e_inativa():
+    medidor = MedidorEtapas(memoria=False)
+    with medidor.etapa('Tempo'):
+        pass
+    assert 'pico_mb' not in medidor.etapas[0]
+    assert medidor.etapas[0]['tempo_s'] >= 0
+    
+    inativo = MedidorEtapas(ativo=False)
+    with inativo.etapa('Ignorada') as registro:
+        registro['linhas_saida'] = 1
+    assert inativo.etapas == []
+    assert inativo.tabela().empty
+    assert inativo.resumo().empty
+
+def test_etapa_registrada_mesmo_com_excecao():
+    medidor = MedidorEtapas(memoria=False)
+    try:
+        with medidor.etapa('Falha'):
+            raise RuntimeError('erro')
+    except RuntimeError:
+        pass
+    assert [etapa['etapa'] for etapa in medidor.etapas] == ['Falha']
+
+def test_tabela_e_resumo():
+    medidor = MedidorEtapas()
+    for bloco in range(3):
+        with medidor.etapa('Leitura', linhas_entrada=100) as registro:
+            registro['linhas_saida'] = 90
+        with medidor.etapa('Escrita', linhas_entrada=90):
+            pass
+    
+    tabela = medidor.tabela()
+    assert tabela.columns.tolist() == COLUNAS_TABELA
+    assert len(tabela) == 6
+    
+    resumo = medidor.resumo()
+    assert resumo['etapa'].tolist() == ['Leitura', 'Escrita', 'total']
+    assert resumo['execucoes'].tolist() == [3, 3, 6]
+    assert resumo.loc[0, 'linhas_entrada'] == 300
+    assert resumo.loc[0, 'linhas_saida'] == 270
+    assert pd.isna(resumo.loc[1, 'linhas_saida'])
+    assert resumo.loc[2, 'tempo_s'] == tabela['tempo_s'].sum()
+    assert resumo.loc[2, 'pico_mb'] == tabela['pico_mb'].max()
+
+def test_memoria_dataframe_inclui_textos():
+    df = pd.DataFrame({'numero': np.arange(1000, dtype=np.int64), 'texto': ['x' * 100] * 1000})
+    assert memoria_dataframe_mb(df[['numero']]) < memoria_dataframe_mb(df)
+    assert memoria_dataframe_mb(df) > 1000 * 100 / MEGABYTE
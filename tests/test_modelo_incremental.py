@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import categorizar_produtos
+from conftest import COLUNA_CATEGORIA, COLUNA_DESCRICAO
+from modelo_incremental import ModeloIncremental, carregar_modelo_incremental, salvar_modelo_incremental
+
+def _absorver(modelo, df):
+    return categorizar_produtos.atualizar_modelo_incremental(modelo, df, COLUNA_DESCRICAO, COLUNA_CATEGORIA)
+
+def _resultado(df):
+    return df[['categoria_corrigida', 'metodo_categorizacao', 'confianca_categorizacao']].fillna('-')
+
+def test_blocos_equivalem_ao_treino_completo(vendas_sinteticas):
+    completo = ModeloIncremental(n_atributos=2 ** 12)
+    _absorver(completo, vendas_sinteticas)
+    
+    em_blocos = ModeloIncremental(n_atributos=2 ** 12)
+    for inicio in range(0, len(vendas_sinteticas), 700):
+        _absorver(em_blocos, vendas_sinteticas.iloc[inicio:inicio + 700])
+    
+    assert em_blocos.documentos == completo.documentos
+    np.testing.assert_array_equal(em_blocos.frequencia_documentos, completo.frequencia_documentos)
+    ordem = pd.Index(em_blocos.categorias).get_indexer(completo.categorias)
+    assert sorted(em_blocos.categorias) == sorted(completo.categorias)
+    np.testing.assert_allclose(em_blocos.somas[ordem].toarray(), completo.somas.toarray())
+
+def test_modelo_vazio():
+    modelo = ModeloIncremental(n_atributos=2 ** 10)
+    assert modelo.modelo_similaridade() == (None, None, None)
+    assert modelo.partial_fit([], []) is modelo
+
+def test_categorias_novas_sao_acrescentadas():
+    modelo = ModeloIncremental(n_atributos=2 ** 10)
+    modelo.partial_fit(['batom matte', 'shampoo liso'], ['Maquiagem', 'Cabelos'])
+    modelo.partial_fit(['perfume floral'], ['Perfumaria'])
+    vectorizer, centroides, categorias = modelo.modelo_similaridade()
+    assert categorias.tolist() == ['Maquiagem', 'Cabelos', 'Perfumaria']
+    codigos, confiancas = centroides.categorizar(vectorizer.transform(['perfume floral intenso']))
+    assert categorias[codigos[0]] == 'Perfumaria' and confiancas[0] > 0
+
+def test_impressao_acompanha_o_estado():
+    modelo = ModeloIncremental(n_atributos=2 ** 10)
+    modelo.partial_fit(['batom matte', 'shampoo liso'], ['Maquiagem', 'Cabelos'])
+    antes = modelo.impressao()
+    assert modelo.modelo_similaridade()[1].chave_modelo_ == antes
+    
+    copia = ModeloIncremental(n_atributos=2 ** 10)
+    copia.partial_fit(['batom matte', 'shampoo liso'], ['Maquiagem', 'Cabelos'])
+    assert copia.impressao() == antes
+    
+    modelo.partial_fit(['batom cremoso'], ['Maquiagem'])
+    assert modelo.impressao() != antes
+    assert categorizar_produtos.impressao_modelo(*modelo.modelo_similaridade()) == modelo.impressao()
+
+def test_salvar_e_carregar(tmp_path):
+    caminho = str(tmp_path / 'modelos' / 'incremental.pkl')
+    assert carregar_modelo_incremental(caminho).documentos == 0
+    
+    modelo = ModeloIncremental(n_atributos=2 ** 10)
+    modelo.partial_fit(['batom matte', 'shampoo liso'], ['Maquiagem', 'Cabelos'])
+    salvar_modelo_incremental(modelo, caminho)
+    carregado = carregar_modelo_incremental(caminho)
+    assert carregado.impressao() == modelo.impressao()
+    assert carregado.categorias == modelo.categorias
+
+def test_arquivo_invalido(tmp_path):
+    caminho = tmp_path / 'incremental.pkl'
+    salvar_modelo_incremental(ModeloIncremental(n_atributos=2 ** 10), str(caminho))
+    modelo = carregar_modelo_incremental(str(caminho))
+    modelo.versao_formato = -1
+    salvar_modelo_incremental(modelo, str(caminho))
+    with pytest.raises(ValueError):
+        carregar_modelo_incremental(str(caminho))
+
+def test_limiar_padrao_dos_centroides(vendas_sinteticas):
+    modelo = ModeloIncremental(n_atributos=2 ** 12)
+    _absorver(modelo, vendas_sinteticas)
+    resultado = categorizar_produtos.categorizar_produtos(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, modelo_similaridade=modelo
+    )
+    explicito = categorizar_produtos.categorizar_produtos(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, modelo_similaridade=modelo,
+        limiar_confianca=categorizar_produtos.LIMIAR_CONFIANCA_PADRAO['centroides']
+    )
+    pd.testing.assert_frame_equal(_resultado(resultado), _resultado(explicito))
+
+def test_cache_nao_reaproveita_modelo_atualizado(tmp_path, vendas_sinteticas):
+    # Mesmo fluxo de --modelo-incremental --atualizar-modelo com o cache de resultados
+    arquivo_cache = str(tmp_path / 'resultados.sqlite')
+    metade = len(vendas_sinteticas) // 2
+    modelo = ModeloIncremental(n_atributos=2 ** 12)
+    _absorver(modelo, vendas_sinteticas.iloc[:metade])
+    categorizar_produtos.categorizar_produtos(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, modelo_similaridade=modelo,
+        arquivo_cache_resultados=arquivo_cache
+    )
+    
+    _absorver(modelo, vendas_sinteticas.iloc[metade:])
+    com_cache = categorizar_produtos.categorizar_produtos(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, modelo_similaridade=modelo,
+        arquivo_cache_resultados=arquivo_cache
+    )
+    sem_cache = categorizar_produtos.categorizar_produtos(
+        vendas_sinteticas, COLUNA_DESCRICAO, COLUNA_CATEGORIA, modelo_similaridade=modelo
+    )
+    pd.testing.assert_frame_equal(_resultado(com_cache), _resultado(sem_cache))
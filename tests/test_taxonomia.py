@@ -0,0 +1,69 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import categorizar_produtos
+from conftest import RAIZ
+
+ARQUIVO_CATEGORIAS = os.path.join(RAIZ, 'categorias-produtos.md')
+
+@pytest.fixture
+def arquivo_categorias(tmp_path, monkeypatch):
+    caminho = tmp_path / 'categorias-produtos.md'
+    shutil.copyfile(ARQUIVO_CATEGORIAS, caminho)
+    monkeypatch.setattr(categorizar_produtos, '_taxonomias_carregadas', {})
+    return caminho
+
+def _recarregar(caminho):
+    categorizar_produtos._taxonomias_carregadas.clear()
+    return categorizar_produtos.carregar_taxonomia(str(caminho))
+
+def test_artefato_equivale_ao_arquivo(arquivo_categorias, capsys):
+    compilada = _recarregar(arquivo_categorias)
+    artefato = f"{arquivo_categorias}.compilado.json"
+    assert os.path.exists(artefato)
+    
+    referencia = categorizar_produtos.carregar_categorias_referencia(str(arquivo_categorias))
+    assert compilada.mapeamento == referencia['mapeamento']
+    assert compilada.categorias == referencia['categorias']
+    
+    capsys.readouterr()
+    do_artefato = _recarregar(arquivo_categorias)
+    assert 'artefato compilado' in capsys.readouterr().out
+    assert do_artefato.para_dict() == compilada.para_dict()
+    assert categorizar_produtos.carregar_taxonomia(str(arquivo_categorias)) is do_artefato
+
+def test_arquivo_tocado_sem_mudanca_nao_recompila(arquivo_categorias, monkeypatch):
+    _recarregar(arquivo_categorias)
+    info = os.stat(arquivo_categorias)
+    os.utime(arquivo_categorias, ns=(info.st_atime_ns, info.st_mtime_ns + 10 ** 9))
+    
+    def falhar(caminho):
+        raise AssertionError("o arquivo não deveria ser interpretado de novo")
+    monkeypatch.setattr(categorizar_produtos, 'carregar_categorias_referencia', falhar)
+    _recarregar(arquivo_categorias)
+    
+    with open(f"{arquivo_categorias}.compilado.json", encoding='utf-8') as f:
+        assert json.load(f)['mtime_ns'] == os.stat(arquivo_categorias).st_mtime_ns
+
+def test_arquivo_alterado_recompila(arquivo_categorias):
+    antes = _recarregar(arquivo_categorias)
+    with open(arquivo_categorias, 'a', encoding='utf-8') as f:
+        f.write("\nCategoria Nova > Subcategoria Nova > Outros\n")
+    depois = _recarregar(arquivo_categorias)
+    assert depois.caminhos != antes.caminhos
+    assert any('categoria nova' in origem for origem in depois.mapeamento)
+
+def test_melhor_categoria_por_palavras():
+    taxonomia = categorizar_produtos.carregar_taxonomia(ARQUIVO_CATEGORIAS)
+    descricoes = ['kit maquiagem olhos sombra', 'shampoo cabelos cacheados', 'perfume feminino', 'xyz', '']
+    for descricao in descricoes:
+        # Busca completa: palavras do nome contidas na descrição, primeira categoria de maior pontuação
+        melhor, pontuacao = None, 0
+        for categoria in taxonomia.categorias:
+            atual = sum(1 for palavra in taxonomia.palavras_categorias[categoria] if palavra in descricao)
+            if atual > pontuacao:
+                melhor, pontuacao = categoria, atual
+        assert taxonomia.melhor_categoria_por_palavras(descricao) == (melhor, pontuacao)
@@ -0,0 +1,241 @@
+import gc
+import weakref
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+from medicao import memoria_dataframe_mb
+
+def _datas(valores):
+    return utils.parse_sales_dates(pd.Series(valores, dtype=object))
+
+def test_datas_com_e_sem_hora():
+    datas = _datas(['05/01/2023', '06/01/2023 10:00', '07/01/2023'])
+    assert datas.tolist() == [
+        pd.Timestamp('2023-01-05'), pd.Timestamp('2023-01-06 10:00'), pd.Timestamp('2023-01-07')
+    ]
+
+def test_datas_iso_e_com_barras():
+    datas = _datas(['2023-01-05', '05/01/2023'])
+    assert datas.tolist() == [pd.Timestamp('2023-01-05')] * 2
+
+def test_valores_fora_da_amostra_sao_relidos():
+    # A inferência só examina os primeiros 1000 valores distintos
+    valores = pd.date_range('2020-01-01', periods=1000).strftime('%d/%m/%Y').tolist() + ['2023-01-06']
+    assert utils.infer_date_format(np.array(valores, dtype=object)) == '%d/%m/%Y'
+    datas = utils.parse_sales_dates(pd.Series(valores, dtype=object))
+    assert datas.iloc[0] == pd.Timestamp('2020-01-01')
+    assert datas.iloc[-1] == pd.Timestamp('2023-01-06')
+
+def test_formato_inferido_mes_dia():
+    datas = _datas(['01/13/2023', '02/01/2023'])
+    assert datas.tolist() == [pd.Timestamp('2023-01-13'), pd.Timestamp('2023-02-01')]
+
+def test_formato_explicito_nao_relido():
+    datas = utils.parse_sales_dates(pd.Series(['05/01/2023', '2023-01-06']), formato='%d/%m/%Y')
+    assert datas.iloc[0] == pd.Timestamp('2023-01-05') and pd.isna(datas.iloc[1])
+
+def test_datas_invalidas_viram_nat_e_sao_contadas():
+    serie = pd.Series(['05/01/2023', 'sem data', None, '  ', '31/02/2023'], index=[10, 11, 12, 13, 14])
+    datas = utils.parse_sales_dates(serie)
+    assert datas.index.equals(serie.index)
+    assert datas.iloc[0] == pd.Timestamp('2023-01-05')
+    assert datas.iloc[1:].isna().all()
+    assert utils.count_invalid_dates(serie, datas) == 2
+
+def test_coluna_ja_convertida():
+    serie = pd.Series(pd.date_range('2023-01-01', periods=3))
+    assert utils.parse_sales_dates(serie) is serie
+    assert utils.count_invalid_dates(serie, serie) == 0
+
+def _vendas_processadas(linhas=2000, semente=1):
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'numero_pedido': rng.integers(0, linhas // 3, linhas),
+        'data_venda': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 400, linhas), 'D'),
+        'quantidade': rng.integers(1, 10, linhas),
+        'valor_total': rng.uniform(5, 500, linhas),
+        'categoria': rng.choice(['Maquiagem', 'Cabelos', 'Skincare', 'Perfumaria'], linhas)
+    })
+
+def test_insights_em_cache_sao_copias():
+    df = _vendas_processadas()
+    primeiros = utils.generate_insights(df, chave_dados='teste-copias')
+    primeiros[0]['titulo'] = 'alterado'
+    primeiros[0]['grafico'].update_layout(title='alterado')
+    
+    segundos = utils.generate_insights(df, chave_dados='teste-copias')
+    assert segundos[0] is not primeiros[0]
+    assert segundos[0]['titulo'] != 'alterado'
+    assert segundos[0]['grafico'] is not primeiros[0]['grafico']
+    assert segundos[0]['grafico'].layout.title.text != 'alterado'
+
+def test_insights_em_cache_nao_guardam_os_dados():
+    df = _vendas_processadas()
+    referencia = weakref.ref(df)
+    insights = utils.generate_insights(df, chave_dados='teste-referencias')
+    assert all('grafico' in insight for insight in insights)
+    del df, insights
+    gc.collect()
+    assert referencia() is None
+
+def test_retas_com_somatorios():
+    df = _vendas_processadas()
+    somas = utils.trendline_sums(df, 'quantidade', 'valor_total', 'categoria')
+    assert somas['n'].sum() == len(df)
+    
+    figuras = []
+    for parametros in ({'df': df}, {'df': None, 'somas': somas}):
+        figura = utils.go.Figure()
+        utils.add_trendlines(figura, x='quantidade', y='valor_total', cor='categoria', **parametros)
+        figuras.append(figura.to_json())
+    assert figuras[0] == figuras[1]
+
+def test_cubo_equivale_as_agregacoes_diretas():
+    df = _vendas_processadas(linhas=3000, semente=2)
+    df.loc[df.index[::97], 'data_venda'] = pd.NaT
+    df['numero_pedido'] = df['numero_pedido'].astype(float)
+    df.loc[df.index[::89], 'numero_pedido'] = np.nan
+    cubo = utils.build_sales_cube(df)
+    
+    com_data = df[df['data_venda'].notna()]
+    chaves = {
+        'Diário': com_data['data_venda'].dt.date,
+        'Semanal': com_data['data_venda'].dt.isocalendar()['year'].astype(str) + '-'
+                   + com_data['data_venda'].dt.isocalendar()['week'].astype(str),
+        'Mensal': com_data['data_venda'].dt.strftime('%Y-%m')
+    }
+    for periodo, chave in chaves.items():
+        esperado = com_data.groupby(chave.values).agg(
+            valor_total=('valor_total', 'sum'), quantidade=('quantidade', 'sum'), numero_pedido=('numero_pedido', 'nunique')
+        )
+        serie = cubo['series'][periodo].set_index(cubo['series'][periodo].columns[0])
+        assert serie.index.tolist() == esperado.index.tolist(), periodo
+        np.testing.assert_allclose(serie['valor_total'], esperado['valor_total'])
+        assert serie['quantidade'].tolist() == esperado['quantidade'].tolist()
+        assert serie['numero_pedido'].tolist() == esperado['numero_pedido'].tolist()
+    
+    # Totais por categoria incluem as vendas sem data
+    categorias = df.groupby('categoria').agg(
+        valor_total=('valor_total', 'sum'), quantidade=('quantidade', 'sum'), numero_pedido=('numero_pedido', 'nunique')
+    )
+    assert cubo['categorias'].index.tolist() == categorias.index.tolist()
+    np.testing.assert_allclose(cubo['categorias']['valor_total'], categorias['valor_total'])
+    assert cubo['categorias']['numero_pedido'].tolist() == categorias['numero_pedido'].tolist()
+    
+    categoria_mes = com_data.groupby(['categoria', chaves['Mensal']])['valor_total'].sum()
+    np.testing.assert_allclose(cubo['categoria_mes']['valor_total'], categoria_mes)
+    
+    assert cubo['totais']['numero_pedido'] == df['numero_pedido'].nunique()
+    assert cubo['totais']['valor_total'] == pytest.approx(df['valor_total'].sum())
+    dia_semana = com_data.groupby(com_data['data_venda'].dt.dayofweek)['valor_total'].sum()
+    np.testing.assert_allclose(cubo['dia_semana'].to_numpy(), dia_semana.to_numpy())
+
+def test_metricas_e_recomendacao_pelo_cubo():
+    df = _vendas_processadas(linhas=3000, semente=3)
+    cubo = utils.build_sales_cube(df)
+    
+    metricas = utils.category_metrics(cubo, 'Cabelos')
+    cabelos = df[df['categoria'] == 'Cabelos']
+    assert metricas['valor_total'] == pytest.approx(cabelos['valor_total'].sum())
+    assert metricas['numero_pedido'] == cabelos['numero_pedido'].nunique()
+    assert metricas['percentual_vendas'] == pytest.approx(100 * cabelos['valor_total'].sum() / df['valor_total'].sum())
+    assert utils.category_metrics(cubo, 'Inexistente')['valor_total'] == 0
+    
+    mensal = df.groupby(['categoria', df['data_venda'].dt.strftime('%Y-%m')])['valor_total'].sum().unstack().fillna(0)
+    variacao = mensal.iloc[:, -1] / mensal.iloc[:, -2] - 1
+    categoria, percentual = utils.growth_recommendation(cubo)
+    assert categoria == variacao.idxmax()
+    assert percentual == pytest.approx(variacao.max() * 100)
+    
+    agrupadas, secundarias = utils.group_small_categories(cubo, limite_percentual=30)
+    assert agrupadas['valor_total'].sum() == pytest.approx(df['valor_total'].sum())
+    assert set(secundarias) | set(agrupadas['categoria']) - {'Outros'} == set(df['categoria'])
+
+def test_lttb_mantem_extremos_e_picos():
+    rng = np.random.default_rng(5)
+    x = np.arange(10000, dtype=float)
+    y = rng.normal(size=len(x))
+    y[4321] = 50
+    y[7777] = -50
+    
+    indices = utils.lttb_indices(x, y, 200)
+    assert len(indices) == 200
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert (np.diff(indices) > 0).all()
+    assert {4321, 7777} <= set(indices.tolist())
+    
+    assert utils.lttb_indices(x[:50], y[:50], 200).tolist() == list(range(50))
+
+def test_reducao_de_serie_com_datas_e_semanas():
+    dias = pd.date_range('2020-01-01', periods=3000, freq='D')
+    serie = pd.DataFrame({'data_venda': dias.date, 'valor_total': np.sin(np.arange(3000) / 30)})
+    reduzida = utils.downsample_series(serie, 'data_venda', 'valor_total', max_pontos=100)
+    assert len(reduzida) == 100
+    assert reduzida['data_venda'].iloc[0] == serie['data_venda'].iloc[0]
+    assert reduzida['data_venda'].iloc[-1] == serie['data_venda'].iloc[-1]
+    
+    semanas = pd.DataFrame({'semana_ano': [f'{2000 + i // 52}-{i % 52 + 1}' for i in range(600)],
+                            'valor_total': np.arange(600, dtype=float)})
+    assert len(utils.downsample_series(semanas, 'semana_ano', 'valor_total', max_pontos=50)) == 50
+    assert utils.downsample_series(semanas, 'semana_ano', 'valor_total', max_pontos=1000) is semanas
+
+def test_amostra_estratificada_cobre_todas_as_categorias():
+    categorias = ['Grande'] * 9000 + ['Media'] * 990 + ['Rara'] * 10 + [None] * 5
+    df = pd.DataFrame({'categoria': categorias, 'valor_total': np.arange(len(categorias), dtype=float)})
+    
+    amostra = utils.stratified_sample(df, 'categoria', 1000)
+    assert len(amostra) <= 1000 + df['categoria'].nunique(dropna=False)
+    assert set(amostra['categoria'].dropna()) == {'Grande', 'Media', 'Rara'}
+    assert amostra['categoria'].isna().any()
+    assert (amostra['categoria'] == 'Grande').sum() == 9000 * 1000 // len(df)
+    assert (np.diff(amostra.index) > 0).all()
+    
+    assert amostra.equals(utils.stratified_sample(df, 'categoria', 1000))
+    assert utils.stratified_sample(df, 'categoria', 20000) is df
+
+def test_tipos_compactos_preservam_os_valores():
+    df = pd.DataFrame({
+        'categoria': ['Cabelos', 'Unhas', 'Cabelos', None],
+        'descricao': ['shampoo', 'esmalte', 'shampoo', 'creme'],
+        'quantidade': [1.0, 2.0, 300.0, np.nan],
+        'numero_pedido': np.array([1, 70000, 3, 4], dtype=np.int64),
+        'valor_total': [10.5, 20.0, 30.0, 40.0]
+    })
+    compacto = utils.compact_dtypes(df)
+    
+    assert isinstance(compacto['categoria'].dtype, pd.CategoricalDtype)
+    assert isinstance(compacto['descricao'].dtype, pd.CategoricalDtype)
+    assert compacto['quantidade'].dtype == pd.Int16Dtype()
+    assert compacto['numero_pedido'].dtype == np.int32
+    assert compacto['valor_total'].dtype == np.float64
+    repetido = pd.concat([df] * 1000, ignore_index=True)
+    assert memoria_dataframe_mb(utils.compact_dtypes(repetido)) < memoria_dataframe_mb(repetido) / 2
+    for coluna in df.columns:
+        assert compacto[coluna].astype(object).where(compacto[coluna].notna(), None).tolist() == \
+            df[coluna].astype(object).where(df[coluna].notna(), None).tolist()
+    
+    # Colunas fracionárias ou já compactas ficam como estão; `df` não é alterado
+    fracionario = utils.compact_dtypes(df.assign(quantidade=[1.5, 2.0, 3.0, 4.0]))
+    assert fracionario['quantidade'].dtype == np.float64
+    assert utils.compact_dtypes(compacto)['categoria'].dtype == compacto['categoria'].dtype
+    assert df['categoria'].dtype == object and df['quantidade'].dtype == np.float64
+
+def test_codigos_de_dia_e_calendario():
+    datas = pd.Series(pd.to_datetime(['2023-01-01 10:30', '1969-12-31', None, '2024-02-29', '2023-01-01'], format='ISO8601'))
+    codigos = utils.date_codes(datas)
+    assert codigos.dtype == np.int32
+    assert codigos.tolist() == [19358, -1, utils.DIA_SEM_DATA, 19782, 19358]
+    
+    calendario = utils.build_calendar(codigos)
+    assert calendario.index.tolist() == [-1, 19358, 19782]
+    dias = pd.to_datetime(['1969-12-31', '2023-01-01', '2024-02-29'])
+    assert calendario['mes_ano'].tolist() == dias.strftime('%Y-%m').tolist()
+    assert calendario['semana_ano'].tolist() == ['1970-1', '2022-52', '2024-9']
+    assert calendario['dia_semana'].tolist() == dias.dayofweek.tolist()
+    assert calendario['dia_semana_nome'].tolist() == ['Quarta-feira', 'Domingo', 'Quinta-feira']
+    assert calendario['nome_mes'].tolist() == ['Dezembro', 'Janeiro', 'Fevereiro']
+    assert calendario['chave_mes'].tolist() == [196912, 202301, 202402]
+    assert utils.build_calendar(np.array([utils.DIA_SEM_DATA], dtype=np.int32)).empty
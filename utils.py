@@ -2,21 +2,27 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+import hashlib
+import re
+import threading
+import time
 
-def process_data(df):
+def process_data(df, colunas_derivadas=True):
     """
     Processa os dados para análise.
     
     Args:
         df (DataFrame): DataFrame com os dados brutos
+        colunas_derivadas (bool): Se False, não cria as colunas por linha (mês, ano, dia da
+            semana, semana do ano e valores médios), que o dashboard não usa
         
     Returns:
         DataFrame: DataFrame processado
     """
-    # Cópia para não modificar o original
-    df_processed = df.copy()
-    
     # Mapear os nomes das colunas da planilha para os nomes usados no código
     column_mapping = {
         'Número': 'numero_pedido',
@@ -26,10 +32,9 @@ def process_data(df):
         'Categoria do produto': 'categoria'  # Atualizado para o nome correto
     }
     
-    # Renomear as colunas
-    for original, novo in column_mapping.items():
-        if original in df_processed.columns:
-            df_processed = df_processed.rename(columns={original: novo})
+    # Renomear as colunas de uma só vez. O resultado compartilha os dados com `df`
+    # (cópia rasa) e recebe apenas colunas novas ou substituídas, sem alterar o original
+    df_processed = df.rename(columns=column_mapping, copy=False)
     
     # Garantir que as colunas necessárias existam
     required_columns = ['data_venda', 'quantidade', 'valor_total', 'categoria']
@@ -37,15 +42,21 @@ def process_data(df):
         if col not in df_processed.columns:
             raise ValueError(f"Coluna '{col}' não encontrada no DataFrame")
     
-    # Converter data para datetime se ainda não estiver
+    # Converter data para datetime se ainda não estiver (cada valor distinto é analisado uma vez)
     if not pd.api.types.is_datetime64_any_dtype(df_processed['data_venda']):
-        df_processed['data_venda'] = pd.to_datetime(df_processed['data_venda'])
+        df_processed['data_venda'] = parse_sales_dates(df_processed['data_venda'])
+    
+    if not colunas_derivadas:
+        return df_processed
     
-    # Adicionar colunas úteis para análise
-    df_processed['mes'] = df_processed['data_venda'].dt.month
-    df_processed['ano'] = df_processed['data_venda'].dt.year
-    df_processed['dia_semana'] = df_processed['data_venda'].dt.dayofweek
-    df_processed['semana_ano'] = df_processed['data_venda'].dt.isocalendar().week
+    # Adicionar colunas úteis para análise (inteiros de 1 ou 2 bytes), lidas do calendário pelo código do dia
+    codigos = date_codes(df_processed['data_venda'])
+    calendario = build_calendar(codigos)
+    posicoes = calendario.index.get_indexer(codigos)
+    for coluna, origem in [('mes', 'mes'), ('ano', 'ano'), ('dia_semana', 'dia_semana'), ('semana_ano', 'semana_iso')]:
+        valores = calendario[origem].to_numpy(dtype=float)[posicoes]
+        valores[posicoes < 0] = np.nan
+        df_processed[coluna] = _inteiro_compacto(pd.Series(valores, index=df_processed.index))
     
     # Calcular métricas adicionais
     if 'numero_pedido' in df_processed.columns:
@@ -57,161 +68,848 @@ def process_data(df):
     
     return df_processed
 
-def generate_insights(df):
+# Colunas de texto repetitivo guardadas como `category` por `compact_dtypes`
+COLUNAS_CATEGORICAS = ['categoria', 'categoria_original', 'descricao']
+
+def _inteiro_compacto(serie):
     """
-    Gera insights baseados nos dados.
+    Converte uma série de números inteiros para o menor tipo inteiro que comporta os valores.
+    
+    Séries com valores ausentes usam o inteiro anulável correspondente (Int8, Int16...).
+    Séries não numéricas ou com valores fracionários são devolvidas sem alteração.
+    """
+    if not pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+        return serie
+    
+    valores = serie.dropna()
+    if pd.api.types.is_float_dtype(valores) and not (valores == np.round(valores)).all():
+        return serie
+    
+    minimo, maximo = (int(valores.min()), int(valores.max())) if len(valores) else (0, 0)
+    for tipo in (np.int8, np.int16, np.int32, np.int64):
+        if np.iinfo(tipo).min <= minimo and maximo <= np.iinfo(tipo).max:
+            break
+    
+    if len(valores) < len(serie):
+        return serie.astype(pd.api.types.pandas_dtype(tipo.__name__.capitalize()))
+    return serie.astype(tipo)
+
+def compact_dtypes(df):
+    """
+    Converte as colunas carregadas para tipos compactos, sem alterar os valores.
+    
+    Textos repetitivos (categoria, categoria original e descrição) passam a
+    `category`; quantidade e número do pedido, quando inteiros, passam ao menor
+    inteiro que comporta os valores (anulável se houver valores ausentes).
+    Agrupamentos por colunas `category` devem usar `observed=True`, senão
+    incluem as combinações sem vendas.
     
     Args:
-        df (DataFrame): DataFrame com os dados processados
+        df (DataFrame): Dados carregados (já categorizados e mapeados)
+    
+    Returns:
+        DataFrame: Cópia rasa de `df` com os tipos compactos
+    """
+    df_compacto = df.copy(deep=False)
+    
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df_compacto.columns and not isinstance(df_compacto[coluna].dtype, pd.CategoricalDtype):
+            df_compacto[coluna] = df_compacto[coluna].astype('category')
+    
+    for coluna in ['quantidade', 'numero_pedido']:
+        if coluna in df_compacto.columns:
+            df_compacto[coluna] = _inteiro_compacto(df_compacto[coluna])
+    
+    return df_compacto
+
+# Nomes dos dias da semana em português, na ordem de `dt.dayofweek`
+DIAS_SEMANA_PT = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
+
+# Nomes dos meses em português, na ordem de `dt.month`
+MESES_PT = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho', 'Julho', 'Agosto', 'Setembro', 'Outubro',
+            'Novembro', 'Dezembro']
+
+# Código do dia atribuído às vendas sem data (os demais são dias desde 1970-01-01)
+DIA_SEM_DATA = np.iinfo(np.int32).min
+
+# Datas com barras (dd/mm/aaaa, com hora opcional) e datas ISO (aaaa-mm-dd)
+_PADRAO_DATA_BARRAS = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})(?: (\d{1,2}:\d{2})(:\d{2})?)?$')
+_PADRAO_DATA_ISO = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+def infer_date_format(valores, amostra=1000):
+    """
+    Infere o formato das datas a partir de uma amostra dos valores distintos.
+    
+    Datas com barras são lidas como dia/mês (padrão brasileiro), exceto quando
+    algum segundo campo passa de 12 e nenhum primeiro campo passa, o que só é
+    possível em mês/dia. Datas ISO usam o formato ISO 8601.
+    
+    Args:
+        valores (array): Valores distintos da coluna de datas
+        amostra (int): Número máximo de textos examinados
+    
+    Returns:
+        str: Formato para `pd.to_datetime` ou None se não houver um formato único
+    """
+    textos = [valor.strip() for valor in valores[:amostra] if isinstance(valor, str) and valor.strip()]
+    if not textos:
+        return None
+    
+    if all(_PADRAO_DATA_ISO.match(texto) for texto in textos):
+        return 'ISO8601'
+    
+    partes = [_PADRAO_DATA_BARRAS.match(texto) for texto in textos]
+    if not all(partes):
+        return None
+    
+    # A hora precisa ter o mesmo formato em todos os textos
+    horas = {(parte.group(4) is not None, parte.group(5) is not None) for parte in partes}
+    anos = {len(parte.group(3)) for parte in partes}
+    if len(horas) > 1 or len(anos) > 1:
+        return None
+    
+    mes_dia = (
+        max(int(parte.group(2)) for parte in partes) > 12 and max(int(parte.group(1)) for parte in partes) <= 12
+    )
+    formato = '%m/%d/' if mes_dia else '%d/%m/'
+    formato += '%Y' if anos == {4} else '%y'
+    tem_hora, tem_segundos = horas.pop()
+    if tem_hora:
+        formato += ' %H:%M:%S' if tem_segundos else ' %H:%M'
+    return formato
+
+def parse_sales_dates(serie, formato=None):
+    """
+    Converte a coluna de datas analisando cada valor distinto uma única vez.
+    
+    Sem `formato`, o formato é inferido por `infer_date_format`; se não houver
+    um formato único (formatos misturados no arquivo), cada valor é lido com o
+    seu próprio formato, com dia antes do mês. Como a inferência examina só uma
+    amostra, os valores que o formato inferido não reconhece também são relidos
+    dessa forma. Valores que não são datas válidas viram NaT (ver
+    `count_invalid_dates`).
+    
+    Args:
+        serie (Series): Coluna de datas (textos, objetos de data ou datetime)
+        formato (str): Formato explícito (ex.: '%d/%m/%Y'), ou None para inferir
+    
+    Returns:
+        Series: Datas como datetime64, com o mesmo índice de `serie`
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    
+    codigos, valores = pd.factorize(serie)
+    valores = np.asarray(valores, dtype=object)
+    formato_inferido = formato is None
+    if formato_inferido:
+        formato = infer_date_format(valores)
+    
+    if formato is None:
+        datas = pd.to_datetime(valores, format='mixed', dayfirst=True, errors='coerce')
+    else:
+        datas = pd.to_datetime(valores, format=formato, errors='coerce')
         
+        # Valores fora da amostra usada na inferência podem ter outro formato
+        falhas = np.flatnonzero(datas.isna())
+        if formato_inferido and len(falhas) > 0:
+            relidas = pd.to_datetime(valores[falhas], format='mixed', dayfirst=True, errors='coerce')
+            datas = datas.to_numpy(copy=True)
+            datas[falhas] = relidas.to_numpy()
+            datas = pd.DatetimeIndex(datas)
+    
+    # Código -1 (valor ausente) vira NaT
+    datas = datas.take(codigos, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(datas, index=serie.index, name=serie.name)
+
+def count_invalid_dates(serie, datas):
+    """
+    Conta os valores preenchidos da coluna original que não viraram datas válidas.
+    
+    Args:
+        serie (Series): Coluna de datas original
+        datas (Series): Resultado de `parse_sales_dates` para `serie`
+    
+    Returns:
+        int: Número de valores não vazios convertidos em NaT
+    """
+    preenchidos = serie.notna() & (serie.astype(str).str.strip() != '')
+    return int((preenchidos & datas.isna()).sum())
+
+def date_codes(datas):
+    """
+    Calcula o código inteiro do dia de cada data, a chave de junção com `build_calendar`.
+    
+    O código é o número de dias desde 1970-01-01 (sem passar por texto nem por
+    tabelas de hash); datas ausentes recebem `DIA_SEM_DATA`.
+    
+    Args:
+        datas (Series): Datas (datetime64)
+    
     Returns:
-        list: Lista de dicionários com insights
+        ndarray: Código (int32) de cada data
+    """
+    dias = np.asarray(datas, dtype='datetime64[ns]').astype('datetime64[D]')
+    codigos = dias.astype(np.int64)
+    codigos[np.isnat(dias)] = DIA_SEM_DATA
+    return codigos.astype(np.int32)
+
+def build_calendar(codigos):
     """
-    insights = []
+    Monta a tabela de calendário com uma linha por dia distinto.
+    
+    Os atributos de cada dia (mês, semana ISO, dia da semana, nomes em
+    português e as chaves de texto usadas nos gráficos) são calculados uma
+    única vez por dia; as linhas de venda se ligam a eles pelo código do dia.
+    
+    Args:
+        codigos (ndarray): Códigos de dia calculados por `date_codes` (podem se repetir)
+    
+    Returns:
+        DataFrame: Calendário indexado pelo código do dia (`codigo_data`), em ordem cronológica
+    """
+    distintos = pd.unique(np.asarray(codigos, dtype=np.int32))
+    distintos = np.sort(distintos[distintos != DIA_SEM_DATA])
+    dias = pd.Series(distintos.astype('datetime64[D]').astype('datetime64[ns]'))
+    iso = dias.dt.isocalendar()
+    
+    return pd.DataFrame({
+        'dia': dias.values,
+        'data_venda': dias.dt.date.values,
+        'ano': dias.dt.year.astype(np.int16).values,
+        'mes': dias.dt.month.astype(np.int8).values,
+        'chave_mes': (dias.dt.year * 100 + dias.dt.month).astype(np.int32).values,
+        'mes_ano': dias.dt.strftime('%Y-%m').values,
+        'nome_mes': dias.dt.month.map(dict(enumerate(MESES_PT, start=1))).values,
+        'ano_iso': iso['year'].astype(np.int16).values,
+        'semana_iso': iso['week'].astype(np.int8).values,
+        'semana_ano': (iso['year'].astype(str) + "-" + iso['week'].astype(str)).values,
+        'dia_semana': dias.dt.dayofweek.astype(np.int8).values,
+        'dia_semana_nome': dias.dt.dayofweek.map(dict(enumerate(DIAS_SEMANA_PT))).values
+    }, index=pd.Index(distintos, name='codigo_data'))
+
+def _vendas_por_dia(df):
+    """Soma `valor_total` por dia e junta o calendário dos dias com vendas (vendas sem data ficam de fora)."""
+    codigos = date_codes(df['data_venda'])
+    vendas = df['valor_total'].groupby(codigos).sum()
+    vendas = vendas[vendas.index != DIA_SEM_DATA]
+    return build_calendar(vendas.index.to_numpy()).join(vendas)
+
+# Orçamento de pontos enviados ao navegador por gráfico
+MAX_PONTOS_DISPERSAO = 5000   # pontos do gráfico de dispersão (amostra estratificada por categoria)
+MAX_PONTOS_SERIE = 1000       # pontos de cada série temporal em gráficos de linha (LTTB)
+LIMITE_WEBGL = 1000           # acima deste número de pontos, dispersões usam WebGL (scattergl)
+
+def stratified_sample(df, coluna, max_linhas, semente=0):
+    """
+    Amostra determinística e estratificada das linhas, proporcional a cada grupo.
+    
+    Cada grupo de `coluna` recebe uma cota proporcional ao seu tamanho (no mínimo
+    uma linha), então categorias pequenas continuam visíveis. A escolha usa uma
+    semente fixa, portanto o mesmo conjunto de dados gera sempre a mesma amostra.
+    A ordem original das linhas é preservada.
+    
+    Args:
+        df (DataFrame): Dados completos
+        coluna (str): Coluna que define os estratos (ex.: categoria)
+        max_linhas (int): Número aproximado de linhas da amostra
+        semente (int): Semente do gerador aleatório
+    
+    Returns:
+        DataFrame: Amostra (o próprio `df` se ele já couber no orçamento)
+    """
+    if len(df) <= max_linhas:
+        return df
+    
+    codigos, grupos = pd.factorize(df[coluna])
+    codigos = np.where(codigos < 0, len(grupos), codigos)
+    tamanhos = np.bincount(codigos, minlength=len(grupos) + 1)
+    cotas = np.maximum(1, np.floor(tamanhos * (max_linhas / len(df)))).astype(np.int64)
+    
+    # Posição aleatória (mas fixa) de cada linha dentro do seu grupo
+    chaves = np.random.default_rng(semente).random(len(df))
+    ordem = np.lexsort((chaves, codigos))
+    inicio_grupo = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    posicao_no_grupo = np.empty(len(df), dtype=np.int64)
+    posicao_no_grupo[ordem] = np.arange(len(df)) - np.repeat(inicio_grupo, tamanhos)
+    
+    return df[posicao_no_grupo < cotas[codigos]]
+
+def lttb_indices(x, y, max_pontos):
+    """
+    Escolhe os pontos de uma série pelo algoritmo Largest-Triangle-Three-Buckets.
+    
+    O primeiro e o último ponto são mantidos; os demais são divididos em
+    `max_pontos - 2` faixas e, de cada faixa, fica o ponto que forma o maior
+    triângulo com o ponto escolhido na faixa anterior e a média da faixa seguinte.
+    Picos e vales são preservados, ao contrário de uma amostragem regular.
+    
+    Args:
+        x (array): Coordenadas x em ordem crescente (numéricas)
+        y (array): Valores da série
+        max_pontos (int): Número de pontos da série reduzida
+    
+    Returns:
+        ndarray: Índices dos pontos escolhidos, em ordem crescente
+    """
+    n = len(x)
+    if max_pontos >= n or max_pontos < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    limites = np.floor(np.linspace(1, n - 1, max_pontos - 1)).astype(np.int64)
+    
+    indices = np.empty(max_pontos, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    anterior = 0
+    for faixa in range(max_pontos - 2):
+        inicio, fim = limites[faixa], limites[faixa + 1]
+        
+        # Média da faixa seguinte (na última faixa, o último ponto)
+        if faixa == max_pontos - 3:
+            media_x, media_y = x[n - 1], y[n - 1]
+        else:
+            media_x = x[fim:limites[faixa + 2]].mean()
+            media_y = y[fim:limites[faixa + 2]].mean()
+        
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior]) -
+            (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        indices[faixa + 1] = anterior
+    
+    return indices
+
+def downsample_series(df, x, y, max_pontos=MAX_PONTOS_SERIE):
+    """
+    Reduz uma série temporal com LTTB para caber no orçamento de pontos.
+    
+    Datas são convertidas em números para o cálculo; eixos categóricos (ex.:
+    "2023-7" nas semanas) usam a posição de cada ponto.
+    
+    Args:
+        df (DataFrame): Série ordenada por `x`
+        x (str): Coluna do eixo x
+        y (str): Coluna com os valores
+        max_pontos (int): Número máximo de pontos
+    
+    Returns:
+        DataFrame: Linhas escolhidas (o próprio `df` se ele já couber no orçamento)
+    """
+    if len(df) <= max_pontos:
+        return df
+    
+    valores_x = df[x]
+    if pd.api.types.is_numeric_dtype(valores_x):
+        coordenadas = valores_x.to_numpy(dtype=float, na_value=np.nan)
+    elif pd.api.types.is_datetime64_any_dtype(valores_x) or isinstance(valores_x.iloc[0], (datetime, date)):
+        coordenadas = pd.to_datetime(valores_x).to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(float)
+    else:
+        coordenadas = np.arange(len(df), dtype=float)
+    
+    return df.iloc[lttb_indices(coordenadas, df[y].to_numpy(dtype=float, na_value=np.nan), max_pontos)]
+
+def trendline_sums(df, x, y, cor):
+    """
+    Calcula os somatórios por grupo usados no ajuste das retas de `add_trendlines`.
+    
+    Args:
+        df (DataFrame): Dados completos
+        x (str): Coluna do eixo x
+        y (str): Coluna do eixo y
+        cor (str): Coluna que define os grupos
+    
+    Returns:
+        DataFrame: Uma linha por grupo (n, sx, sy, sxx, sxy, x_min, x_max)
+    """
+    dados = pd.DataFrame({
+        'grupo': df[cor].values,
+        'x': df[x].to_numpy(dtype=float, na_value=np.nan),
+        'y': df[y].to_numpy(dtype=float, na_value=np.nan)
+    }).dropna()
+    dados['xx'] = dados['x'] * dados['x']
+    dados['xy'] = dados['x'] * dados['y']
+    somas = dados.groupby('grupo', sort=False, observed=True).agg(
+        n=('x', 'size'), sx=('x', 'sum'), sy=('y', 'sum'), sxx=('xx', 'sum'), sxy=('xy', 'sum'),
+        x_min=('x', 'min'), x_max=('x', 'max')
+    )
+    return somas
+
+def add_trendlines(fig, df, x, y, cor, somas=None):
+    """
+    Adiciona ao gráfico uma reta de mínimos quadrados (OLS) por grupo.
+    
+    As retas são ajustadas com todas as linhas de `df` (somatórios por grupo),
+    mas cada uma é enviada ao navegador apenas com os dois pontos extremos.
+    A cor de cada reta é a do traço do grupo correspondente no gráfico.
+    
+    Args:
+        fig (Figure): Gráfico de dispersão com um traço por grupo
+        df (DataFrame): Dados completos (ignorado se `somas` for informado)
+        x (str): Coluna do eixo x
+        y (str): Coluna do eixo y
+        cor (str): Coluna que define os grupos
+        somas (DataFrame): Somatórios já calculados por `trendline_sums` (opcional)
+    """
+    if somas is None:
+        somas = trendline_sums(df, x, y, cor)
+    
+    cores = {traco.name: traco.marker.color for traco in fig.data}
+    for grupo, linha in somas.iterrows():
+        denominador = linha['n'] * linha['sxx'] - linha['sx'] ** 2
+        if linha['n'] < 2 or denominador == 0:
+            continue
+        inclinacao = (linha['n'] * linha['sxy'] - linha['sx'] * linha['sy']) / denominador
+        intercepto = (linha['sy'] - inclinacao * linha['sx']) / linha['n']
+        
+        extremos = np.array([linha['x_min'], linha['x_max']])
+        fig.add_trace(go.Scatter(
+            x=extremos,
+            y=intercepto + inclinacao * extremos,
+            mode='lines',
+            name=str(grupo),
+            legendgroup=str(grupo),
+            showlegend=False,
+            line=dict(color=cores.get(str(grupo))),
+            hovertemplate=f"<b>OLS ({grupo})</b><br>{y} = {inclinacao:.4g} * {x} + {intercepto:.4g}<extra></extra>"
+        ))
+
+class Insight(dict):
+    """
+    Insight cujo gráfico só é construído quando `insight['grafico']` é acessado.
+    
+    O gráfico construído fica guardado no próprio dicionário, junto com o tempo
+    gasto para construí-lo (`tempo_grafico_s`). A função de construção deve
+    guardar apenas os agregados do gráfico, não o DataFrame de origem, pois o
+    insight fica em cache. `copy` devolve um insight independente, com a sua
+    própria cópia do gráfico.
+    """
+    
+    def __init__(self, construir_grafico=None, **campos):
+        super().__init__(**campos)
+        self._construir_grafico = construir_grafico
+        self._trava = threading.Lock()
+    
+    def __missing__(self, chave):
+        if chave != 'grafico' or self._construir_grafico is None:
+            raise KeyError(chave)
+        
+        # Sessões diferentes do Streamlit podem exibir o mesmo insight em cache ao mesmo tempo
+        with self._trava:
+            if 'grafico' not in self.keys():
+                inicio = time.perf_counter()
+                self['grafico'] = self._construir_grafico()
+                self['tempo_grafico_s'] = time.perf_counter() - inicio
+                self._construir_grafico = None
+        return dict.__getitem__(self, 'grafico')
+    
+    def __contains__(self, chave):
+        return super().__contains__(chave) or (chave == 'grafico' and self._construir_grafico is not None)
     
+    def copy(self):
+        """
+        Returns:
+            Insight: Cópia rasa dos campos; o gráfico é construído uma única vez por este
+                insight e cada cópia recebe um `Figure` próprio, que pode ser alterado
+        """
+        campos = {chave: valor for chave, valor in self.items() if chave not in ('grafico', 'tempo_grafico_s')}
+        if 'grafico' not in self:
+            return Insight(**campos)
+        return Insight(construir_grafico=lambda: go.Figure(self['grafico']), **campos)
+
+def _insight_categoria_mais_vendida(df):
     # Insight 1: Categoria mais vendida
-    categoria_mais_vendida = df.groupby('categoria')['valor_total'].sum().idxmax()
+    categoria_mais_vendida = df.groupby('categoria', observed=True)['valor_total'].sum().idxmax()
     valor_categoria = df[df['categoria'] == categoria_mais_vendida]['valor_total'].sum()
     percentual = (valor_categoria / df['valor_total'].sum()) * 100
     
-    # Gráfico para o insight 1
-    df_cat_vendas = df.groupby('categoria')['valor_total'].sum().reset_index()
+    # Dados do gráfico para o insight 1
+    df_cat_vendas = df.groupby('categoria', observed=True)['valor_total'].sum().reset_index()
     df_cat_vendas = df_cat_vendas.sort_values('valor_total', ascending=False)
     
-    fig_cat_vendas = px.bar(
-        df_cat_vendas,
-        x='categoria',
-        y='valor_total',
-        title='Valor Total de Vendas por Categoria',
-        color='categoria',
-        labels={'valor_total': 'Valor Total (R$)', 'categoria': 'Categoria'}
+    return Insight(
+        construir_grafico=lambda: px.bar(
+            df_cat_vendas,
+            x='categoria',
+            y='valor_total',
+            title='Valor Total de Vendas por Categoria',
+            color='categoria',
+            labels={'valor_total': 'Valor Total (R$)', 'categoria': 'Categoria'}
+        ),
+        titulo=f"A categoria mais vendida é '{categoria_mais_vendida}'",
+        descricao=f"A categoria '{categoria_mais_vendida}' representa {percentual:.1f}% do valor total de vendas, totalizando R$ {valor_categoria:,.2f}."
     )
+
+def _insight_tendencia(df):
+    # Insight 2: Tendência de crescimento
+    if 'data_venda' not in df.columns:
+        return None
     
-    insights.append({
-        'titulo': f"A categoria mais vendida é '{categoria_mais_vendida}'",
-        'descricao': f"A categoria '{categoria_mais_vendida}' representa {percentual:.1f}% do valor total de vendas, totalizando R$ {valor_categoria:,.2f}.",
-        'grafico': fig_cat_vendas
-    })
+    # Somar por dia (código inteiro) e depois por mês, com a chave "AAAA-MM" vinda do calendário
+    df_tendencia = _vendas_por_dia(df).groupby('mes_ano', sort=True)['valor_total'].sum().reset_index()
     
-    # Insight 2: Tendência de crescimento
-    if 'data_venda' in df.columns:
-        df['mes_ano'] = df['data_venda'].dt.strftime('%Y-%m')
-        df_tendencia = df.groupby('mes_ano')['valor_total'].sum().reset_index()
-        
-        if len(df_tendencia) > 1:
-            primeiro_mes = df_tendencia.iloc[0]['valor_total']
-            ultimo_mes = df_tendencia.iloc[-1]['valor_total']
-            variacao = ((ultimo_mes / primeiro_mes) - 1) * 100
-            
-            fig_tendencia = px.line(
-                df_tendencia,
-                x='mes_ano',
-                y='valor_total',
-                markers=True,
-                title='Tendência de Vendas ao Longo do Tempo',
-                labels={'valor_total': 'Valor Total (R$)', 'mes_ano': 'Mês/Ano'}
-            )
-            
-            status = "crescimento" if variacao > 0 else "queda"
-            
-            insights.append({
-                'titulo': f"Tendência de {status} nas vendas",
-                'descricao': f"As vendas apresentaram {status} de {abs(variacao):.1f}% comparando o primeiro e o último período analisados.",
-                'grafico': fig_tendencia
-            })
+    if len(df_tendencia) <= 1:
+        return None
+    
+    primeiro_mes = df_tendencia.iloc[0]['valor_total']
+    ultimo_mes = df_tendencia.iloc[-1]['valor_total']
+    variacao = ((ultimo_mes / primeiro_mes) - 1) * 100
+    
+    status = "crescimento" if variacao > 0 else "queda"
     
+    return Insight(
+        construir_grafico=lambda: px.line(
+            downsample_series(df_tendencia, 'mes_ano', 'valor_total'),
+            x='mes_ano',
+            y='valor_total',
+            markers=True,
+            title='Tendência de Vendas ao Longo do Tempo',
+            labels={'valor_total': 'Valor Total (R$)', 'mes_ano': 'Mês/Ano'}
+        ),
+        titulo=f"Tendência de {status} nas vendas",
+        descricao=f"As vendas apresentaram {status} de {abs(variacao):.1f}% comparando o primeiro e o último período analisados."
+    )
+
+def _insight_sazonalidade_semanal(df):
     # Insight 3: Sazonalidade semanal
-    if 'data_venda' in df.columns:
-        # Mapear dias da semana para português
-        dias_semana = {
-            0: 'Segunda-feira',
-            1: 'Terça-feira',
-            2: 'Quarta-feira',
-            3: 'Quinta-feira',
-            4: 'Sexta-feira',
-            5: 'Sábado',
-            6: 'Domingo'
-        }
-        
-        df['dia_semana_nome'] = df['data_venda'].dt.dayofweek.map(dias_semana)
-        df_dia_semana = df.groupby('dia_semana_nome')['valor_total'].sum().reset_index()
-        
-        # Ordenar os dias da semana corretamente
-        ordem_dias = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
-        df_dia_semana['ordem'] = df_dia_semana['dia_semana_nome'].map({dia: i for i, dia in enumerate(ordem_dias)})
-        df_dia_semana = df_dia_semana.sort_values('ordem')
-        df_dia_semana = df_dia_semana.drop('ordem', axis=1)
-        
-        melhor_dia = df_dia_semana.loc[df_dia_semana['valor_total'].idxmax(), 'dia_semana_nome']
-        pior_dia = df_dia_semana.loc[df_dia_semana['valor_total'].idxmin(), 'dia_semana_nome']
-        
-        fig_dia_semana = px.bar(
+    if 'data_venda' not in df.columns:
+        return None
+    
+    # Somar por dia e depois pelo nome do dia da semana (em português, vindo do calendário)
+    df_dia_semana = _vendas_por_dia(df).groupby('dia_semana_nome')['valor_total'].sum().reset_index()
+    
+    # Ordenar os dias da semana corretamente
+    df_dia_semana['ordem'] = df_dia_semana['dia_semana_nome'].map({dia: i for i, dia in enumerate(DIAS_SEMANA_PT)})
+    df_dia_semana = df_dia_semana.sort_values('ordem')
+    df_dia_semana = df_dia_semana.drop('ordem', axis=1)
+    
+    melhor_dia = df_dia_semana.loc[df_dia_semana['valor_total'].idxmax(), 'dia_semana_nome']
+    pior_dia = df_dia_semana.loc[df_dia_semana['valor_total'].idxmin(), 'dia_semana_nome']
+    
+    return Insight(
+        construir_grafico=lambda: px.bar(
             df_dia_semana,
             x='dia_semana_nome',
             y='valor_total',
             title='Vendas por Dia da Semana',
             labels={'valor_total': 'Valor Total (R$)', 'dia_semana_nome': 'Dia da Semana'},
             color='dia_semana_nome'
-        )
-        
-        insights.append({
-            'titulo': "Sazonalidade semanal nas vendas",
-            'descricao': f"O melhor dia para vendas é {melhor_dia}, enquanto {pior_dia} apresenta o menor volume de vendas.",
-            'grafico': fig_dia_semana
-        })
-    
+        ),
+        titulo="Sazonalidade semanal nas vendas",
+        descricao=f"O melhor dia para vendas é {melhor_dia}, enquanto {pior_dia} apresenta o menor volume de vendas."
+    )
+
+def _insight_quantidade_valor(df):
     # Insight 4: Relação entre quantidade e valor
-    if len(df) > 0:
-        correlacao = df[['quantidade', 'valor_total']].corr().iloc[0, 1]
-        
-        fig_scatter = px.scatter(
-            df,
-            x='quantidade',
-            y='valor_total',
-            color='categoria',
-            title='Relação entre Quantidade de Produtos e Valor Total',
-            labels={'quantidade': 'Quantidade de Produtos', 'valor_total': 'Valor Total (R$)'},
-            trendline='ols'
-        )
-        
-        if correlacao > 0.7:
-            relacao = "forte correlação positiva"
-        elif correlacao > 0.3:
-            relacao = "correlação positiva moderada"
-        elif correlacao > -0.3:
-            relacao = "correlação fraca"
-        else:
-            relacao = "correlação negativa"
-        
-        insights.append({
-            'titulo': f"Relação entre quantidade e valor total",
-            'descricao': f"Existe uma {relacao} (coeficiente: {correlacao:.2f}) entre a quantidade de produtos e o valor total das vendas.",
-            'grafico': fig_scatter
-        })
+    if len(df) == 0:
+        return None
+    
+    correlacao = df[['quantidade', 'valor_total']].corr().iloc[0, 1]
+    
+    if correlacao > 0.7:
+        relacao = "forte correlação positiva"
+    elif correlacao > 0.3:
+        relacao = "correlação positiva moderada"
+    elif correlacao > -0.3:
+        relacao = "correlação fraca"
+    else:
+        relacao = "correlação negativa"
+    
+    # O gráfico de dispersão é o mais caro; só é construído se for exibido. O insight
+    # guarda apenas a amostra de pontos e os somatórios das retas, não o DataFrame
+    amostra = stratified_sample(df[['quantidade', 'valor_total', 'categoria']], 'categoria', MAX_PONTOS_DISPERSAO)
+    somas = trendline_sums(df, 'quantidade', 'valor_total', 'categoria')
+    total_linhas = len(df)
     
+    return Insight(
+        construir_grafico=lambda: _grafico_quantidade_valor(amostra, somas, total_linhas),
+        titulo=f"Relação entre quantidade e valor total",
+        descricao=f"Existe uma {relacao} (coeficiente: {correlacao:.2f}) entre a quantidade de produtos e o valor total das vendas."
+    )
+
+def _grafico_quantidade_valor(amostra, somas, total_linhas):
+    # Pontos: amostra estratificada por categoria; retas OLS: somatórios de todas as linhas
+    titulo = 'Relação entre Quantidade de Produtos e Valor Total'
+    if len(amostra) < total_linhas:
+        titulo += f' (amostra de {len(amostra):,} de {total_linhas:,} vendas)'
+    
+    fig_scatter = px.scatter(
+        amostra,
+        x='quantidade',
+        y='valor_total',
+        color='categoria',
+        title=titulo,
+        labels={'quantidade': 'Quantidade de Produtos', 'valor_total': 'Valor Total (R$)'},
+        render_mode='webgl' if len(amostra) > LIMITE_WEBGL else 'svg'
+    )
+    add_trendlines(fig_scatter, None, 'quantidade', 'valor_total', 'categoria', somas=somas)
+    return fig_scatter
+
+def _insight_ticket_medio(df):
     # Insight 5: Categorias com maior ticket médio
-    if 'numero_pedido' in df.columns:
-        df_ticket = df.groupby(['categoria', 'numero_pedido'])['valor_total'].sum().reset_index()
-        df_ticket_medio = df_ticket.groupby('categoria')['valor_total'].mean().reset_index()
-        df_ticket_medio = df_ticket_medio.sort_values('valor_total', ascending=False)
-        df_ticket_medio = df_ticket_medio.rename(columns={'valor_total': 'ticket_medio'})
-        
-        categoria_maior_ticket = df_ticket_medio.iloc[0]['categoria']
-        valor_maior_ticket = df_ticket_medio.iloc[0]['ticket_medio']
-        
-        fig_ticket = px.bar(
+    if 'numero_pedido' not in df.columns:
+        return None
+    
+    df_ticket = df.groupby(['categoria', 'numero_pedido'], observed=True)['valor_total'].sum().reset_index()
+    df_ticket_medio = df_ticket.groupby('categoria', observed=True)['valor_total'].mean().reset_index()
+    df_ticket_medio = df_ticket_medio.sort_values('valor_total', ascending=False)
+    df_ticket_medio = df_ticket_medio.rename(columns={'valor_total': 'ticket_medio'})
+    
+    categoria_maior_ticket = df_ticket_medio.iloc[0]['categoria']
+    valor_maior_ticket = df_ticket_medio.iloc[0]['ticket_medio']
+    
+    return Insight(
+        construir_grafico=lambda: px.bar(
             df_ticket_medio,
             x='categoria',
             y='ticket_medio',
             title='Ticket Médio por Categoria',
             labels={'ticket_medio': 'Ticket Médio (R$)', 'categoria': 'Categoria'},
             color='categoria'
-        )
+        ),
+        titulo=f"Categoria com maior ticket médio: {categoria_maior_ticket}",
+        descricao=f"A categoria '{categoria_maior_ticket}' possui o maior ticket médio (R$ {valor_maior_ticket:.2f}), o que indica potencial para estratégias de upselling."
+    )
+
+# Geradores de insights, na ordem em que são exibidos
+GERADORES_INSIGHTS = [
+    _insight_categoria_mais_vendida,
+    _insight_tendencia,
+    _insight_sazonalidade_semanal,
+    _insight_quantidade_valor,
+    _insight_ticket_medio
+]
+
+# Colunas que definem o resultado dos insights (entram na impressão digital do conjunto de dados)
+COLUNAS_INSIGHTS = ['categoria', 'valor_total', 'quantidade', 'data_venda', 'numero_pedido']
+
+# Insights já calculados por conjunto de dados (os mais recentes ficam no final)
+TAMANHO_CACHE_INSIGHTS = 4
+_insights_em_cache = OrderedDict()
+_trava_cache_insights = threading.Lock()
+
+def dataset_fingerprint(df):
+    """
+    Calcula uma impressão digital do conteúdo usado pelos insights.
+    
+    Args:
+        df (DataFrame): DataFrame com os dados processados
         
-        insights.append({
-            'titulo': f"Categoria com maior ticket médio: {categoria_maior_ticket}",
-            'descricao': f"A categoria '{categoria_maior_ticket}' possui o maior ticket médio (R$ {valor_maior_ticket:.2f}), o que indica potencial para estratégias de upselling.",
-            'grafico': fig_ticket
+    Returns:
+        str: Hash hexadecimal das colunas relevantes
+    """
+    colunas = [coluna for coluna in COLUNAS_INSIGHTS if coluna in df.columns]
+    h = hashlib.blake2b(digest_size=20)
+    h.update(repr((len(df), colunas)).encode('utf-8'))
+    if colunas:
+        h.update(pd.util.hash_pandas_object(df[colunas], index=False).values.tobytes())
+    return h.hexdigest()
+
+def _executar_gerador(gerador, df):
+    inicio = time.perf_counter()
+    insight = gerador(df)
+    if insight is not None:
+        insight['tempo_s'] = time.perf_counter() - inicio
+    return insight
+
+def generate_insights(df, chave_dados=None, usar_cache=True, max_workers=None):
+    """
+    Gera insights baseados nos dados.
+    
+    Os insights independentes são calculados em paralelo (threads) e guardados
+    em cache pela impressão digital do conjunto de dados. Os gráficos são
+    construídos apenas quando `insight['grafico']` é acessado pela primeira vez.
+    Cada chamada recebe cópias dos insights em cache (ver `Insight.copy`), então
+    alterar um insight ou o seu gráfico não afeta as outras sessões.
+    
+    Args:
+        df (DataFrame): DataFrame com os dados processados
+        chave_dados: Chave do conjunto de dados já conhecida pelo chamador (evita calcular a impressão digital)
+        usar_cache (bool): Se False, sempre recalcula os insights
+        max_workers (int): Número de threads (padrão: uma por insight)
+    
+    Returns:
+        list: Lista de dicionários com insights (titulo, descricao, grafico, tempo_s)
+    """
+    chave = None
+    if usar_cache:
+        chave = chave_dados if chave_dados is not None else dataset_fingerprint(df)
+        with _trava_cache_insights:
+            if chave in _insights_em_cache:
+                _insights_em_cache.move_to_end(chave)
+                return [insight.copy() for insight in _insights_em_cache[chave]]
+    
+    with ThreadPoolExecutor(max_workers=max_workers or len(GERADORES_INSIGHTS)) as executor:
+        resultados = list(executor.map(_executar_gerador, GERADORES_INSIGHTS, repeat(df)))
+    
+    insights = [insight for insight in resultados if insight is not None]
+    
+    if chave is not None:
+        with _trava_cache_insights:
+            _insights_em_cache[chave] = insights
+            while len(_insights_em_cache) > TAMANHO_CACHE_INSIGHTS:
+                _insights_em_cache.popitem(last=False)
+    
+    return [insight.copy() for insight in insights]
+
+def _contar_pedidos(pares, chaves):
+    """Conta pedidos distintos por chave a partir dos pares únicos (pedido, categoria, dia)."""
+    return pares.drop_duplicates(['pedido'] + chaves).groupby(chaves, sort=True, observed=True).size()
+
+def build_sales_cube(df):
+    """
+    Pré-agrega as vendas em um cubo categoria × dia para os gráficos do dashboard.
+    
+    O cubo guarda, para cada (categoria, dia), a soma de `valor_total` e de
+    `quantidade`, além dos pares únicos (pedido, categoria, dia) usados para
+    contar pedidos distintos em qualquer agrupamento. O dia é o código inteiro
+    de `date_codes`, e o calendário dos dias com vendas (`build_calendar`) dá
+    as chaves de semana, mês e dia da semana. As séries diária, semanal e
+    mensal, os totais por categoria e a tabela categoria × mês são derivados
+    uma única vez; depois disso, trocar de período ou de categoria no dashboard
+    só consulta tabelas pequenas.
+    
+    Args:
+        df (DataFrame): DataFrame com as colunas data_venda, categoria, valor_total, quantidade e numero_pedido
+        
+    Returns:
+        dict: Cubo com as tabelas pré-agregadas
+    """
+    base = pd.DataFrame({
+        'categoria': df['categoria'].values,
+        'dia': date_codes(df['data_venda']),
+        'valor_total': df['valor_total'].values,
+        'quantidade': df['quantidade'].values,
+        'pedido': pd.factorize(df['numero_pedido'])[0]
+    })
+    
+    # Vendas sem data entram nos totais por categoria, mas não nas séries temporais
+    categoria_dia = base.groupby(['categoria', 'dia'], sort=True, dropna=False, observed=True).agg(
+        valor_total=('valor_total', 'sum'),
+        quantidade=('quantidade', 'sum')
+    )
+    
+    # Pares únicos (pedido, categoria, dia); pedidos ausentes (código -1) não são contados
+    pares = base.loc[base['pedido'] >= 0, ['pedido', 'categoria', 'dia']].drop_duplicates()
+    
+    # Calendário dos dias distintos, com as chaves de cada período (no mesmo formato usado nos gráficos)
+    calendario = build_calendar(categoria_dia.index.get_level_values('dia').unique().to_numpy())
+    chaves_periodo = calendario[['data_venda', 'semana_ano', 'mes_ano', 'dia_semana_nome']]
+    
+    vendas_dia = categoria_dia.reset_index().join(chaves_periodo, on='dia')
+    pares = pares.join(chaves_periodo, on='dia')
+    
+    series = {}
+    for periodo, chave in [("Diário", 'data_venda'), ("Semanal", 'semana_ano'), ("Mensal", 'mes_ano')]:
+        df_tempo = vendas_dia.groupby(chave, sort=True)[['valor_total', 'quantidade']].sum()
+        df_tempo['numero_pedido'] = _contar_pedidos(pares, [chave])
+        df_tempo['numero_pedido'] = df_tempo['numero_pedido'].fillna(0).astype(int)
+        series[periodo] = df_tempo.reset_index()
+    
+    categorias = categoria_dia.groupby(level='categoria', sort=True, observed=True)[['valor_total', 'quantidade']].sum()
+    categorias['numero_pedido'] = _contar_pedidos(pares, ['categoria'])
+    categorias['numero_pedido'] = categorias['numero_pedido'].fillna(0).astype(int)
+    
+    categoria_mes = vendas_dia.groupby(['categoria', 'mes_ano'], sort=True, observed=True)[['valor_total', 'quantidade']].sum()
+    
+    dia_semana = vendas_dia.groupby('dia_semana_nome')['valor_total'].sum().reindex(DIAS_SEMANA_PT).dropna()
+    dia_semana = dia_semana.rename_axis('dia_semana')
+    
+    return {
+        'categoria_dia': categoria_dia,
+        'series': series,
+        'categorias': categorias,
+        'categoria_mes': categoria_mes,
+        'dia_semana': dia_semana,
+        'calendario': calendario,
+        'totais': {
+            'valor_total': df['valor_total'].sum(),
+            'quantidade': df['quantidade'].sum(),
+            'numero_pedido': int(pares['pedido'].nunique())
+        }
+    }
+
+def group_small_categories(cube, limite_percentual=2.0):
+    """
+    Agrupa em "Outros" as categorias com participação abaixo do limite.
+    
+    Args:
+        cube (dict): Cubo gerado por `build_sales_cube`
+        limite_percentual (float): Participação mínima (em %) para a categoria aparecer sozinha
+        
+    Returns:
+        tuple: (DataFrame com categoria, valor_total e percentual, lista de categorias agrupadas)
+    """
+    vendas_categoria = cube['categorias']['valor_total'].reset_index()
+    vendas_categoria = vendas_categoria.sort_values('valor_total', ascending=False)
+    
+    total_vendas = vendas_categoria['valor_total'].sum()
+    vendas_categoria['percentual'] = (vendas_categoria['valor_total'] / total_vendas) * 100
+    
+    categorias_principais = vendas_categoria[vendas_categoria['percentual'] >= limite_percentual]
+    categorias_secundarias = vendas_categoria[vendas_categoria['percentual'] < limite_percentual]
+    
+    if not categorias_secundarias.empty:
+        outros = pd.DataFrame({
+            'categoria': ['Outros'],
+            'valor_total': [categorias_secundarias['valor_total'].sum()],
+            'percentual': [categorias_secundarias['percentual'].sum()]
         })
+        vendas_categoria_final = pd.concat([categorias_principais, outros])
+    else:
+        vendas_categoria_final = categorias_principais
+    
+    vendas_categoria_final = vendas_categoria_final.sort_values('valor_total', ascending=False)
+    return vendas_categoria_final, categorias_secundarias['categoria'].tolist()
+
+def category_metrics(cube, categoria):
+    """
+    Calcula as métricas de uma categoria e a sua evolução mensal.
+    
+    Args:
+        cube (dict): Cubo gerado por `build_sales_cube`
+        categoria (str): Categoria selecionada
+        
+    Returns:
+        dict: Totais da categoria, participação no total e série mensal (mes_ano, valor_total, quantidade)
+    """
+    totais = cube['totais']
+    if categoria in cube['categorias'].index:
+        linha = cube['categorias'].loc[categoria]
+        valor_total, quantidade, numero_pedido = linha['valor_total'], linha['quantidade'], linha['numero_pedido']
+        evolucao = cube['categoria_mes'].loc[categoria].reset_index()
+    else:
+        valor_total, quantidade, numero_pedido = 0, 0, 0
+        evolucao = pd.DataFrame(columns=['mes_ano', 'valor_total', 'quantidade'])
+    
+    return {
+        'valor_total': valor_total,
+        'quantidade': quantidade,
+        'numero_pedido': numero_pedido,
+        'percentual_vendas': (valor_total / totais['valor_total']) * 100,
+        'percentual_produtos': (quantidade / totais['quantidade']) * 100,
+        'percentual_pedidos': (numero_pedido / totais['numero_pedido']) * 100,
+        'evolucao_mensal': evolucao
+    }
+
+def growth_recommendation(cube):
+    """
+    Encontra a categoria com maior variação de vendas entre os dois últimos meses.
+    
+    Args:
+        cube (dict): Cubo gerado por `build_sales_cube`
+        
+    Returns:
+        tuple: (categoria, variação em %) ou None se houver menos de dois meses
+    """
+    df_crescimento = cube['categoria_mes']['valor_total'].unstack('mes_ano').fillna(0)
+    
+    if len(df_crescimento.columns) < 2:
+        return None
     
-    return insights 
\ No newline at end of file
+    variacao = df_crescimento[df_crescimento.columns[-1]] / df_crescimento[df_crescimento.columns[-2]] - 1
+    categoria_crescimento = variacao.idxmax()
+    return categoria_crescimento, variacao.loc[categoria_crescimento] * 100